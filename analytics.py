@@ -0,0 +1,116 @@
+import threading
+import pandas as pd
+import config
+
+# Tables the statistics are computed from; writes to others don't invalidate them
+SOURCE_TABLES = ("Appointments", "Doctors")
+
+class AppointmentAnalytics:
+    """Appointment statistics computed with vectorized groupbys over one columnar frame
+
+    The frame of appointments joined to doctors is built once per data version
+    of the database, and every statistic is cached until that version changes.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+        self._version = None
+        self._frame = None
+        self._results = {}
+        self._lock = threading.Lock()
+    
+    def _build_frame(self):
+        """Load every appointment, archived ones included, into a DataFrame with its doctor's name and specialty"""
+        # Read as arrays, so no model is built per appointment
+        columns = self.db.appointment_columns()
+        appointments = pd.DataFrame({
+            "AppointmentID": columns["id"],
+            "DoctorID": columns["doctor_id"],
+            "Date": columns["date"],
+            "Status": columns["status"]
+        })
+        doctors = pd.DataFrame(
+            [(doctor.id, doctor.name, doctor.specialty) for doctor in self.db.get_all_doctors()],
+            columns=["DoctorID", "DoctorName", "Specialty"]
+        ).drop_duplicates("DoctorID")
+        
+        frame = appointments.merge(doctors, on="DoctorID", how="left")
+        frame[["DoctorName", "Specialty"]] = frame[["DoctorName", "Specialty"]].fillna("Unknown")
+        frame["Date"] = pd.to_datetime(frame["Date"])
+        
+        # Categoricals keep the repeated strings small and make groupbys fast
+        for column in ("DoctorID", "DoctorName", "Specialty", "Status"):
+            frame[column] = frame[column].astype(str).astype("category")
+        return frame
+    
+    def _cached(self, name, compute):
+        """Get a statistic, recomputing it only if the data version has changed"""
+        version = self.db.data_version(SOURCE_TABLES)
+        with self._lock:
+            if version != self._version:
+                self._frame = self._build_frame()
+                self._results = {}
+                self._version = version
+            if name not in self._results:
+                self._results[name] = compute(self._frame)
+            return self._results[name]
+    
+    def total(self):
+        """Get the number of appointments"""
+        return self._cached("total", len)
+    
+    @staticmethod
+    def _counts(values, known, name):
+        """Count each value, listing the known values first even when their count is zero"""
+        counts = values.value_counts()
+        labels = list(known) + [label for label in counts.index if label not in known]
+        return counts.reindex(labels, fill_value=0).rename_axis(name).rename("Count")
+    
+    def counts_by_status(self):
+        """Get appointment counts per status, every known status included"""
+        return self._cached(
+            "status", lambda frame: self._counts(frame["Status"], config.APPOINTMENT_STATUSES, "Status")
+        )
+    
+    def counts_by_specialty(self):
+        """Get appointment counts per doctor specialty, every configured specialty included"""
+        return self._cached(
+            "specialty", lambda frame: self._counts(frame["Specialty"], config.SPECIALTIES, "Specialty")
+        )
+    
+    def counts_by_date(self):
+        """Get appointment counts per date, for dates with at least one appointment"""
+        def compute(frame):
+            return frame.groupby("Date").size().rename_axis("Date").rename("Count")
+        return self._cached("date", compute)
+    
+    def counts_by_date_range(self, start, end):
+        """Get appointment counts for every date from start to end inclusive, zero-filled"""
+        dates = pd.date_range(start, end, freq="D")
+        return self.counts_by_date().reindex(dates, fill_value=0).rename_axis("Date")
+    
+    def counts_by_doctor(self):
+        """Get a DataFrame of appointment counts per doctor and status, busiest doctors first"""
+        def compute(frame):
+            table = (
+                frame.groupby(["DoctorID", "DoctorName", "Specialty", "Status"], observed=True)
+                .size()
+                .unstack("Status", fill_value=0)
+            )
+            table.columns = table.columns.astype(str)
+            table.columns.name = None
+            table["Total"] = table.sum(axis=1)
+            return table.sort_values("Total", ascending=False).reset_index()
+        return self._cached("doctor", compute)
+
+_shared_analytics = None
+_shared_analytics_lock = threading.Lock()
+
+def get_analytics(db):
+    """Get the analytics engine shared by every session using a database"""
+    global _shared_analytics
+    
+    with _shared_analytics_lock:
+        if _shared_analytics is None or _shared_analytics.db is not db:
+            _shared_analytics = AppointmentAnalytics(db)
+        return _shared_analytics
@@ -5,15 +5,22 @@ import os
 import json
 import time
 import random
-from database import GoogleSheetsDatabase
-from models import Patient, Doctor, Appointment
+from models import Patient, Doctor, Appointment, parse_date, format_date, format_time, format_timestamp
+from repository import get_database
+from importer import import_file
+from analytics import get_analytics
+from availability import SLOT_TIMES
+from metrics import registry, instrumented, start_exporters
 from utils import (
-    validate_email, validate_phone, validate_date, generate_time_slots,
+    validate_email, validate_phone, validate_date,
     calculate_age, format_date_for_display, get_next_available_dates,
     is_valid_password, sanitize_input
 )
 import config
 
+# Rows per page offered by the record grids
+PAGE_SIZES = [25, 50, 100, 200]
+
 # Initialize session state variables if they don't exist
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
@@ -28,7 +35,14 @@ if 'admin_logged_in' not in st.session_state:
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 'login'
 if 'db' not in st.session_state:
-    st.session_state.db = GoogleSheetsDatabase()
+    # One client per process, shared by every browser session
+    st.session_state.db = get_database()
+if 'analytics' not in st.session_state:
+    # Shared like the database, so statistics are computed once per data change
+    st.session_state.analytics = get_analytics(st.session_state.db)
+
+# Prometheus exports run once per process, when configured
+start_exporters()
 
 # Set page configuration
 st.set_page_config(
@@ -105,6 +119,7 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@instrumented("page_render_seconds", "page")
 def show_login_page():
     """Show the login page"""
     st.markdown('<h2 class="sub-header">Login</h2>', unsafe_allow_html=True)
@@ -123,23 +138,18 @@ def show_login_page():
             else:
                 # In a real app, you would verify against hashed passwords in the database
                 # For demo purposes, we'll just check if the patient exists
-                patients = st.session_state.db.get_all_patients()
-                patient_found = False
-                
-                for patient in patients:
-                    if patient["Email"] == email:
-                        patient_found = True
-                        st.session_state.logged_in = True
-                        st.session_state.user_type = "patient"
-                        st.session_state.user_id = patient["PatientID"]
-                        st.session_state.user_name = patient["Name"]
-                        st.session_state.current_page = "dashboard"
-                        st.success("Login successful!")
-                        time.sleep(1)
-                        st.experimental_rerun()
-                        break
+                patient = st.session_state.db.get_patient_by_email(email)
                 
-                if not patient_found:
+                if patient:
+                    st.session_state.logged_in = True
+                    st.session_state.user_type = "patient"
+                    st.session_state.user_id = patient.id
+                    st.session_state.user_name = patient.name
+                    st.session_state.current_page = "dashboard"
+                    st.success("Login successful!")
+                    time.sleep(1)
+                    st.experimental_rerun()
+                else:
                     st.error("Invalid email or password")
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -155,28 +165,24 @@ def show_login_page():
             else:
                 # In a real app, you would verify against hashed passwords in the database
                 # For demo purposes, we'll just check if the doctor exists
-                doctors = st.session_state.db.get_all_doctors()
-                doctor_found = False
-                
-                for doctor in doctors:
-                    if doctor["Email"] == doctor_email:
-                        doctor_found = True
-                        st.session_state.logged_in = True
-                        st.session_state.user_type = "doctor"
-                        st.session_state.user_id = doctor["DoctorID"]
-                        st.session_state.user_name = doctor["Name"]
-                        st.session_state.current_page = "dashboard"
-                        st.success("Login successful!")
-                        time.sleep(1)
-                        st.experimental_rerun()
-                        break
+                doctor = st.session_state.db.get_doctor_by_email(doctor_email)
                 
-                if not doctor_found:
+                if doctor:
+                    st.session_state.logged_in = True
+                    st.session_state.user_type = "doctor"
+                    st.session_state.user_id = doctor.id
+                    st.session_state.user_name = doctor.name
+                    st.session_state.current_page = "dashboard"
+                    st.success("Login successful!")
+                    time.sleep(1)
+                    st.experimental_rerun()
+                else:
                     st.error("Invalid email or password")
         st.markdown('</div>', unsafe_allow_html=True)
     
     st.markdown("Don't have an account? Go to the Register page to create one.")
 
+@instrumented("page_render_seconds", "page")
 def show_registration_page():
     """Show the registration page"""
     st.markdown('<h2 class="sub-header">Patient Registration</h2>', unsafe_allow_html=True)
@@ -240,6 +246,7 @@ def show_registration_page():
                 else:
                     st.error(f"Registration failed: {result}")
 
+@instrumented("page_render_seconds", "page")
 def show_admin_login_page():
     """Show the admin login page"""
     st.markdown('<h2 class="sub-header">Admin Login</h2>', unsafe_allow_html=True)
@@ -262,6 +269,7 @@ def show_admin_login_page():
         else:
             st.error("Invalid admin credentials")
 
+@instrumented("page_render_seconds", "page")
 def show_patient_dashboard():
     """Show the patient dashboard"""
     st.markdown('<h2 class="sub-header">Patient Dashboard</h2>', unsafe_allow_html=True)
@@ -273,24 +281,26 @@ def show_patient_dashboard():
         st.error("Could not retrieve patient information")
         return
     
-    # Get upcoming appointments
-    appointments = st.session_state.db.get_patient_appointments(st.session_state.user_id)
-    upcoming_appointments = [appt for appt in appointments if appt["Status"] == "Scheduled" and datetime.strptime(appt["Date"], "%Y-%m-%d") >= datetime.now()]
+    # Get upcoming appointments; the cards only show who the doctor is
+    appointments = st.session_state.db.get_patient_appointments(
+        st.session_state.user_id, fields=("doctor_name", "specialty"))
+    today = datetime.now().date()
+    upcoming_appointments = [appt for appt in appointments if appt.status == "Scheduled" and appt.date and appt.date > today]
     
     col1, col2 = st.columns([1, 2])
     
     with col1:
         st.markdown('<div class="info-box">', unsafe_allow_html=True)
         st.markdown("### Personal Information")
-        st.write(f"**Name:** {patient['Name']}")
-        st.write(f"**Email:** {patient['Email']}")
-        st.write(f"**Phone:** {patient['Phone']}")
+        st.write(f"**Name:** {patient.name}")
+        st.write(f"**Email:** {patient.email}")
+        st.write(f"**Phone:** {patient.phone}")
         
-        if patient['DateOfBirth']:
-            age = calculate_age(patient['DateOfBirth'])
+        if patient.dob:
+            age = calculate_age(patient.dob)
             st.write(f"**Age:** {age} years")
         
-        st.write(f"**Address:** {patient['Address']}")
+        st.write(f"**Address:** {patient.address}")
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
@@ -301,10 +311,10 @@ def show_patient_dashboard():
             for appt in upcoming_appointments[:3]:  # Show only the next 3 appointments
                 st.markdown(f"""
                 <div class="appointment-card">
-                    <strong>Date:</strong> {format_date_for_display(appt['Date'])}<br>
-                    <strong>Time:</strong> {appt['Time']}<br>
-                    <strong>Doctor:</strong> Dr. {appt['DoctorName']}<br>
-                    <strong>Specialty:</strong> {appt['Specialty']}
+                    <strong>Date:</strong> {format_date_for_display(appt.date)}<br>
+                    <strong>Time:</strong> {format_time(appt.time)}<br>
+                    <strong>Doctor:</strong> Dr. {appt.doctor_name}<br>
+                    <strong>Specialty:</strong> {appt.specialty}
                 </div>
                 """, unsafe_allow_html=True)
             
@@ -346,6 +356,7 @@ def show_patient_dashboard():
     tip_index = random.randint(0, len(health_tips) - 1)
     st.markdown(f'<div class="success-box">💡 {health_tips[tip_index]}</div>', unsafe_allow_html=True)
 
+@instrumented("page_render_seconds", "page")
 def show_book_appointment_page():
     """Show the book appointment page"""
     st.markdown('<h2 class="sub-header">Book an Appointment</h2>', unsafe_allow_html=True)
@@ -354,6 +365,11 @@ def show_book_appointment_page():
     st.markdown("### Step 1: Select Medical Specialty")
     specialty = st.selectbox("Choose a specialty", config.SPECIALTIES)
     
+    booking_mode = st.radio("How would you like to book?", ["Choose a doctor and date", "First available appointment"])
+    if booking_mode == "First available appointment":
+        show_first_available_slots(specialty)
+        return
+    
     # Step 2: Select doctor
     st.markdown("### Step 2: Select Doctor")
     doctors = st.session_state.db.get_doctors_by_specialty(specialty)
@@ -362,37 +378,31 @@ def show_book_appointment_page():
         st.warning(f"No doctors available for {specialty}. Please select another specialty.")
         return
     
-    doctor_options = [f"Dr. {doc['Name']} - {doc['Specialty']}" for doc in doctors]
+    doctor_options = [f"Dr. {doc.name} - {doc.specialty}" for doc in doctors]
     selected_doctor_index = st.selectbox("Choose a doctor", range(len(doctor_options)), format_func=lambda x: doctor_options[x])
     selected_doctor = doctors[selected_doctor_index]
     
     # Step 3: Select date
     st.markdown("### Step 3: Select Date")
-    available_dates = get_next_available_dates(14)  # Get dates for the next 2 weeks
-    selected_date = st.selectbox("Choose a date", available_dates, format_func=format_date_for_display)
+    available_dates = [parse_date(day) for day in get_next_available_dates(14)]  # Get dates for the next 2 weeks
     
-    # Step 4: Select time
-    st.markdown("### Step 4: Select Time")
-    
-    # Get doctor's existing appointments for the selected date
-    doctor_appointments = st.session_state.db.get_doctor_appointments(selected_doctor["DoctorID"], selected_date)
-    booked_times = [appt["Time"] for appt in doctor_appointments if appt["Status"] != "Cancelled"]
+    # Free slots for the whole two weeks come from a single availability lookup
+    free_slots = st.session_state.db.get_available_slots(selected_doctor.id, available_dates)
     
-    # Generate available time slots
-    all_time_slots = generate_time_slots(
-        config.WORKING_HOURS["start"], 
-        config.WORKING_HOURS["end"], 
-        config.APPOINTMENT_DURATION
-    )
+    with st.expander("View availability for the next 2 weeks"):
+        show_availability_grid(free_slots)
     
-    # Filter out booked times
-    available_time_slots = [slot for slot in all_time_slots if slot not in booked_times]
-    
-    if not available_time_slots:
-        st.warning("No available time slots for the selected date. Please choose another date.")
+    # Only offer dates that still have a free slot
+    open_dates = [day for day in available_dates if free_slots.get(day)]
+    if not open_dates:
+        st.warning("No available time slots in the next 2 weeks. Please choose another doctor.")
         return
     
-    selected_time = st.selectbox("Choose a time", available_time_slots)
+    selected_date = st.selectbox("Choose a date", open_dates, format_func=format_date_for_display)
+    
+    # Step 4: Select time
+    st.markdown("### Step 4: Select Time")
+    selected_time = st.selectbox("Choose a time", free_slots[selected_date], format_func=format_time)
     
     # Step 5: Additional notes
     st.markdown("### Step 5: Additional Information")
@@ -403,7 +413,7 @@ def show_book_appointment_page():
         # Create appointment data
         appointment_data = {
             "patient_id": st.session_state.user_id,
-            "doctor_id": selected_doctor["DoctorID"],
+            "doctor_id": selected_doctor.id,
             "date": selected_date,
             "time": selected_time,
             "notes": notes
@@ -417,22 +427,66 @@ def show_book_appointment_page():
             st.markdown(f"""
             <div class="success-box">
                 <h3>Appointment Details</h3>
-                <p><strong>Doctor:</strong> Dr. {selected_doctor['Name']}</p>
-                <p><strong>Specialty:</strong> {selected_doctor['Specialty']}</p>
+                <p><strong>Doctor:</strong> Dr. {selected_doctor.name}</p>
+                <p><strong>Specialty:</strong> {selected_doctor.specialty}</p>
                 <p><strong>Date:</strong> {format_date_for_display(selected_date)}</p>
-                <p><strong>Time:</strong> {selected_time}</p>
+                <p><strong>Time:</strong> {format_time(selected_time)}</p>
                 <p><strong>Appointment ID:</strong> {result}</p>
             </div>
             """, unsafe_allow_html=True)
         else:
             st.error(f"Failed to book appointment: {result}")
 
+def show_first_available_slots(specialty):
+    """Show the earliest open slots across every doctor of a specialty, each bookable in one click"""
+    st.markdown("### Step 2: Pick an Open Slot")
+    
+    slots = st.session_state.db.find_first_available(specialty, count=10)
+    if not slots:
+        st.warning(f"No available time slots for {specialty} in the next 2 weeks. Please select another specialty.")
+        return
+    
+    notes = st.text_area("Notes for the doctor (optional)", max_chars=500)
+    
+    for slot in slots:
+        col1, col2 = st.columns([4, 1])
+        
+        with col1:
+            st.write(f"**{format_date_for_display(slot.date)}** at **{format_time(slot.time)}** with Dr. {slot.doctor_name}")
+        
+        with col2:
+            if st.button("Book", key=f"first_{slot.doctor_id}_{slot.date}_{slot.time}"):
+                success, result = st.session_state.db.book_appointment({
+                    "patient_id": st.session_state.user_id,
+                    "doctor_id": slot.doctor_id,
+                    "date": slot.date,
+                    "time": slot.time,
+                    "notes": notes
+                })
+                
+                if success:
+                    st.success(f"Appointment booked successfully! Your appointment ID is {result}")
+                else:
+                    st.error(f"Failed to book appointment: {result}")
+
+def show_availability_grid(free_slots):
+    """Show a grid of time slots by date, marking the free ones"""
+    grid = pd.DataFrame("—", index=list(SLOT_TIMES), columns=list(free_slots))
+    for day, times in free_slots.items():
+        grid.loc[times, day] = "✅"
+    
+    grid.index = [format_time(slot) for slot in SLOT_TIMES]
+    grid.columns = [day.strftime("%a %b %d") for day in free_slots]
+    st.dataframe(grid, use_container_width=True)
+
+@instrumented("page_render_seconds", "page")
 def show_my_appointments_page():
     """Show the patient's appointments page"""
     st.markdown('<h2 class="sub-header">My Appointments</h2>', unsafe_allow_html=True)
     
     # Get all appointments for the patient
-    appointments = st.session_state.db.get_patient_appointments(st.session_state.user_id)
+    appointments = st.session_state.db.get_patient_appointments(
+        st.session_state.user_id, fields=("doctor_name", "specialty"))
     
     if not appointments:
         st.info("You don't have any appointments yet.")
@@ -463,22 +517,24 @@ def show_my_appointments_page():
     today = datetime.now().date()
     
     for appt in appointments:
-        appt_date = datetime.strptime(appt["Date"], "%Y-%m-%d").date()
-        
         # Apply status filter
-        if appt["Status"] not in status_filter:
+        if appt.status not in status_filter:
             continue
         
-        # Apply date filter
-        if date_filter == "Upcoming" and appt_date < today:
+        # Apply date filter; undated appointments are neither upcoming nor past, so only All shows them
+        if date_filter != "All" and appt.date is None:
             continue
-        if date_filter == "Past" and appt_date >= today:
+        if date_filter == "Upcoming" and appt.date < today:
+            continue
+        if date_filter == "Past" and appt.date >= today:
             continue
         
         filtered_appointments.append(appt)
     
-    # Sort appointments by date (newest first)
-    filtered_appointments.sort(key=lambda x: (x["Date"], x["Time"]), reverse=(date_filter == "Past"))
+    # Sort appointments by date (newest first), undated ones first as elsewhere
+    filtered_appointments.sort(
+        key=lambda x: (x.date or datetime.min.date(), x.time or datetime.min.time()),
+        reverse=(date_filter == "Past"))
     
     # Display appointments
     st.markdown("### Appointment List")
@@ -493,21 +549,20 @@ def show_my_appointments_page():
         with col1:
             st.markdown(f"""
             <div class="appointment-card">
-                <h4>Appointment on {format_date_for_display(appt['Date'])} at {appt['Time']}</h4>
-                <p><strong>Doctor:</strong> Dr. {appt['DoctorName']}</p>
-                <p><strong>Specialty:</strong> {appt['Specialty']}</p>
-                <p><strong>Status:</strong> {appt['Status']}</p>
-                <p><strong>Appointment ID:</strong> {appt['AppointmentID']}</p>
-                {f"<p><strong>Notes:</strong> {appt['Notes']}</p>" if appt['Notes'] else ""}
+                <h4>Appointment on {format_date_for_display(appt.date)} at {format_time(appt.time)}</h4>
+                <p><strong>Doctor:</strong> Dr. {appt.doctor_name}</p>
+                <p><strong>Specialty:</strong> {appt.specialty}</p>
+                <p><strong>Status:</strong> {appt.status}</p>
+                <p><strong>Appointment ID:</strong> {appt.id}</p>
+                {f"<p><strong>Notes:</strong> {appt.notes}</p>" if appt.notes else ""}
             </div>
             """, unsafe_allow_html=True)
         
         with col2:
             # Only allow cancellation for upcoming scheduled appointments
-            appt_date = datetime.strptime(appt["Date"], "%Y-%m-%d").date()
-            if appt["Status"] == "Scheduled" and appt_date >= today:
-                if st.button("Cancel", key=f"cancel_{appt['AppointmentID']}"):
-                    success, message = st.session_state.db.update_appointment_status(appt['AppointmentID'], "Cancelled")
+            if appt.status == "Scheduled" and (appt.date is None or appt.date >= today):
+                if st.button("Cancel", key=f"cancel_{appt.id}"):
+                    success, message = st.session_state.db.update_appointment_status(appt.id, "Cancelled")
                     if success:
                         st.success("Appointment cancelled successfully!")
                         time.sleep(1)
@@ -515,6 +570,7 @@ def show_my_appointments_page():
                     else:
                         st.error(f"Failed to cancel appointment: {message}")
 
+@instrumented("page_render_seconds", "page")
 def show_patient_profile_page():
     """Show the patient profile page"""
     st.markdown('<h2 class="sub-header">My Profile</h2>', unsafe_allow_html=True)
@@ -532,15 +588,15 @@ def show_patient_profile_page():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.write(f"**Name:** {patient['Name']}")
-        st.write(f"**Email:** {patient['Email']}")
-        st.write(f"**Phone:** {patient['Phone']}")
-        st.write(f"**Date of Birth:** {patient['DateOfBirth']}")
+        st.write(f"**Name:** {patient.name}")
+        st.write(f"**Email:** {patient.email}")
+        st.write(f"**Phone:** {patient.phone}")
+        st.write(f"**Date of Birth:** {format_date(patient.dob)}")
     
     with col2:
-        st.write(f"**Address:** {patient['Address']}")
-        st.write(f"**Medical History:** {patient['MedicalHistory'] or 'None provided'}")
-        st.write(f"**Registered Date:** {patient['RegisteredDate']}")
+        st.write(f"**Address:** {patient.address}")
+        st.write(f"**Medical History:** {patient.medical_history or 'None provided'}")
+        st.write(f"**Registered Date:** {format_timestamp(patient.registered_date)}")
     
     # In a real application, you would implement profile update functionality here
     st.markdown("### Update Profile")
@@ -551,13 +607,13 @@ def show_patient_profile_page():
         col1, col2 = st.columns(2)
         
         with col1:
-            name = st.text_input("Full Name", value=patient['Name'])
-            email = st.text_input("Email", value=patient['Email'])
-            phone = st.text_input("Phone Number", value=patient['Phone'])
+            name = st.text_input("Full Name", value=patient.name)
+            email = st.text_input("Email", value=patient.email)
+            phone = st.text_input("Phone Number", value=patient.phone)
         
         with col2:
-            address = st.text_area("Address", value=patient['Address'])
-            medical_history = st.text_area("Medical History", value=patient['MedicalHistory'] or "")
+            address = st.text_area("Address", value=patient.address)
+            medical_history = st.text_area("Medical History", value=patient.medical_history or "")
         
         submit_button = st.form_submit_button("Update Profile")
         
@@ -565,13 +621,13 @@ def show_patient_profile_page():
             st.success("Profile would be updated in a real application!")
             # In a real app, you would update the patient's profile in the database here
 
+@instrumented("page_render_seconds", "page")
 def show_doctor_dashboard():
     """Show the doctor dashboard"""
     st.markdown('<h2 class="sub-header">Doctor Dashboard</h2>', unsafe_allow_html=True)
     
     # Get doctor data
-    doctors = st.session_state.db.get_all_doctors()
-    doctor = next((doc for doc in doctors if doc["DoctorID"] == st.session_state.user_id), None)
+    doctor = st.session_state.db.get_doctor_by_id(st.session_state.user_id)
     
     if not doctor:
         st.error("Could not retrieve doctor information")
@@ -579,17 +635,18 @@ def show_doctor_dashboard():
     
     # Get today's appointments
     today = datetime.now().strftime("%Y-%m-%d")
-    appointments = st.session_state.db.get_doctor_appointments(st.session_state.user_id, today)
+    appointments = st.session_state.db.get_doctor_appointments(
+        st.session_state.user_id, today, fields=("patient_name",))
     
     col1, col2 = st.columns([1, 2])
     
     with col1:
         st.markdown('<div class="info-box">', unsafe_allow_html=True)
         st.markdown("### Doctor Information")
-        st.write(f"**Name:** Dr. {doctor['Name']}")
-        st.write(f"**Specialty:** {doctor['Specialty']}")
-        st.write(f"**Email:** {doctor['Email']}")
-        st.write(f"**Phone:** {doctor['Phone']}")
+        st.write(f"**Name:** Dr. {doctor.name}")
+        st.write(f"**Specialty:** {doctor.specialty}")
+        st.write(f"**Email:** {doctor.email}")
+        st.write(f"**Phone:** {doctor.phone}")
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
@@ -600,10 +657,10 @@ def show_doctor_dashboard():
             for appt in appointments:
                 st.markdown(f"""
                 <div class="appointment-card">
-                    <strong>Time:</strong> {appt['Time']}<br>
-                    <strong>Patient:</strong> {appt['PatientName']}<br>
-                    <strong>Status:</strong> {appt['Status']}<br>
-                    <strong>Notes:</strong> {appt['Notes'] or 'None'}
+                    <strong>Time:</strong> {format_time(appt.time)}<br>
+                    <strong>Patient:</strong> {appt.patient_name}<br>
+                    <strong>Status:</strong> {appt.status}<br>
+                    <strong>Notes:</strong> {appt.notes or 'None'}
                 </div>
                 """, unsafe_allow_html=True)
         else:
@@ -629,6 +686,7 @@ def show_doctor_dashboard():
             st.session_state.current_page = "my_profile"
             st.experimental_rerun()
 
+@instrumented("page_render_seconds", "page")
 def show_doctor_schedule_page():
     """Show the doctor's schedule page"""
     st.markdown('<h2 class="sub-header">My Schedule</h2>', unsafe_allow_html=True)
@@ -644,16 +702,52 @@ def show_doctor_schedule_page():
             selected_date = st.date_input("Select Date", datetime.now())
             date_str = selected_date.strftime("%Y-%m-%d")
             
-            # Get appointments for the selected date
-            appointments = st.session_state.db.get_doctor_appointments(st.session_state.user_id, date_str)
+            # Get appointments for the selected date, already sorted by time
+            appointments = st.session_state.db.get_doctor_appointments(
+                st.session_state.user_id, date_str, fields=("patient_name", "patient_phone"))
             
             st.markdown(f"### Appointments for {format_date_for_display(date_str)}")
             
             if not appointments:
                 st.info("No appointments scheduled for this date.")
             else:
-                # Sort appointments by time
-                appointments.sort(key=lambda x: x["Time"])
+                # Update several scheduled appointments at once
+                scheduled_appointments = {
+                    appt.id: appt for appt in appointments if appt.status == "Scheduled"
+                }
+                
+                if len(scheduled_appointments) > 1:
+                    selected_ids = st.multiselect(
+                        "Select appointments to update together",
+                        list(scheduled_appointments.keys()),
+                        # Nothing is preselected, so one click can't change the whole day
+                        default=[],
+                        format_func=lambda appt_id: f"{format_time(scheduled_appointments[appt_id].time)} - {scheduled_appointments[appt_id].patient_name}"
+                    )
+                    
+                    bulk_col1, bulk_col2 = st.columns(2)
+                    
+                    with bulk_col1:
+                        if st.button("Complete Selected", disabled=not selected_ids):
+                            success, message = st.session_state.db.update_appointment_statuses(
+                                {appt_id: "Completed" for appt_id in selected_ids})
+                            if success:
+                                st.success(f"{len(selected_ids)} appointments marked as completed!")
+                                time.sleep(1)
+                                st.experimental_rerun()
+                            else:
+                                st.error(f"Failed to update status: {message}")
+                    
+                    with bulk_col2:
+                        if st.button("Cancel Selected", disabled=not selected_ids):
+                            success, message = st.session_state.db.update_appointment_statuses(
+                                {appt_id: "Cancelled" for appt_id in selected_ids})
+                            if success:
+                                st.success(f"{len(selected_ids)} appointments cancelled!")
+                                time.sleep(1)
+                                st.experimental_rerun()
+                            else:
+                                st.error(f"Failed to update status: {message}")
                 
                 # Display appointments
                 for appt in appointments:
@@ -662,19 +756,19 @@ def show_doctor_schedule_page():
                     with col1:
                         st.markdown(f"""
                         <div class="appointment-card">
-                            <h4>Appointment at {appt['Time']}</h4>
-                            <p><strong>Patient:</strong> {appt['PatientName']}</p>
-                            <p><strong>Phone:</strong> {appt['PatientPhone']}</p>
-                            <p><strong>Status:</strong> {appt['Status']}</p>
-                            <p><strong>Notes:</strong> {appt['Notes'] or 'None'}</p>
+                            <h4>Appointment at {format_time(appt.time)}</h4>
+                            <p><strong>Patient:</strong> {appt.patient_name}</p>
+                            <p><strong>Phone:</strong> {appt.patient_phone}</p>
+                            <p><strong>Status:</strong> {appt.status}</p>
+                            <p><strong>Notes:</strong> {appt.notes or 'None'}</p>
                         </div>
                         """, unsafe_allow_html=True)
                     
                     with col2:
                         # Allow updating appointment status
-                        if appt["Status"] == "Scheduled":
-                            if st.button("Complete", key=f"complete_{appt['AppointmentID']}"):
-                                success, message = st.session_state.db.update_appointment_status(appt['AppointmentID'], "Completed")
+                        if appt.status == "Scheduled":
+                            if st.button("Complete", key=f"complete_{appt.id}"):
+                                success, message = st.session_state.db.update_appointment_status(appt.id, "Completed")
                                 if success:
                                     st.success("Appointment marked as completed!")
                                     time.sleep(1)
@@ -682,8 +776,8 @@ def show_doctor_schedule_page():
                                 else:
                                     st.error(f"Failed to update status: {message}")
                             
-                            if st.button("Cancel", key=f"cancel_{appt['AppointmentID']}"):
-                                success, message = st.session_state.db.update_appointment_status(appt['AppointmentID'], "Cancelled")
+                            if st.button("Cancel", key=f"cancel_{appt.id}"):
+                                success, message = st.session_state.db.update_appointment_status(appt.id, "Cancelled")
                                 if success:
                                     st.success("Appointment cancelled!")
                                     time.sleep(1)
@@ -698,18 +792,24 @@ def show_doctor_schedule_page():
             
             st.markdown(f"### Week of {dates[0].strftime('%B %d')} - {dates[6].strftime('%B %d, %Y')}")
             
+            # Fetch the whole week in one query and group it by day
+            week_appointments = st.session_state.db.get_appointments(
+                doctor_id=st.session_state.user_id, start=dates[0], end=dates[6], fields=("patient_name",))
+            appointments_by_date = {}
+            for appt in week_appointments:
+                appointments_by_date.setdefault(appt.date, []).append(appt)
+            
             # Create a table for the weekly view
             weekly_data = []
             
             for date in dates:
-                date_str = date.strftime("%Y-%m-%d")
-                appointments = st.session_state.db.get_doctor_appointments(st.session_state.user_id, date_str)
+                appointments = appointments_by_date.get(date, [])
                 
                 # Count appointments by status
-                scheduled = len([a for a in appointments if a["Status"] == "Scheduled"])
-                completed = len([a for a in appointments if a["Status"] == "Completed"])
+                scheduled = len([a for a in appointments if a.status == "Scheduled"])
+                completed = len([a for a in appointments if a.status == "Completed"])
                 
-                cancelled = len([a for a in appointments if a["Status"] == "Cancelled"])
+                cancelled = len([a for a in appointments if a.status == "Cancelled"])
                 
                 weekly_data.append({
                     "Date": date.strftime("%a, %b %d"),
@@ -726,111 +826,90 @@ def show_doctor_schedule_page():
             # Allow selecting a specific day from the week
             selected_day = st.selectbox("Select a day to view details", range(7), format_func=lambda i: dates[i].strftime("%A, %B %d"))
             selected_date = dates[selected_day]
-            date_str = selected_date.strftime("%Y-%m-%d")
             
-            # Get appointments for the selected date
-            appointments = st.session_state.db.get_doctor_appointments(st.session_state.user_id, date_str)
+            # Appointments for the selected date come from the weekly query, sorted by time
+            appointments = appointments_by_date.get(selected_date, [])
             
-            st.markdown(f"### Appointments for {format_date_for_display(date_str)}")
+            st.markdown(f"### Appointments for {format_date_for_display(selected_date)}")
             
             if not appointments:
                 st.info("No appointments scheduled for this date.")
             else:
-                # Sort appointments by time
-                appointments.sort(key=lambda x: x["Time"])
-                
                 # Display appointments
                 for appt in appointments:
                     st.markdown(f"""
                     <div class="appointment-card">
-                        <h4>Appointment at {appt['Time']}</h4>
-                        <p><strong>Patient:</strong> {appt['PatientName']}</p>
-                        <p><strong>Status:</strong> {appt['Status']}</p>
+                        <h4>Appointment at {format_time(appt.time)}</h4>
+                        <p><strong>Patient:</strong> {appt.patient_name}</p>
+                        <p><strong>Status:</strong> {appt.status}</p>
                     </div>
                     """, unsafe_allow_html=True)
 
+@instrumented("page_render_seconds", "page")
 def show_patient_records_page():
     """Show the patient records page"""
     st.markdown('<h2 class="sub-header">Patient Records</h2>', unsafe_allow_html=True)
     
-    # Get all patients who have appointments with this doctor
-    all_appointments = st.session_state.db.get_doctor_appointments(st.session_state.user_id)
-    patient_ids = list(set([appt["PatientID"] for appt in all_appointments]))
-    
-    if not patient_ids:
-        st.info("No patient records found.")
-        return
-    
-    # Get patient details
-    patients = st.session_state.db.get_all_patients()
-    doctor_patients = [p for p in patients if p["PatientID"] in patient_ids]
-    
     # Search functionality
     search_term = st.text_input("Search patients by name or ID")
     
-    if search_term:
-        filtered_patients = [
-            p for p in doctor_patients 
-            if search_term.lower() in p["Name"].lower() or search_term.lower() in p["PatientID"].lower()
-        ]
-    else:
-        filtered_patients = doctor_patients
+    grid_col, detail_col = st.columns([3, 2])
     
-    # Display patients
-    st.markdown(f"### Patient List ({len(filtered_patients)})")
+    # Only patients who have appointments with this doctor, one page at a time
+    with grid_col:
+        page = show_paginated_grid(
+            "patient_records",
+            lambda cursor, page_size: st.session_state.db.list_patients(
+                search_term, st.session_state.user_id, cursor, page_size),
+            search_term,
+            patient_grid_row
+        )
     
-    if not filtered_patients:
-        st.info("No patients match your search.")
+    if not page.items:
+        st.info("No patients match your search." if search_term else "No patient records found.")
         return
     
-    for patient in filtered_patients:
-        with st.expander(f"{patient['Name']} ({patient['PatientID']})"):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write(f"**Name:** {patient['Name']}")
-                st.write(f"**Email:** {patient['Email']}")
-                st.write(f"**Phone:** {patient['Phone']}")
-                
-                if patient['DateOfBirth']:
-                    age = calculate_age(patient['DateOfBirth'])
-                    st.write(f"**Age:** {age} years")
-            
-            with col2:
-                st.write(f"**Address:** {patient['Address']}")
-                st.write(f"**Medical History:** {patient['MedicalHistory'] or 'None provided'}")
-            
-            # Get patient's appointments with this doctor
-            patient_appointments = [
-                appt for appt in all_appointments 
-                if appt["PatientID"] == patient["PatientID"]
-            ]
-            
-            st.markdown("#### Appointment History")
-            
-            if patient_appointments:
-                # Sort by date (newest first)
-                patient_appointments.sort(key=lambda x: (x["Date"], x["Time"]), reverse=True)
-                
-                for appt in patient_appointments:
-                    st.markdown(f"""
-                    <div class="appointment-card">
-                        <p><strong>Date:</strong> {format_date_for_display(appt['Date'])}</p>
-                        <p><strong>Time:</strong> {appt['Time']}</p>
-                        <p><strong>Status:</strong> {appt['Status']}</p>
-                        <p><strong>Notes:</strong> {appt['Notes'] or 'None'}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-            else:
-                st.info("No appointment history found.")
+    with detail_col:
+        patient = select_page_record("patient_records", page, lambda p: f"{p.name} ({p.id})")
+        
+        st.write(f"**Name:** {patient.name}")
+        st.write(f"**Email:** {patient.email}")
+        st.write(f"**Phone:** {patient.phone}")
+        
+        if patient.dob:
+            age = calculate_age(patient.dob)
+            st.write(f"**Age:** {age} years")
+        
+        st.write(f"**Address:** {patient.address}")
+        st.write(f"**Medical History:** {patient.medical_history or 'None provided'}")
+        
+        # Get the patient's appointments with this doctor
+        patient_appointments = st.session_state.db.get_appointments(
+            doctor_id=st.session_state.user_id, patient_id=patient.id, fields=())
+        
+        st.markdown("#### Appointment History")
+        
+        if patient_appointments:
+            # get_appointments sorts by date and time, undated ones first; show the newest first
+            for appt in reversed(patient_appointments):
+                st.markdown(f"""
+                <div class="appointment-card">
+                    <p><strong>Date:</strong> {format_date_for_display(appt.date)}</p>
+                    <p><strong>Time:</strong> {format_time(appt.time)}</p>
+                    <p><strong>Status:</strong> {appt.status}</p>
+                    <p><strong>Notes:</strong> {appt.notes or 'None'}</p>
+                </div>
+                """, unsafe_allow_html=True)
+        else:
+            st.info("No appointment history found.")
 
+@instrumented("page_render_seconds", "page")
 def show_doctor_profile_page():
     """Show the doctor profile page"""
     st.markdown('<h2 class="sub-header">My Profile</h2>', unsafe_allow_html=True)
     
     # Get doctor data
-    doctors = st.session_state.db.get_all_doctors()
-    doctor = next((doc for doc in doctors if doc["DoctorID"] == st.session_state.user_id), None)
+    doctor = st.session_state.db.get_doctor_by_id(st.session_state.user_id)
     
     if not doctor:
         st.error("Could not retrieve doctor information")
@@ -842,13 +921,13 @@ def show_doctor_profile_page():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.write(f"**Name:** Dr. {doctor['Name']}")
-        st.write(f"**Specialty:** {doctor['Specialty']}")
-        st.write(f"**Email:** {doctor['Email']}")
+        st.write(f"**Name:** Dr. {doctor.name}")
+        st.write(f"**Specialty:** {doctor.specialty}")
+        st.write(f"**Email:** {doctor.email}")
     
     with col2:
-        st.write(f"**Phone:** {doctor['Phone']}")
-        st.write(f"**Schedule:** {doctor['Schedule']}")
+        st.write(f"**Phone:** {doctor.phone}")
+        st.write(f"**Schedule:** {doctor.schedule}")
     
     # In a real application, you would implement profile update functionality here
     st.markdown("### Update Profile")
@@ -859,12 +938,12 @@ def show_doctor_profile_page():
         col1, col2 = st.columns(2)
         
         with col1:
-            name = st.text_input("Full Name", value=doctor['Name'])
-            email = st.text_input("Email", value=doctor['Email'])
+            name = st.text_input("Full Name", value=doctor.name)
+            email = st.text_input("Email", value=doctor.email)
         
         with col2:
-            phone = st.text_input("Phone Number", value=doctor['Phone'])
-            schedule = st.text_input("Schedule", value=doctor['Schedule'])
+            phone = st.text_input("Phone Number", value=doctor.phone)
+            schedule = st.text_input("Schedule", value=doctor.schedule)
         
         submit_button = st.form_submit_button("Update Profile")
         
@@ -872,32 +951,30 @@ def show_doctor_profile_page():
             st.success("Profile would be updated in a real application!")
             # In a real app, you would update the doctor's profile in the database here
 
+@instrumented("page_render_seconds", "page")
 def show_admin_dashboard():
     """Show the admin dashboard"""
     st.markdown('<h2 class="sub-header">Admin Dashboard</h2>', unsafe_allow_html=True)
     
-    # Get statistics
-    patients = st.session_state.db.get_all_patients()
-    doctors = st.session_state.db.get_all_doctors()
+    # Get statistics; a one-row page carries the total without loading every record
+    patient_count = st.session_state.db.list_patients(page_size=1).total
+    doctor_count = st.session_state.db.list_doctors(page_size=1).total
     
-    # In a real app, you would get all appointments
-    # For demo purposes, we'll just show placeholder data
-    total_appointments = 150
-    scheduled_appointments = 75
-    completed_appointments = 50
-    cancelled_appointments = 25
+    analytics = st.session_state.analytics
+    total_appointments = analytics.total()
+    scheduled_appointments = analytics.counts_by_status().get("Scheduled", 0)
     
     # Display statistics
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.markdown('<div class="info-box">', unsafe_allow_html=True)
-        st.metric("Total Patients", len(patients))
+        st.metric("Total Patients", patient_count)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         st.markdown('<div class="info-box">', unsafe_allow_html=True)
-        st.metric("Total Doctors", len(doctors))
+        st.metric("Total Doctors", doctor_count)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col3:
@@ -949,47 +1026,150 @@ def show_admin_dashboard():
         st.write("🔒 Security status: All systems secure")
         st.markdown('</div>', unsafe_allow_html=True)
 
+def show_paginated_grid(key, fetch_page, filters, to_row):
+    """Show one page of a listing as a single grid with paging controls; returns the Page
+    
+    fetch_page(cursor, page_size) gets the Page from the database, so only
+    one page of records is read and rendered. The cursors of pages already
+    visited are kept in session state so Previous can step back; they start
+    over when the filters or the page size change.
+    """
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pager = st.session_state.get(f"{key}_pager")
+    if pager is None or pager["filters"] != (filters, page_size):
+        pager = st.session_state[f"{key}_pager"] = {"filters": (filters, page_size), "cursors": [None]}
+    
+    page = fetch_page(pager["cursors"][-1], page_size)
+    if not page.items:
+        return page
+    
+    st.dataframe(pd.DataFrame([to_row(item) for item in page.items]).set_index("ID"), use_container_width=True)
+    
+    first_row = (len(pager["cursors"]) - 1) * page_size + 1
+    col1, col2, col3 = st.columns([1, 3, 1])
+    
+    with col1:
+        if st.button("Previous", key=f"{key}_previous", disabled=len(pager["cursors"]) == 1):
+            pager["cursors"].pop()
+            st.experimental_rerun()
+    
+    with col2:
+        st.caption(f"Rows {first_row}-{first_row + len(page.items) - 1} of {page.total}")
+    
+    with col3:
+        if st.button("Next", key=f"{key}_next", disabled=page.next_cursor is None):
+            pager["cursors"].append(page.next_cursor)
+            st.experimental_rerun()
+    
+    return page
+
+def select_page_record(key, page, label):
+    """Pick one record of the current page for the detail pane"""
+    # Keyed by the page's position so each page starts at its first record
+    pager = st.session_state[f"{key}_pager"]
+    index = st.selectbox(
+        "Show details for", range(len(page.items)),
+        format_func=lambda i: label(page.items[i]), key=f"{key}_selected_{len(pager['cursors'])}"
+    )
+    return page.items[index]
+
+def patient_grid_row(patient):
+    return {
+        "ID": patient.id,
+        "Name": patient.name,
+        "Email": patient.email,
+        "Phone": patient.phone,
+        "Date of Birth": format_date(patient.dob),
+        "Registered": format_timestamp(patient.registered_date)
+    }
+
+def doctor_grid_row(doctor):
+    return {
+        "ID": doctor.id,
+        "Name": f"Dr. {doctor.name}",
+        "Specialty": doctor.specialty,
+        "Email": doctor.email,
+        "Phone": doctor.phone,
+        "Schedule": doctor.schedule
+    }
+
+def show_bulk_import_tab(kind):
+    """Show the bulk import form for patients or doctors"""
+    st.markdown(f"### Bulk Import {kind.title()}")
+    
+    if kind == "patients":
+        st.write("Columns: name, email, phone, dob (YYYY-MM-DD), address, medical_history (optional)")
+    else:
+        st.write("Columns: name, email, phone, specialty, schedule")
+    
+    uploaded_file = st.file_uploader("Upload a CSV or JSONL file", type=["csv", "jsonl"], key=f"import_{kind}")
+    
+    if uploaded_file is not None and st.button("Start Import", key=f"start_import_{kind}"):
+        file_format = uploaded_file.name.rsplit(".", 1)[-1].lower()
+        
+        with st.spinner("Importing..."):
+            report = import_file(st.session_state.db, uploaded_file, kind, file_format)
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.metric("Imported", report.imported)
+        
+        with col2:
+            st.metric("Rejected", len(report.rejected))
+        
+        with col3:
+            st.metric("Rows per Second", f"{report.rows_per_second:.0f}")
+        
+        if report.rejected:
+            st.markdown("#### Rejected Rows")
+            st.dataframe(pd.DataFrame(report.rejected, columns=["Line", "Reason"]))
+
+@instrumented("page_render_seconds", "page")
 def show_manage_doctors_page():
     """Show the manage doctors page"""
     st.markdown('<h2 class="sub-header">Manage Doctors</h2>', unsafe_allow_html=True)
     
     # Tabs for different actions
-    tab1, tab2 = st.tabs(["View Doctors", "Add Doctor"])
+    tab1, tab2, tab3 = st.tabs(["View Doctors", "Add Doctor", "Bulk Import"])
     
     with tab1:
-        # View doctors
-        doctors = st.session_state.db.get_all_doctors()
+        # View doctors one page at a time
+        search_term = st.text_input("Search doctors by name, email, specialty, or ID")
+        
+        grid_col, detail_col = st.columns([3, 2])
         
-        if not doctors:
-            st.info("No doctors found in the system.")
+        with grid_col:
+            page = show_paginated_grid(
+                "doctors",
+                lambda cursor, page_size: st.session_state.db.list_doctors(search_term, cursor, page_size),
+                search_term,
+                doctor_grid_row
+            )
+        
+        if not page.items:
+            st.info("No doctors match your search." if search_term else "No doctors found in the system.")
         else:
-            # Display doctors
-            st.markdown(f"### Doctor List ({len(doctors)})")
-            
-            for doctor in doctors:
-                with st.expander(f"Dr. {doctor['Name']} - {doctor['Specialty']}"):
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.write(f"**ID:** {doctor['DoctorID']}")
-                        st.write(f"**Name:** Dr. {doctor['Name']}")
-                        st.write(f"**Specialty:** {doctor['Specialty']}")
-                    
-                    with col2:
-                        st.write(f"**Email:** {doctor['Email']}")
-                        st.write(f"**Phone:** {doctor['Phone']}")
-                        st.write(f"**Schedule:** {doctor['Schedule']}")
-                    
-                    # Action buttons
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        if st.button("Edit", key=f"edit_{doctor['DoctorID']}"):
-                            st.info("Edit functionality would be implemented in a real application.")
-                    
-                    with col2:
-                        if st.button("Delete", key=f"delete_{doctor['DoctorID']}"):
-                            st.error("Delete functionality would be implemented in a real application.")
+            with detail_col:
+                doctor = select_page_record("doctors", page, lambda d: f"Dr. {d.name} - {d.specialty}")
+                
+                st.write(f"**ID:** {doctor.id}")
+                st.write(f"**Name:** Dr. {doctor.name}")
+                st.write(f"**Specialty:** {doctor.specialty}")
+                st.write(f"**Email:** {doctor.email}")
+                st.write(f"**Phone:** {doctor.phone}")
+                st.write(f"**Schedule:** {doctor.schedule}")
+                
+                # Action buttons
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    if st.button("Edit", key=f"edit_{doctor.id}"):
+                        st.info("Edit functionality would be implemented in a real application.")
+                
+                with col2:
+                    if st.button("Delete", key=f"delete_{doctor.id}"):
+                        st.error("Delete functionality would be implemented in a real application.")
     
     with tab2:
         # Add new doctor form
@@ -1043,120 +1223,82 @@ def show_manage_doctors_page():
                         st.success(f"Doctor added successfully! Doctor ID: {result}")
                     else:
                         st.error(f"Failed to add doctor: {result}")
+    
+    with tab3:
+        show_bulk_import_tab("doctors")
 
+@instrumented("page_render_seconds", "page")
 def show_manage_patients_page():
     """Show the manage patients page"""
     st.markdown('<h2 class="sub-header">Manage Patients</h2>', unsafe_allow_html=True)
     
-    # Get all patients
-    patients = st.session_state.db.get_all_patients()
-    
-    if not patients:
-        st.info("No patients found in the system.")
-        return
-    
-    # Search functionality
-    search_term = st.text_input("Search patients by name, email, or ID")
-    
-    if search_term:
-        filtered_patients = [
-            p for p in patients 
-            if search_term.lower() in p["Name"].lower() or 
-               search_term.lower() in p["Email"].lower() or 
-               search_term.lower() in p["PatientID"].lower()
-        ]
-    else:
-        filtered_patients = patients
-    
-    # Display patients
-    st.markdown(f"### Patient List ({len(filtered_patients)})")
+    # Tabs for different actions
+    tab1, tab2 = st.tabs(["View Patients", "Bulk Import"])
     
-    if not filtered_patients:
-        st.info("No patients match your search.")
-        return
+    with tab2:
+        show_bulk_import_tab("patients")
     
-    for patient in filtered_patients:
-        with st.expander(f"{patient['Name']} ({patient['PatientID']})"):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write(f"**ID:** {patient['PatientID']}")
-                st.write(f"**Name:** {patient['Name']}")
-                st.write(f"**Email:** {patient['Email']}")
-                st.write(f"**Phone:** {patient['Phone']}")
+    with tab1:
+        # Search functionality
+        search_term = st.text_input("Search patients by name, email, or ID")
+        
+        grid_col, detail_col = st.columns([3, 2])
+        
+        with grid_col:
+            page = show_paginated_grid(
+                "patients",
+                lambda cursor, page_size: st.session_state.db.list_patients(search_term, None, cursor, page_size),
+                search_term,
+                patient_grid_row
+            )
+        
+        if not page.items:
+            st.info("No patients match your search." if search_term else "No patients found in the system.")
+            return
+        
+        with detail_col:
+            patient = select_page_record("patients", page, lambda p: f"{p.name} ({p.id})")
             
-            with col2:
-                st.write(f"**Date of Birth:** {patient['DateOfBirth']}")
-                st.write(f"**Address:** {patient['Address']}")
-                st.write(f"**Medical History:** {patient['MedicalHistory'] or 'None provided'}")
-                st.write(f"**Registered Date:** {patient['RegisteredDate']}")
+            st.write(f"**ID:** {patient.id}")
+            st.write(f"**Name:** {patient.name}")
+            st.write(f"**Email:** {patient.email}")
+            st.write(f"**Phone:** {patient.phone}")
+            st.write(f"**Date of Birth:** {format_date(patient.dob)}")
+            st.write(f"**Address:** {patient.address}")
+            st.write(f"**Medical History:** {patient.medical_history or 'None provided'}")
+            st.write(f"**Registered Date:** {format_timestamp(patient.registered_date)}")
             
             # In a real app, you would implement edit and delete functionality here
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                if st.button("Edit", key=f"edit_{patient['PatientID']}"):
+                if st.button("Edit", key=f"edit_{patient.id}"):
                     st.info("Edit functionality would be implemented in a real application.")
             
             with col2:
-                if st.button("Delete", key=f"delete_{patient['PatientID']}"):
+                if st.button("Delete", key=f"delete_{patient.id}"):
                     st.error("Delete functionality would be implemented in a real application.")
             
             with col3:
-                if st.button("View Appointments", key=f"view_{patient['PatientID']}"):
+                if st.button("View Appointments", key=f"view_{patient.id}"):
                     st.info("View appointments functionality would be implemented in a real application.")
 
+@instrumented("page_render_seconds", "page")
 def show_appointment_reports_page():
     """Show the appointment reports page"""
     st.markdown('<h2 class="sub-header">Appointment Reports</h2>', unsafe_allow_html=True)
     
-    # In a real app, you would get actual appointment data
-    # For demo purposes, we'll create placeholder data
-    
-    # Placeholder data for appointments by status
-    status_data = {
-        "Scheduled": 75,
-        "Completed": 50,
-        "Cancelled": 25
-    }
-    
-    # Placeholder data for appointments by specialty
-    specialty_data = {
-        "General Medicine": 30,
-        "Cardiology": 25,
-        "Dermatology": 15,
-        "Orthopedics": 20,
-        "Pediatrics": 18,
-        "Neurology": 12,
-        "Gynecology": 10,
-        "Ophthalmology": 8,
-        "Dentistry": 7,
-        "Psychiatry": 5
-    }
-    
-    # Placeholder data for appointments by date
+    # Counts are computed from every appointment and cached until the data changes
+    analytics = st.session_state.analytics
     today = datetime.now().date()
-    date_data = {
-        (today - timedelta(days=6)).strftime("%Y-%m-%d"): 12,
-        (today - timedelta(days=5)).strftime("%Y-%m-%d"): 15,
-        (today - timedelta(days=4)).strftime("%Y-%m-%d"): 10,
-        (today - timedelta(days=3)).strftime("%Y-%m-%d"): 18,
-        (today - timedelta(days=2)).strftime("%Y-%m-%d"): 20,
-        (today - timedelta(days=1)).strftime("%Y-%m-%d"): 22,
-        today.strftime("%Y-%m-%d"): 25
-    }
     
     # Display reports
-    tab1, tab2, tab3 = st.tabs(["Status Report", "Specialty Report", "Date Report"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Status Report", "Specialty Report", "Date Report", "Doctor Report"])
     
     with tab1:
         st.markdown("### Appointments by Status")
         
-        # Create DataFrame for status data
-        status_df = pd.DataFrame({
-            "Status": list(status_data.keys()),
-            "Count": list(status_data.values())
-        })
+        status_df = analytics.counts_by_status().reset_index()
         
         # Display as a bar chart
         st.bar_chart(status_df.set_index("Status"))
@@ -1167,11 +1309,7 @@ def show_appointment_reports_page():
     with tab2:
         st.markdown("### Appointments by Specialty")
         
-        # Create DataFrame for specialty data
-        specialty_df = pd.DataFrame({
-            "Specialty": list(specialty_data.keys()),
-            "Count": list(specialty_data.values())
-        })
+        specialty_df = analytics.counts_by_specialty().reset_index()
         
         # Display as a bar chart
         st.bar_chart(specialty_df.set_index("Specialty"))
@@ -1182,11 +1320,8 @@ def show_appointment_reports_page():
     with tab3:
         st.markdown("### Appointments by Date (Last 7 Days)")
         
-        # Create DataFrame for date data
-        date_df = pd.DataFrame({
-            "Date": [format_date_for_display(date) for date in date_data.keys()],
-            "Count": list(date_data.values())
-        })
+        date_df = analytics.counts_by_date_range(today - timedelta(days=6), today).reset_index()
+        date_df["Date"] = date_df["Date"].dt.strftime("%Y-%m-%d").map(format_date_for_display)
         
         # Display as a line chart
         st.line_chart(date_df.set_index("Date"))
@@ -1194,6 +1329,19 @@ def show_appointment_reports_page():
         # Display as a table
         st.table(date_df)
     
+    with tab4:
+        st.markdown("### Appointments by Doctor")
+        
+        doctor_df = analytics.counts_by_doctor()
+        if doctor_df.empty:
+            st.info("No appointments found.")
+        else:
+            # Display as a bar chart of the busiest doctors
+            st.bar_chart(doctor_df.head(20).set_index("DoctorID")["Total"])
+            
+            # Display as a table
+            st.dataframe(doctor_df, use_container_width=True)
+    
     # Export options (placeholder)
     st.markdown("### Export Reports")
     
@@ -1211,6 +1359,89 @@ def show_appointment_reports_page():
         if st.button("Export as PDF"):
             st.success("In a real application, this would download a PDF file.")
 
+@instrumented("page_render_seconds", "page")
+def show_performance_page():
+    """Show database call and page timings, cache and API counters, and the metrics export"""
+    st.markdown('<h2 class="sub-header">Performance</h2>', unsafe_allow_html=True)
+    
+    # Only the Google Sheets backend has a cache and an API quota to report on
+    db = st.session_state.db
+    stats = db.cache_stats() if hasattr(db, "cache_stats") else None
+    
+    if stats:
+        api = stats.get("api", {})
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("Cache Hit Rate", f"{stats['hit_rate']:.0%}")
+        
+        with col2:
+            st.metric("API Requests", api.get("requests", 0))
+        
+        with col3:
+            st.metric("Throttled Requests", api.get("throttled", 0))
+        
+        with col4:
+            st.metric("Stale Reads Served", stats["stale_served"])
+    
+    st.markdown("### Database Calls")
+    calls = registry.summary("db_call_seconds")
+    if calls:
+        st.dataframe(pd.DataFrame(calls).round(1), use_container_width=True)
+    else:
+        st.info("No database calls recorded yet.")
+    
+    st.markdown("### Page Renders")
+    renders = registry.summary("page_render_seconds")
+    if renders:
+        st.dataframe(pd.DataFrame(renders).round(1), use_container_width=True)
+    else:
+        st.info("No page renders recorded yet.")
+    
+    if stats:
+        st.markdown("### Cached Worksheets")
+        rows_read = {dict(labels)["sheet"]: value for labels, value in registry.counters("sheets_rows_read_total").items()}
+        rows_written = {dict(labels)["sheet"]: value for labels, value in registry.counters("sheets_rows_written_total").items()}
+        st.table(pd.DataFrame([
+            {
+                "Worksheet": sheet_name,
+                "Cached Rows": table["rows"],
+                "Age (s)": table["age_seconds"],
+                "Rows Downloaded": rows_read.get(sheet_name, 0),
+                "Rows Appended": rows_written.get(sheet_name, 0)
+            }
+            for sheet_name, table in stats["tables"].items()
+        ]))
+    
+    # Only shown when ARCHIVE_DIR is set
+    if db.archive is not None:
+        st.markdown("### Appointment Archive")
+        archive_stats = db.archive.stats()
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.metric("Archived Appointments", archive_stats["rows"])
+        
+        with col2:
+            st.metric("Month Segments", archive_stats["segments"])
+        
+        cutoff = st.date_input(
+            "Archive finished appointments dated before",
+            datetime.now().date() - timedelta(days=config.ARCHIVE_AFTER_DAYS)
+        )
+        if st.button("Archive Appointments"):
+            success, message = db.archive_appointments(cutoff)
+            if success:
+                st.success(message)
+            else:
+                st.error(message)
+    
+    # The same text is served to Prometheus when METRICS_FILE or METRICS_PORT is set
+    export = registry.render()
+    st.download_button("Download Metrics", export, file_name="metrics.prom", mime="text/plain")
+    with st.expander("Prometheus Export"):
+        st.code(export)
+
 def main():
     """Main application function"""
     # Always render the sidebar first before any other content
@@ -1220,7 +1451,7 @@ def main():
         
         if st.session_state.admin_logged_in:
             st.title("Admin Panel")
-            menu_options = ["Dashboard", "Manage Doctors", "Manage Patients", "Appointment Reports", "Logout"]
+            menu_options = ["Dashboard", "Manage Doctors", "Manage Patients", "Appointment Reports", "Performance", "Logout"]
             choice = st.radio("Admin Menu", menu_options)
             
             st.write(f"Logged in as: {st.session_state.user_name}")
@@ -1235,6 +1466,8 @@ def main():
                 st.session_state.current_page = "manage_patients"
             elif choice == "Appointment Reports":
                 st.session_state.current_page = "appointment_reports"
+            elif choice == "Performance":
+                st.session_state.current_page = "performance"
             elif choice == "Logout":
                 st.session_state.admin_logged_in = False
                 st.session_state.logged_in = False
@@ -1318,6 +1551,8 @@ def main():
                 show_manage_patients_page()
             elif st.session_state.current_page == "appointment_reports":
                 show_appointment_reports_page()
+            elif st.session_state.current_page == "performance":
+                show_performance_page()
         elif st.session_state.user_type == "patient":
             if st.session_state.current_page == "dashboard":
                 show_patient_dashboard()
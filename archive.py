@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import numpy as np
+from columnar import ColumnarAppointments, _day_to_date, _minute_to_time
+from models import Appointment
+
+# Bumped whenever the file layout changes, so an older archive is rebuilt rather than misread
+ARCHIVE_FORMAT = 1
+
+# Fixed-width column files of every segment, by name; each holds one value per row
+COLUMN_TYPES = {
+    "id": np.dtype("S16"),
+    "patient_id": np.dtype("S16"),
+    "doctor_id": np.dtype("S16"),
+    "day": np.dtype(np.int32),
+    "minute": np.dtype(np.int16),
+    "status": np.dtype(np.int8),
+    "created_at": np.dtype(np.int64),
+    # End offset of each row's notes in notes.bin
+    "notes_end": np.dtype(np.int64)
+}
+
+def _month(day):
+    """Get the partition of a date, e.g. "2024-03" """
+    return f"{day.year:04d}-{day.month:02d}"
+
+class _Segment:
+    """One month of archived appointments, its columns memory-mapped read-only on first use"""
+    
+    def __init__(self, path, rows):
+        self.path = path
+        self.rows = rows
+        self._columns = {}
+        self._lock = threading.Lock()
+    
+    def _map(self, name, dtype, count):
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=dtype, mode="r", shape=(count,))
+    
+    def column(self, name):
+        """Get a column as a read-only view of its file; only the pages read are loaded"""
+        array = self._columns.get(name)
+        if array is None:
+            with self._lock:
+                array = self._columns.get(name)
+                if array is None:
+                    array = self._columns[name] = self._map(name, COLUMN_TYPES[name], self.rows)
+        return array
+    
+    def notes(self, rows):
+        """Get the notes of some rows, decoded from the segment's UTF-8 buffer"""
+        ends = self.column("notes_end")
+        if not self.rows or not ends[-1]:
+            return [""] * len(rows)
+        buffer = self._columns.get("notes")
+        if buffer is None:
+            buffer = self._columns["notes"] = self._map("notes", np.uint8, int(ends[-1]))
+        return [
+            bytes(buffer[(ends[row - 1] if row else 0):ends[row]]).decode()
+            for row in rows.tolist()
+        ]
+
+class AppointmentArchive:
+    """Append-only columnar store of old appointments, partitioned by month and read through memory maps
+
+    Each month is a directory of fixed-width column files (IDs as bytes,
+    dates, times and timestamps as integers, status as a code) plus the
+    notes as one UTF-8 buffer. Rows are only ever appended: the manifest
+    records how many rows of each segment are complete, and is replaced in
+    one step after the columns are written, so bytes left by an interrupted
+    append are ignored and overwritten by the next one. Queries read only the
+    months in their date range and filter the mapped columns with NumPy,
+    decoding just the rows that match.
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        # Rows of the source appended so far, including any skipped for having no date
+        self.source_rows = 0
+        # Greatest archived ID, compared by length then text so A10000 follows A9999
+        self.highest_id = ""
+        self._statuses = []
+        self._segments = {}
+        self._lock = threading.Lock()
+        self._load_manifest()
+    
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+    
+    def _load_manifest(self):
+        """Open the segments listed in the manifest; an unreadable one starts the archive afresh"""
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("format") != ARCHIVE_FORMAT:
+                print(f"Ignoring appointment archive in {self.directory}: format {manifest.get('format')}")
+                return
+            self.source_rows = manifest["source_rows"]
+            self.highest_id = manifest["highest_id"]
+            self._statuses = manifest["statuses"]
+            self._segments = {
+                month: _Segment(os.path.join(self.directory, month), rows)
+                for month, rows in manifest["segments"].items()
+            }
+        except Exception as e:
+            print(f"Error loading appointment archive: {e}")
+    
+    def _save_manifest(self, segments):
+        manifest = {
+            "format": ARCHIVE_FORMAT,
+            "source_rows": self.source_rows,
+            "highest_id": self.highest_id,
+            "statuses": self._statuses,
+            "segments": {month: segment.rows for month, segment in sorted(segments.items())}
+        }
+        temporary = self._manifest_path() + ".tmp"
+        with open(temporary, "w") as output:
+            json.dump(manifest, output)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temporary, self._manifest_path())
+    
+    def __len__(self):
+        return sum(segment.rows for segment in self._segments.values())
+    
+    def stats(self):
+        """Get the number of archived rows and month segments"""
+        segments = dict(self._segments)
+        return {"rows": sum(segment.rows for segment in segments.values()), "segments": len(segments)}
+    
+    def covers(self, day):
+        """Whether any appointment is archived in the month of a date"""
+        return _month(day) in self._segments
+    
+    def _status_code(self, status):
+        if status not in self._statuses:
+            self._statuses.append(status)
+        return self._statuses.index(status)
+    
+    def append(self, appointments):
+        """Append appointments from the source, in source order; returns how many were archived
+        
+        Appointments without a date can't be placed in a month and are only
+        counted in source_rows, so it keeps matching the source's row count.
+        """
+        appointments = list(appointments)
+        for appt in appointments:
+            if len(appt.id.encode()) > COLUMN_TYPES["id"].itemsize:
+                raise ValueError(f"Appointment ID too long to archive: {appt.id}")
+        
+        by_month = {}
+        for appt in appointments:
+            if appt.date is not None:
+                by_month.setdefault(_month(appt.date), []).append(appt)
+        
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            segments = dict(self._segments)
+            for month, rows in by_month.items():
+                segment = segments.get(month) or _Segment(os.path.join(self.directory, month), 0)
+                segments[month] = self._append_segment(segment, rows)
+                for appt in rows:
+                    if (len(appt.id), appt.id) > (len(self.highest_id), self.highest_id):
+                        self.highest_id = appt.id
+            self.source_rows += len(appointments)
+            # The new rows only count once the manifest says so
+            self._save_manifest(segments)
+            self._segments = segments
+        return sum(len(rows) for rows in by_month.values())
+    
+    def _append_segment(self, segment, appointments):
+        """Write rows after the complete ones of a segment; returns the segment grown to include them"""
+        os.makedirs(segment.path, exist_ok=True)
+        notes = [appt.notes.encode() for appt in appointments]
+        notes_start = int(segment.column("notes_end")[-1]) if segment.rows else 0
+        columns = {
+            "id": [appt.id.encode() for appt in appointments],
+            "patient_id": [appt.patient_id.encode() for appt in appointments],
+            "doctor_id": [appt.doctor_id.encode() for appt in appointments],
+            "day": [ColumnarAppointments._day(appt.date) for appt in appointments],
+            "minute": [ColumnarAppointments._minute(appt.time) for appt in appointments],
+            "status": [self._status_code(appt.status) for appt in appointments],
+            "created_at": [ColumnarAppointments._timestamp(appt.created_at) for appt in appointments],
+            "notes_end": np.cumsum([len(text) for text in notes], dtype=np.int64) + notes_start
+        }
+        
+        def write(name, data, complete_bytes):
+            with open(os.path.join(segment.path, f"{name}.bin"), "ab") as output:
+                # Drop anything an interrupted append left after the complete rows
+                output.truncate(complete_bytes)
+                output.write(data)
+                output.flush()
+                os.fsync(output.fileno())
+        
+        for name, values in columns.items():
+            dtype = COLUMN_TYPES[name]
+            write(name, np.asarray(values, dtype=dtype).tobytes(), segment.rows * dtype.itemsize)
+        write("notes", b"".join(notes), notes_start)
+        return _Segment(segment.path, segment.rows + len(appointments))
+    
+    def _months(self, start, end):
+        """Get the segments whose month overlaps [start, end], in date order"""
+        low = _month(start) if start else None
+        high = _month(end) if end else None
+        return [
+            segment for month, segment in sorted(self._segments.items())
+            if (low is None or month >= low) and (high is None or month <= high)
+        ]
+    
+    def query(self, doctor_id=None, patient_id=None, start=None, end=None, statuses=None):
+        """Get archived appointments matching every given filter, sorted by date and time
+        
+        Filters are compared against the mapped columns; only matching rows
+        are turned into Appointment models.
+        """
+        status_codes = None
+        if statuses is not None:
+            status_codes = [code for code, status in enumerate(self._statuses) if status in statuses]
+            if not status_codes:
+                return []
+        
+        results = []
+        for segment in self._months(start, end):
+            if not segment.rows:
+                continue
+            days = segment.column("day")
+            mask = np.ones(segment.rows, dtype=bool)
+            if doctor_id is not None:
+                mask &= segment.column("doctor_id") == doctor_id.encode()
+            if patient_id is not None:
+                mask &= segment.column("patient_id") == patient_id.encode()
+            if start is not None:
+                mask &= days >= ColumnarAppointments._day(start)
+            if end is not None:
+                mask &= days <= ColumnarAppointments._day(end)
+            if status_codes is not None:
+                mask &= np.isin(segment.column("status"), status_codes)
+            
+            rows = np.flatnonzero(mask)
+            if not len(rows):
+                continue
+            # Months don't overlap, so sorting within each one sorts them all
+            minutes = segment.column("minute")[rows]
+            rows = rows[np.lexsort((minutes, days[rows]))]
+            results.extend(self._materialize(segment, rows))
+        return results
+    
+    def _materialize(self, segment, rows):
+        """Build Appointment models for some rows of a segment"""
+        statuses = self._statuses
+        # Missing timestamps are stored as the smallest int64, which is NumPy's NaT and converts to None
+        created = segment.column("created_at")[rows].view("datetime64[s]").tolist()
+        return [
+            Appointment(
+                id=appointment_id.decode(),
+                patient_id=patient_id.decode(),
+                doctor_id=doctor_id.decode(),
+                date=_day_to_date(day),
+                time=None if minute < 0 else _minute_to_time(minute),
+                status=statuses[status],
+                notes=notes,
+                created_at=created_at
+            )
+            for appointment_id, patient_id, doctor_id, day, minute, status, notes, created_at in zip(
+                segment.column("id")[rows].tolist(),
+                segment.column("patient_id")[rows].tolist(),
+                segment.column("doctor_id")[rows].tolist(),
+                segment.column("day")[rows].tolist(),
+                segment.column("minute")[rows].tolist(),
+                segment.column("status")[rows].tolist(),
+                segment.notes(rows),
+                created
+            )
+        ]
+    
+    def archived_ids(self, appointment_ids):
+        """Get the subset of appointment IDs that are already archived"""
+        width = COLUMN_TYPES["id"].itemsize
+        # Longer IDs can't have been archived, and would be cut short to match a different one
+        encoded = [appointment_id.encode() for appointment_id in appointment_ids]
+        wanted = np.array([value for value in encoded if len(value) <= width], dtype=COLUMN_TYPES["id"])
+        found = set()
+        if not len(wanted):
+            return found
+        for segment in list(self._segments.values()):
+            ids = segment.column("id")
+            found.update(value.decode() for value in ids[np.isin(ids, wanted)].tolist())
+        return found
+    
+    def columns(self):
+        """Get every archived row as NumPy arrays: id, doctor_id and status as text, date as datetime64[D]"""
+        segments = [segment for _, segment in sorted(self._segments.items()) if segment.rows]
+        statuses = np.array(self._statuses or [""], dtype=object)
+        
+        def gather(name):
+            if not segments:
+                return np.empty(0, dtype=COLUMN_TYPES[name])
+            return np.concatenate([segment.column(name) for segment in segments])
+        
+        return {
+            "id": gather("id").astype(str),
+            "doctor_id": gather("doctor_id").astype(str),
+            "date": gather("day").astype("datetime64[D]"),
+            "status": statuses[gather("status")]
+        }
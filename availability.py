@@ -0,0 +1,100 @@
+from models import parse_time
+from utils import generate_time_slots
+import config
+
+# Every bookable time of a working day; bit i of a day mask stands for SLOT_TIMES[i]
+SLOT_TIMES = tuple(parse_time(slot) for slot in generate_time_slots(
+    config.WORKING_HOURS["start"],
+    config.WORKING_HOURS["end"],
+    config.APPOINTMENT_DURATION
+))
+SLOT_BITS = {time: 1 << slot for slot, time in enumerate(SLOT_TIMES)}
+FULL_DAY = (1 << len(SLOT_TIMES)) - 1
+
+def booked_mask(times):
+    """Get the day mask with the bits of the given times set; times off the grid are ignored"""
+    mask = 0
+    for time in times:
+        mask |= SLOT_BITS.get(time, 0)
+    return mask
+
+def free_times(mask):
+    """Get the times whose bits are clear in a day mask, in order"""
+    free = ~mask & FULL_DAY
+    return [time for time in SLOT_TIMES if free & SLOT_BITS[time]]
+
+class AvailabilityIndex:
+    """Bitmask of booked slots per (doctor, date), kept as an IndexedTable index
+
+    Only live (not cancelled) appointments set bits, so cancelling a booking
+    through IndexedTable.update frees its slot again.
+    """
+    
+    fields = ("doctor_id", "date", "time", "status")
+    
+    def __init__(self):
+        self._masks = {}
+        # Extra live bookings of slots that are already set, so removing one keeps the bit
+        self._overbooked = {}
+    
+    @classmethod
+    def from_masks(cls, masks, overbooked=None):
+        """Create an index from precomputed {(doctor, date): mask} and {(key, bit): extra bookings}"""
+        index = cls()
+        index._masks = dict(masks)
+        index._overbooked = dict(overbooked or {})
+        return index
+    
+    @staticmethod
+    def _slot(record):
+        """Get the (doctor, date) key and slot bit of a live appointment, or None"""
+        bit = SLOT_BITS.get(record.time)
+        if bit is None or record.date is None or record.status == "Cancelled":
+            return None
+        return (record.doctor_id, record.date), bit
+    
+    def add(self, record, position):
+        """Mark the slot of an appointment as booked"""
+        slot = self._slot(record)
+        if slot is None:
+            return
+        key, bit = slot
+        mask = self._masks.get(key, 0)
+        if mask & bit:
+            self._overbooked[(key, bit)] = self._overbooked.get((key, bit), 0) + 1
+        else:
+            self._masks[key] = mask | bit
+    
+    def remove(self, record, position):
+        """Free the slot of an appointment unless another live booking still holds it"""
+        slot = self._slot(record)
+        if slot is None:
+            return
+        key, bit = slot
+        extra = self._overbooked.get((key, bit), 0)
+        if extra:
+            if extra == 1:
+                del self._overbooked[(key, bit)]
+            else:
+                self._overbooked[(key, bit)] = extra - 1
+            return
+        
+        mask = self._masks.get(key, 0) & ~bit
+        if mask:
+            self._masks[key] = mask
+        else:
+            self._masks.pop(key, None)
+    
+    def get(self, key):
+        """Get the booked mask of a (doctor, date) key"""
+        return self._masks.get(key, 0)
+    
+    def free_slots(self, doctor_id, dates):
+        """Get {date: free times} for a doctor over several dates"""
+        return {date: free_times(self.get((doctor_id, date))) for date in dates}
+    
+    def __contains__(self, key):
+        return key in self._masks
+    
+    def __len__(self):
+        return len(self._masks)
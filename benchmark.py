@@ -0,0 +1,305 @@
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List
+from analytics import AppointmentAnalytics
+from availability import SLOT_TIMES
+from database import GoogleSheetsDatabase
+from fake_sheets import FakeSpreadsheet
+from models import format_date, format_time
+from repository import TABLE_COLUMNS
+from snapshot import SnapshotStore
+import config
+
+@dataclass
+class ScenarioResult:
+    """Latencies and API usage of one benchmarked operation at one table size"""
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    api_calls: int = 0
+    errors: int = 0
+    
+    @property
+    def operations(self):
+        return len(self.latencies)
+    
+    @property
+    def throughput(self):
+        total = sum(self.latencies)
+        return self.operations / total if total else 0.0
+    
+    def percentile(self, q):
+        """Get a latency percentile in milliseconds, nearest rank"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000
+    
+    def summary(self):
+        return {
+            "operations": self.operations,
+            "throughput": round(self.throughput, 1),
+            "p50_ms": round(self.percentile(50), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "api_calls_per_op": round(self.api_calls / self.operations, 3) if self.operations else 0.0,
+            "errors": self.errors
+        }
+
+def seed_spreadsheet(spreadsheet, rows, seed=42):
+    """Fill a fake spreadsheet with rows appointments and proportionate doctors and patients"""
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    doctor_count = max(10, rows // 1000)
+    patient_count = max(100, rows // 10)
+    
+    doctors = [
+        [f"D{i:04d}", f"Doctor {i}", config.SPECIALTIES[i % len(config.SPECIALTIES)],
+         f"doctor{i}@example.com", f"555{i:07d}", "Mon-Fri"]
+        for i in range(1, doctor_count + 1)
+    ]
+    patients = [
+        [f"P{i:04d}", f"Patient {i}", f"patient{i}@example.com", f"555{i:07d}",
+         "1980-01-01", f"{i} Main Street", "", "2024-01-01 09:00:00"]
+        for i in range(1, patient_count + 1)
+    ]
+    appointments = [
+        [f"A{i:04d}", f"P{rng.randint(1, patient_count):04d}", f"D{rng.randint(1, doctor_count):04d}",
+         format_date(today + timedelta(days=rng.randint(-180, 30))), format_time(rng.choice(SLOT_TIMES)),
+         rng.choices(config.APPOINTMENT_STATUSES, weights=[3, 6, 1])[0], "", "2024-01-01 09:00:00"]
+        for i in range(1, rows + 1)
+    ]
+    
+    for sheet_name, data in (("Doctors", doctors), ("Patients", patients), ("Appointments", appointments)):
+        worksheet = spreadsheet.add_worksheet(title=sheet_name, rows=len(data) + 1, cols=10)
+        worksheet.load([TABLE_COLUMNS[sheet_name]] + data)
+    spreadsheet.reset_counters()
+    return doctor_count, patient_count
+
+def build_scenarios(db, doctor_count, patient_count, seed=42):
+    """Get (name, operation) pairs covering every database method and the data each page loads"""
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    week = [today + timedelta(days=offset) for offset in range(7)]
+    half_year = today - timedelta(days=180)
+    two_weeks = [today + timedelta(days=offset) for offset in range(14)]
+    analytics = AppointmentAnalytics(db)
+    counter = iter(range(1, 10 ** 9))
+    
+    def doctor():
+        return f"D{rng.randint(1, doctor_count):04d}"
+    
+    def patient():
+        return f"P{rng.randint(1, patient_count):04d}"
+    
+    def appointment():
+        return f"A{rng.randint(1, len(db.get_all_appointments())):04d}"
+    
+    def new_patient():
+        number = next(counter)
+        return {"name": f"Bench {number}", "email": f"bench{number}@example.com", "phone": "5550000000",
+                "dob": "1990-01-01", "address": "", "medical_history": ""}
+    
+    def book():
+        # Far enough ahead that most slots are free
+        day = today + timedelta(days=rng.randint(60, 400))
+        return db.book_appointment({"patient_id": patient(), "doctor_id": doctor(), "date": day,
+                                    "time": rng.choice(SLOT_TIMES), "notes": ""})
+    
+    return [
+        ("get_all_patients", db.get_all_patients),
+        ("get_patient_by_id", lambda: db.get_patient_by_id(patient())),
+        ("get_patient_by_email", lambda: db.get_patient_by_email(f"patient{rng.randint(1, patient_count)}@example.com")),
+        ("list_patients", lambda: db.list_patients(page_size=50)),
+        ("list_patients_search", lambda: db.list_patients(f"patient {rng.randint(1, 9)}", page_size=50)),
+        ("list_patients_typo", lambda: db.list_patients(f"patinet {rng.randint(1, patient_count)}", page_size=50)),
+        ("get_all_doctors", db.get_all_doctors),
+        ("list_doctors", lambda: db.list_doctors(page_size=50)),
+        ("get_doctor_by_id", lambda: db.get_doctor_by_id(doctor())),
+        ("get_doctor_by_email", lambda: db.get_doctor_by_email(f"doctor{rng.randint(1, doctor_count)}@example.com")),
+        ("get_doctors_by_specialty", lambda: db.get_doctors_by_specialty(rng.choice(config.SPECIALTIES))),
+        ("get_all_appointments", db.get_all_appointments),
+        ("get_appointments_week", lambda: db.get_appointments(doctor_id=doctor(), start=week[0], end=week[-1])),
+        ("get_appointments_history", lambda: db.get_appointments(doctor_id=doctor(), start=half_year, end=today)),
+        ("get_patient_appointments", lambda: db.get_patient_appointments(patient())),
+        ("get_doctor_appointments", lambda: db.get_doctor_appointments(doctor(), today)),
+        ("get_available_slots", lambda: db.get_available_slots(doctor(), two_weeks)),
+        ("find_first_available", lambda: db.find_first_available(rng.choice(config.SPECIALTIES), count=10)),
+        ("data_version", db.data_version),
+        ("add_patient", lambda: db.add_patient(new_patient())),
+        ("bulk_add_patients_50", lambda: db.bulk_add_patients([new_patient() for _ in range(50)])),
+        ("book_appointment", book),
+        ("update_appointment_status", lambda: db.update_appointment_status(appointment(), rng.choice(["Scheduled", "Completed"]))),
+        # What each page loads on a render
+        ("page_patient_dashboard", lambda: (db.get_patient_by_id(patient()),
+                                            db.get_patient_appointments(patient(), fields=("doctor_name", "specialty")))),
+        ("page_book_appointment", lambda: [db.get_available_slots(d.id, two_weeks)
+                                           for d in db.get_doctors_by_specialty(rng.choice(config.SPECIALTIES))[:1]]),
+        ("page_doctor_schedule", lambda: (db.get_doctor_appointments(doctor(), today, fields=("patient_name",)),
+                                          db.get_appointments(doctor_id=doctor(), start=week[0], end=week[-1],
+                                                              fields=("patient_name",)))),
+        ("page_patient_records", lambda: db.list_patients(doctor_id=doctor(), page_size=50)),
+        ("page_admin_dashboard", lambda: (db.list_patients(page_size=1), db.list_doctors(page_size=1),
+                                          analytics.total(), analytics.counts_by_status())),
+        ("page_appointment_reports", lambda: (analytics.counts_by_status(), analytics.counts_by_specialty(),
+                                              analytics.counts_by_date_range(today - timedelta(days=6), today),
+                                              analytics.counts_by_doctor()))
+    ]
+
+def run_scenario(spreadsheet, name, operation, iterations):
+    """Time iterations calls of an operation, counting the API calls they make"""
+    result = ScenarioResult(name)
+    calls_before = spreadsheet.api_calls
+    for _ in range(iterations):
+        started = time.perf_counter()
+        try:
+            operation()
+        except Exception:
+            result.errors += 1
+        result.latencies.append(time.perf_counter() - started)
+    result.api_calls = spreadsheet.api_calls - calls_before
+    return result
+
+def run_snapshot_start(spreadsheet, db, iterations):
+    """Time a new process serving its first reads from a snapshot of db's tables
+    
+    The background sync that follows is waited for outside the timing, but
+    its API calls are counted.
+    """
+    snapshot_dir = tempfile.mkdtemp(prefix="benchmark-snapshot-")
+    try:
+        store = SnapshotStore(snapshot_dir)
+        for sheet_name in TABLE_COLUMNS:
+            store.save(sheet_name, db._get_records(sheet_name))
+        
+        result = ScenarioResult("snapshot_start")
+        calls_before = spreadsheet.api_calls
+        for _ in range(iterations):
+            started = time.perf_counter()
+            try:
+                warm = GoogleSheetsDatabase(spreadsheet=spreadsheet, snapshot_dir=snapshot_dir)
+                warm.get_all_appointments()
+                warm.get_all_patients()
+                warm.get_all_doctors()
+            except Exception:
+                result.errors += 1
+                warm = None
+            result.latencies.append(time.perf_counter() - started)
+            if warm is not None and warm._reconciler is not None:
+                warm._reconciler.join()
+        result.api_calls = spreadsheet.api_calls - calls_before
+        return result
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+# Scenarios repeated once finished appointments older than ARCHIVED_DAYS are archived
+ARCHIVE_SCENARIOS = ["book_appointment", "get_appointments_history", "get_patient_appointments", "page_appointment_reports"]
+ARCHIVED_DAYS = 30
+
+def run_archived(rows, iterations, latency=0.0, quota=None):
+    """Benchmark bookings and history reads against the same data with its old appointments archived
+    
+    Uses a spreadsheet of its own, seeded like run_size's, so the other
+    scenarios still see every appointment in the Appointments sheet.
+    """
+    spreadsheet = FakeSpreadsheet(latency=latency, requests_per_minute=quota)
+    doctor_count, patient_count = seed_spreadsheet(spreadsheet, rows)
+    archive_dir = tempfile.mkdtemp(prefix="benchmark-archive-")
+    try:
+        db = GoogleSheetsDatabase(spreadsheet=spreadsheet, archive_dir=archive_dir)
+        cutoff = datetime.now().date() - timedelta(days=ARCHIVED_DAYS)
+        results = [run_scenario(spreadsheet, "archive_appointments", lambda: db.archive_appointments(cutoff), 1)]
+        
+        scenarios = dict(build_scenarios(db, doctor_count, patient_count))
+        for name in ARCHIVE_SCENARIOS:
+            results.append(run_scenario(spreadsheet, f"archived_{name}", scenarios[name], iterations))
+        return results
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+
+def run_size(rows, iterations, latency=0.0, quota=None):
+    """Benchmark every scenario against a fake spreadsheet holding rows appointments"""
+    spreadsheet = FakeSpreadsheet(latency=latency, requests_per_minute=quota)
+    doctor_count, patient_count = seed_spreadsheet(spreadsheet, rows)
+    db = GoogleSheetsDatabase(spreadsheet=spreadsheet)
+    
+    results = []
+    
+    # Cold start: every worksheet downloaded and indexed from scratch
+    def cold_load():
+        db.invalidate_cache()
+        db.get_all_appointments()
+        db.get_all_patients()
+        db.get_all_doctors()
+    results.append(run_scenario(spreadsheet, "cold_load", cold_load, max(1, min(iterations, 5))))
+    results.append(run_snapshot_start(spreadsheet, db, max(1, min(iterations, 5))))
+    
+    for name, operation in build_scenarios(db, doctor_count, patient_count):
+        results.append(run_scenario(spreadsheet, name, operation, iterations))
+    results.extend(run_archived(rows, iterations, latency, quota))
+    return results
+
+def print_results(rows, results):
+    print(f"\n{rows:,} appointments")
+    print(f"{'scenario':<36}{'ops':>7}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'API/op':>8}{'errors':>8}")
+    for result in results:
+        summary = result.summary()
+        print(f"{result.name:<36}{summary['operations']:>7}{summary['throughput']:>12,.1f}"
+              f"{summary['p50_ms']:>10.3f}{summary['p99_ms']:>10.3f}{summary['api_calls_per_op']:>8.2f}"
+              f"{summary['errors']:>8}")
+
+def find_regressions(current, baseline, tolerance):
+    """Compare summaries with a baseline run; returns a description of each regression"""
+    regressions = []
+    for rows, scenarios in current.items():
+        for name, summary in scenarios.items():
+            before = baseline.get(rows, {}).get(name)
+            if before is None:
+                continue
+            # Sub-millisecond noise isn't worth failing a build over
+            if summary["p50_ms"] > before["p50_ms"] * tolerance and summary["p50_ms"] - before["p50_ms"] > 0.1:
+                regressions.append(f"{name} at {rows} rows: p50 {before['p50_ms']}ms -> {summary['p50_ms']}ms")
+            if summary["api_calls_per_op"] > before["api_calls_per_op"]:
+                regressions.append(f"{name} at {rows} rows: API calls per op "
+                                   f"{before['api_calls_per_op']} -> {summary['api_calls_per_op']}")
+            if summary["errors"] > before["errors"]:
+                regressions.append(f"{name} at {rows} rows: errors {before['errors']} -> {summary['errors']}")
+    return regressions
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark the Google Sheets backend against an in-memory fake spreadsheet")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="Appointment counts to test")
+    parser.add_argument("--iterations", type=int, default=200, help="Calls per scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per API call")
+    parser.add_argument("--quota", type=int, help="Simulated API requests allowed per minute")
+    parser.add_argument("--json", help="Write the summaries to this file")
+    parser.add_argument("--compare", help="Fail if slower than the summaries in this file")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed p50 slowdown against --compare")
+    args = parser.parse_args()
+    
+    summaries = {}
+    for rows in args.rows:
+        results = run_size(rows, args.iterations, args.latency, args.quota)
+        print_results(rows, results)
+        summaries[str(rows)] = {result.name: result.summary() for result in results}
+    
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(summaries, output, indent=2)
+    
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = find_regressions(summaries, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
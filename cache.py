@@ -0,0 +1,164 @@
+import threading
+import time
+from indexes import IndexedTable
+import config
+
+class TableCache:
+    """In-memory cache of indexed worksheet records with a time-to-live"""
+    
+    def __init__(self, ttl_seconds=None, index_specs=None, table_types=None):
+        if ttl_seconds is None:
+            ttl_seconds = config.CACHE_TTL_SECONDS
+        self.ttl_seconds = ttl_seconds
+        # Maps a table name to {index name: factory returning an empty index}, e.g. a functools.partial of HashIndex
+        self.index_specs = index_specs or {}
+        # Maps a table name to the class its records are held in, IndexedTable by default
+        self.table_types = table_types or {}
+        self.hits = 0
+        self.misses = 0
+        # Expired tables served because reloading them failed
+        self.stale_served = 0
+        # Bumped whenever a cached table is loaded or changed, overall and per table
+        self.version = 0
+        self.table_versions = {}
+        self._entries = {}
+        self._table_locks = {}
+        self._lock = threading.Lock()
+    
+    def _table_lock(self, table):
+        """Get the lock that serializes loads of a single table"""
+        with self._lock:
+            if table not in self._table_locks:
+                self._table_locks[table] = threading.Lock()
+            return self._table_locks[table]
+    
+    def _fresh_entry(self, table):
+        """Return the entry for a table if it has not expired yet"""
+        entry = self._entries.get(table)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["loaded_at"] >= self.ttl_seconds:
+            return None
+        return entry
+    
+    def get(self, table, loader, refresher=None):
+        """Get the IndexedTable for a table, calling loader() to fetch its records on a miss
+        
+        When a cached table has expired, refresher(indexed table) is tried
+        first to bring it up to date in place; it returns False to have the
+        table loaded again in full. If refreshing or reloading an expired
+        table fails, the expired table is served for another TTL instead.
+        """
+        with self._lock:
+            entry = self._fresh_entry(table)
+            if entry is not None:
+                self.hits += 1
+                return entry["table"]
+        
+        with self._table_lock(table):
+            # Another thread may have loaded the table while we were waiting
+            with self._lock:
+                entry = self._fresh_entry(table)
+                if entry is not None:
+                    self.hits += 1
+                    return entry["table"]
+                self.misses += 1
+                stale = self._entries.get(table)
+            
+            try:
+                if stale is not None and refresher is not None and refresher(stale["table"]):
+                    with self._lock:
+                        # Invalidated while refreshing: keep the refreshed table out of the cache
+                        if self._entries.get(table) is stale:
+                            stale["loaded_at"] = time.monotonic()
+                    return stale["table"]
+                
+                table_type = self.table_types.get(table, IndexedTable)
+                indexed = table_type(loader(), self.index_specs.get(table))
+            except Exception as e:
+                if stale is None:
+                    raise
+                # Records a little out of date beat an empty page while the API is failing
+                print(f"Error reloading {table}, serving cached records: {e}")
+                with self._lock:
+                    self.stale_served += 1
+                    if self._entries.get(table) is stale:
+                        stale["loaded_at"] = time.monotonic()
+                return stale["table"]
+            
+            with self._lock:
+                self._entries[table] = {"table": indexed, "loaded_at": time.monotonic()}
+                self._bump(table)
+            return indexed
+    
+    def peek(self, table):
+        """Get the cached IndexedTable for a table even if it has expired, or None"""
+        with self._lock:
+            entry = self._entries.get(table)
+            return entry["table"] if entry is not None else None
+    
+    def append(self, table, record):
+        """Write a newly added record through to the cached table"""
+        with self._lock:
+            entry = self._entries.get(table)
+            if entry is not None:
+                entry["table"].append(record)
+                self._bump(table)
+    
+    def update(self, table, index_name, key, changes):
+        """Apply changes to the cached record matching key in one of the table's indexes"""
+        with self._lock:
+            entry = self._entries.get(table)
+            if entry is None:
+                return False
+            
+            positions = entry["table"].positions(index_name, key)
+            if not positions:
+                return False
+            entry["table"].update(positions[0], changes)
+            self._bump(table)
+            return True
+    
+    def update_at(self, table, position, changes):
+        """Apply changes to the cached record at a position"""
+        with self._lock:
+            entry = self._entries.get(table)
+            if entry is not None:
+                entry["table"].update(position, changes)
+                self._bump(table)
+    
+    def invalidate(self, table=None):
+        """Drop one table, or every table, from the cache"""
+        with self._lock:
+            if table is None:
+                self._entries.clear()
+                for name in list(self.table_versions):
+                    self._bump(name)
+            else:
+                self._entries.pop(table, None)
+                self._bump(table)
+    
+    def _bump(self, table):
+        """Record a change to a table; call with the lock held"""
+        self.version += 1
+        self.table_versions[table] = self.table_versions.get(table, 0) + 1
+    
+    def stats(self):
+        """Get hit/miss counters and the size and age of each cached table"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            now = time.monotonic()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stale_served": self.stale_served,
+                "ttl_seconds": self.ttl_seconds,
+                "tables": {
+                    table: {
+                        "rows": len(entry["table"]),
+                        "age_seconds": round(now - entry["loaded_at"], 1)
+                    }
+                    for table, entry in self._entries.items()
+                }
+            }
@@ -0,0 +1,346 @@
+from collections.abc import Sequence
+from dataclasses import replace
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+import numpy as np
+from availability import AvailabilityIndex, SLOT_TIMES
+from models import Appointment
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# Sentinels for missing values in the integer columns
+NO_DAY = np.iinfo(np.int32).min
+NO_MINUTE = -1
+NO_TIMESTAMP = np.iinfo(np.int64).min
+
+# Bit of each bookable minute of the day in an availability mask, -1 for minutes off the grid
+SLOT_OF_MINUTE = np.full(24 * 60, -1, dtype=np.int8)
+for _slot, _time in enumerate(SLOT_TIMES):
+    SLOT_OF_MINUTE[_time.hour * 60 + _time.minute] = _slot
+
+# Hash and sorted index names of the row-based Appointments table, answered here by column scans
+HASH_INDEX_FIELDS = {
+    "AppointmentID": ("id",),
+    "PatientID": ("patient_id",),
+    "DoctorID": ("doctor_id",),
+    "DoctorDate": ("doctor_id", "date")
+}
+SORTED_INDEX_GROUPS = {
+    "Schedule": (),
+    "DoctorSchedule": ("doctor_id",),
+    "PatientSchedule": ("patient_id",)
+}
+
+@lru_cache(maxsize=8192)
+def _day_to_date(day):
+    return date.fromordinal(day + EPOCH_ORDINAL)
+
+@lru_cache(maxsize=2048)
+def _minute_to_time(minute):
+    return time(minute // 60, minute % 60)
+
+class _Dictionary:
+    """Maps repeated strings to small integer codes and back"""
+    
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+    
+    def encode(self, value):
+        """Get the code of a value, assigning the next one if it is new"""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+    
+    def lookup(self, value):
+        """Get the code of a value, or -1 if it has never been seen"""
+        return self._codes.get(value, -1)
+
+class _Rows(Sequence):
+    """Read-only sequence view that materializes Appointment models on access"""
+    
+    def __init__(self, store):
+        self._store = store
+    
+    def __len__(self):
+        return len(self._store)
+    
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._store.row(index) for index in range(*position.indices(len(self._store)))]
+        if position < 0:
+            position += len(self._store)
+        if not 0 <= position < len(self._store):
+            raise IndexError(position)
+        return self._store.row(position)
+
+class ColumnarAppointments:
+    """Appointments held as NumPy columns, a drop-in replacement for an IndexedTable of Appointment models
+
+    Patient, doctor and status are dictionary-encoded, dates are int32 day
+    numbers and times are int16 minutes of the day, which takes a few dozen
+    bytes per row instead of a Python object per field. The index names used
+    for the row-based table are answered with vectorized column scans, and
+    only the per-day availability bitmap is kept as a real index.
+    """
+    
+    def __init__(self, records=(), index_specs=None):
+        self._size = 0
+        self._capacity = 0
+        self._ids = np.empty(0, dtype="S8")
+        self._patients = np.empty(0, dtype=np.int32)
+        self._doctors = np.empty(0, dtype=np.int32)
+        self._statuses = np.empty(0, dtype=np.int8)
+        self._days = np.empty(0, dtype=np.int32)
+        self._minutes = np.empty(0, dtype=np.int16)
+        self._created = np.empty(0, dtype=np.int64)
+        # Notes are mostly empty, so only the non-empty ones are kept, by position
+        self._notes = {}
+        self.patient_codes = _Dictionary()
+        self.doctor_codes = _Dictionary()
+        self.status_codes = _Dictionary()
+        self.records = _Rows(self)
+        
+        self._load(list(records))
+        self.indexes = {"Availability": self._build_availability()}
+    
+    def _grow(self, size):
+        """Make room for at least size rows, doubling the capacity"""
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2, 1024)
+        for name in ("_ids", "_patients", "_doctors", "_statuses", "_days", "_minutes", "_created"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+        self._capacity = capacity
+    
+    def _fit_id(self, appointment_id):
+        """Encode an appointment ID, widening the ID column if it is too short"""
+        encoded = appointment_id.encode()
+        if len(encoded) > self._ids.dtype.itemsize:
+            self._ids = self._ids.astype(f"S{len(encoded)}")
+        return encoded
+    
+    def _load(self, records):
+        """Fill the columns from a list of Appointment models in one pass"""
+        self._grow(len(records))
+        count = len(records)
+        if not count:
+            return
+        
+        width = max(len(appt.id.encode()) for appt in records)
+        if width > self._ids.dtype.itemsize:
+            self._ids = self._ids.astype(f"S{width}")
+        self._ids[:count] = [appt.id.encode() for appt in records]
+        self._patients[:count] = [self.patient_codes.encode(appt.patient_id) for appt in records]
+        self._doctors[:count] = [self.doctor_codes.encode(appt.doctor_id) for appt in records]
+        self._statuses[:count] = [self.status_codes.encode(appt.status) for appt in records]
+        self._days[:count] = [self._day(appt.date) for appt in records]
+        self._minutes[:count] = [self._minute(appt.time) for appt in records]
+        self._created[:count] = [self._timestamp(appt.created_at) for appt in records]
+        self._notes = {position: appt.notes for position, appt in enumerate(records) if appt.notes}
+        self._size = count
+    
+    @staticmethod
+    def _day(value):
+        return value.toordinal() - EPOCH_ORDINAL if value else NO_DAY
+    
+    @staticmethod
+    def _minute(value):
+        return value.hour * 60 + value.minute if value else NO_MINUTE
+    
+    @staticmethod
+    def _timestamp(value):
+        return int((value - EPOCH).total_seconds()) if value else NO_TIMESTAMP
+    
+    def _write(self, position, appt):
+        """Store an Appointment model in the columns at a position"""
+        self._ids[position] = self._fit_id(appt.id)
+        self._patients[position] = self.patient_codes.encode(appt.patient_id)
+        self._doctors[position] = self.doctor_codes.encode(appt.doctor_id)
+        self._statuses[position] = self.status_codes.encode(appt.status)
+        self._days[position] = self._day(appt.date)
+        self._minutes[position] = self._minute(appt.time)
+        self._created[position] = self._timestamp(appt.created_at)
+        if appt.notes:
+            self._notes[position] = appt.notes
+        else:
+            self._notes.pop(position, None)
+    
+    def row(self, position):
+        """Materialize the Appointment model stored at a position"""
+        day = int(self._days[position])
+        minute = int(self._minutes[position])
+        created = int(self._created[position])
+        return Appointment(
+            id=self._ids[position].decode(),
+            patient_id=self.patient_codes.values[self._patients[position]],
+            doctor_id=self.doctor_codes.values[self._doctors[position]],
+            date=_day_to_date(day) if day != NO_DAY else None,
+            time=_minute_to_time(minute) if minute != NO_MINUTE else None,
+            status=self.status_codes.values[self._statuses[position]],
+            notes=self._notes.get(position, ""),
+            created_at=EPOCH + timedelta(seconds=created) if created != NO_TIMESTAMP else None
+        )
+    
+    def _build_availability(self):
+        """Compute the booked-slot bitmap of every (doctor, date) with grouped bitwise ORs"""
+        size = self._size
+        live = np.ones(size, dtype=bool)
+        cancelled = self.status_codes.lookup("Cancelled")
+        if cancelled >= 0:
+            live &= self._statuses[:size] != cancelled
+        minutes = self._minutes[:size]
+        slots = np.where(minutes >= 0, SLOT_OF_MINUTE[np.clip(minutes, 0, None)], -1)
+        live &= (slots >= 0) & (self._days[:size] != NO_DAY)
+        if not live.any():
+            return AvailabilityIndex()
+        
+        # One int64 key per (doctor, day), plus the slot for spotting double bookings
+        keys = (self._doctors[:size][live].astype(np.int64) << 32) | (self._days[:size][live].astype(np.int64) & 0xFFFFFFFF)
+        slots = slots[live].astype(np.int64)
+        order = np.lexsort((slots, keys))
+        keys, slots = keys[order], slots[order]
+        
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        masks = np.bitwise_or.reduceat(np.left_shift(1, slots), starts)
+        
+        def key_of(key):
+            return (self.doctor_codes.values[int(key) >> 32], _day_to_date(int(np.int32(key & 0xFFFFFFFF))))
+        
+        # Extra live bookings of the same slot, so cancelling one keeps the slot booked
+        repeated = np.flatnonzero((keys[1:] == keys[:-1]) & (slots[1:] == slots[:-1])) + 1
+        overbooked = {}
+        for index in repeated.tolist():
+            slot_key = (key_of(keys[index]), 1 << int(slots[index]))
+            overbooked[slot_key] = overbooked.get(slot_key, 0) + 1
+        
+        return AvailabilityIndex.from_masks(
+            {key_of(key): int(mask) for key, mask in zip(keys[starts].tolist(), masks.tolist())},
+            overbooked
+        )
+    
+    def select(self, doctor_id=None, patient_id=None, start=None, end=None, statuses=None, day=None):
+        """Get the positions matching every given filter, sorted by date, time and position"""
+        size = self._size
+        mask = np.ones(size, dtype=bool)
+        
+        if doctor_id is not None:
+            mask &= self._doctors[:size] == self.doctor_codes.lookup(doctor_id)
+        if patient_id is not None:
+            mask &= self._patients[:size] == self.patient_codes.lookup(patient_id)
+        if day is not None:
+            mask &= self._days[:size] == self._day(day)
+        if start is not None:
+            mask &= self._days[:size] >= self._day(start)
+        if end is not None:
+            # Blank dates sort first, as in the row-based SortedIndex
+            mask &= self._days[:size] <= self._day(end)
+        if statuses is not None:
+            codes = [self.status_codes.lookup(status) for status in statuses]
+            mask &= np.isin(self._statuses[:size], codes)
+        
+        positions = np.flatnonzero(mask)
+        order = np.lexsort((positions, self._minutes[positions], self._days[positions]))
+        return positions[order].tolist()
+    
+    def count_by(self, field, positions=None):
+        """Count rows per patient ID, doctor ID or status, optionally only at some positions"""
+        column, codes = {
+            "patient_id": (self._patients, self.patient_codes),
+            "doctor_id": (self._doctors, self.doctor_codes),
+            "status": (self._statuses, self.status_codes)
+        }[field]
+        values = column[:self._size] if positions is None else column[positions]
+        counts = np.bincount(values, minlength=len(codes.values))
+        return {codes.values[code]: int(count) for code, count in enumerate(counts.tolist()) if count}
+    
+    def columns(self):
+        """Get the ID, doctor ID, date and status of every row as arrays, without materializing models
+        
+        Dates are datetime64[D], NaT where missing; the rest are strings.
+        """
+        size = self._size
+        days = self._days[:size]
+        return {
+            "id": self._ids[:size].astype(str),
+            "doctor_id": np.array(self.doctor_codes.values, dtype=object)[self._doctors[:size]],
+            "date": np.where(days == NO_DAY, np.datetime64("NaT", "D"), days.astype("datetime64[D]")),
+            "status": np.array(self.status_codes.values, dtype=object)[self._statuses[:size]]
+        }
+    
+    def positions(self, index_name, key):
+        """Get the positions of the rows matching key in one of the row-based table's hash indexes"""
+        fields = HASH_INDEX_FIELDS[index_name]
+        if fields == ("id",):
+            matches = np.flatnonzero(self._ids[:self._size] == str(key).encode())
+            # AppointmentID is unique; the first row wins, like the hash index
+            return matches[:1].tolist()
+        
+        values = dict(zip(fields, key if len(fields) > 1 else (key,)))
+        size = self._size
+        mask = np.ones(size, dtype=bool)
+        if "doctor_id" in values:
+            mask &= self._doctors[:size] == self.doctor_codes.lookup(values["doctor_id"])
+        if "patient_id" in values:
+            mask &= self._patients[:size] == self.patient_codes.lookup(values["patient_id"])
+        if "date" in values:
+            mask &= self._days[:size] == self._day(values["date"])
+        return np.flatnonzero(mask).tolist()
+    
+    def range(self, index_name, group=(), low=None, high=None):
+        """Get the rows of a group in one of the row-based table's sorted indexes, between two dates"""
+        filters = dict(zip(SORTED_INDEX_GROUPS[index_name], group))
+        return [self.row(position) for position in self.select(start=low, end=high, **filters)]
+    
+    def find(self, index_name, key):
+        """Get the first row matching key in an index, or None"""
+        positions = self.positions(index_name, key)
+        return self.row(positions[0]) if positions else None
+    
+    def find_all(self, index_name, key):
+        """Get every row matching key in an index"""
+        return [self.row(position) for position in self.positions(index_name, key)]
+    
+    def contains(self, index_name, key):
+        """Check whether any row matches key in an index"""
+        return bool(self.positions(index_name, key))
+    
+    def append(self, record):
+        """Append an Appointment model and add it to the availability bitmap"""
+        position = self._size
+        self._grow(position + 1)
+        self._write(position, record)
+        self._size += 1
+        self.indexes["Availability"].add(record, position)
+        return position
+    
+    def update(self, position, changes):
+        """Replace the row at a position with a copy having changed fields"""
+        record = self.row(position)
+        availability = self.indexes["Availability"]
+        availability.remove(record, position)
+        record = replace(record, **changes)
+        self._write(position, record)
+        availability.add(record, position)
+    
+    @property
+    def nbytes(self):
+        """Approximate memory held by the columns and dictionaries"""
+        columns = sum(
+            getattr(self, name)[:self._capacity].nbytes
+            for name in ("_ids", "_patients", "_doctors", "_statuses", "_days", "_minutes", "_created")
+        )
+        dictionaries = sum(
+            sum(len(value) + 49 for value in codes.values)
+            for codes in (self.patient_codes, self.doctor_codes, self.status_codes)
+        )
+        return columns + dictionaries + sum(len(note) + 49 for note in self._notes.values())
+    
+    def __len__(self):
+        return self._size
@@ -13,12 +13,70 @@ VERSION = "1.0.0"
 GOOGLE_SHEETS_CREDENTIALS_FILE = os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE")
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 
+# Storage backend: "sheets" for Google Sheets or "sqlite" for a local database file
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "sheets")
+SQLITE_DATABASE_PATH = os.getenv("SQLITE_DATABASE_PATH", "medical_appointments.db")
+
+# Size of the HTTPS connection pool shared by all sessions
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+# Google Sheets API limits
+# Requests per minute allowed by the Sheets API quota, and how many may go out at once after an idle spell
+SHEETS_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "60"))
+SHEETS_REQUEST_BURST = int(os.getenv("SHEETS_REQUEST_BURST", "10"))
+# Retries of a request that was throttled or hit a server error before giving up
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+
+# Cache settings
+# How long worksheet records are served from memory before being downloaded again
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+# How cached appointments are held: "rows" of models, or "columnar" NumPy arrays for large histories
+APPOINTMENT_STORE = os.getenv("APPOINTMENT_STORE", "rows")
+# Cached rows compared with the sheet on each refresh to catch edits made elsewhere
+SYNC_SAMPLE_ROWS = int(os.getenv("SYNC_SAMPLE_ROWS", "500"))
+# Every this many refreshes of a worksheet its ID and status columns are compared in full; 0 to disable
+SYNC_FULL_CHECK_EVERY = int(os.getenv("SYNC_FULL_CHECK_EVERY", "10"))
+
+# Snapshot settings
+# Directory the cached worksheets are saved to, e.g. "snapshot", so a restarted process serves them while it syncs; empty to disable
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+# How often the snapshot is rewritten, and how old one may be and still be served on startup
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+SNAPSHOT_MAX_AGE_HOURS = int(os.getenv("SNAPSHOT_MAX_AGE_HOURS", "24"))
+
+# Archive settings
+# Directory finished appointments are moved to once they are old, e.g. "archive"; empty to keep every appointment in the sheet
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+# Age in days past which appointments with one of ARCHIVE_STATUSES are archived
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_STATUSES = ["Completed", "Cancelled"]
+
+# Metrics settings
+# File rewritten with a Prometheus text export every METRICS_EXPORT_SECONDS, e.g. for a textfile collector; empty to disable
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_EXPORT_SECONDS = int(os.getenv("METRICS_EXPORT_SECONDS", "15"))
+# Port serving /metrics to a Prometheus scraper; 0 to disable
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Bulk import settings
+# Rows sent per append_rows request
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+# Write-behind settings
+# "true" to confirm new rows once they are cached and journaled, and append them to Sheets in the background
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_JOURNAL = os.getenv("WRITE_BEHIND_JOURNAL", "write_behind.jsonl")
+# Rows waiting for Sheets before new writes have to wait, and how many seconds they wait before failing
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "1000"))
+WRITE_BEHIND_MAX_WAIT = int(os.getenv("WRITE_BEHIND_MAX_WAIT", "5"))
+
 # Appointment settings
 WORKING_HOURS = {
     "start": 9,  # 9 AM
     "end": 17,   # 5 PM
 }
 APPOINTMENT_DURATION = 30  # minutes
+APPOINTMENT_STATUSES = ["Scheduled", "Completed", "Cancelled"]
 
 # Available specialties
 SPECIALTIES = [
@@ -1,58 +1,584 @@
+import heapq
+import re
+import threading
+from dataclasses import fields, replace
+from functools import partial
 import gspread
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import rowcol_to_a1
 from oauth2client.service_account import ServiceAccountCredentials
+from requests.adapters import HTTPAdapter
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from cache import TableCache
+from indexes import HashIndex, SortedIndex, TextIndex
+from availability import AvailabilityIndex, booked_mask
+from columnar import ColumnarAppointments
+from locks import LockManager, IdAllocator
+from sync import SheetSync
+from writebehind import WriteBehindQueue
+from snapshot import SnapshotStore
+from archive import AppointmentArchive
+from ratelimit import RateLimitedClient
+from metrics import instrument_methods, registry
+from models import Page, parse_date, parse_time, format_date, format_time
+from repository import Repository, TABLE_COLUMNS, TABLE_MODELS, SEARCH_FIELDS
 import config
 
-class GoogleSheetsDatabase:
-    def __init__(self):
+# Worksheet appointments are moved to by archive_appointments, with the Appointments columns
+ARCHIVE_SHEET = "AppointmentArchive"
+
+# Ranges read in one request when checking the IDs of rows by position; past this the whole span is read
+MAX_CHECK_RANGES = 50
+
+# Indexes kept over each cached worksheet, by name, over model attributes
+WORKSHEET_INDEXES = {
+    "Patients": {
+        "PatientID": partial(HashIndex, ["id"], unique=True),
+        "Email": partial(HashIndex, ["email"], unique=True),
+        "Search": partial(TextIndex, SEARCH_FIELDS["Patients"])
+    },
+    "Doctors": {
+        "DoctorID": partial(HashIndex, ["id"], unique=True),
+        "Email": partial(HashIndex, ["email"], unique=True),
+        "Specialty": partial(HashIndex, ["specialty"]),
+        "Search": partial(TextIndex, SEARCH_FIELDS["Doctors"])
+    },
+    "Appointments": {
+        "AppointmentID": partial(HashIndex, ["id"], unique=True),
+        "PatientID": partial(HashIndex, ["patient_id"]),
+        "DoctorID": partial(HashIndex, ["doctor_id"]),
+        "DoctorDate": partial(HashIndex, ["doctor_id", "date"]),
+        # Date-sorted indexes for range queries
+        "Schedule": partial(SortedIndex, [], ["date", "time"]),
+        "DoctorSchedule": partial(SortedIndex, ["doctor_id"], ["date", "time"]),
+        "PatientSchedule": partial(SortedIndex, ["patient_id"], ["date", "time"]),
+        # Bitmask of booked slots per doctor and day
+        "Availability": AvailabilityIndex
+    }
+}
+
+def _schedule_key(appt):
+    """Sort appointments by date and time, undated ones first as in the Schedule index"""
+    return appt.date or date.min, appt.time or datetime.min.time()
+
+@instrument_methods("db_call_seconds", backend="sheets")
+class GoogleSheetsDatabase(Repository):
+    def __init__(self, spreadsheet=None, snapshot_dir=None, archive_dir=None):
+        """Connect to the configured spreadsheet, or use an already opened one such as a FakeSpreadsheet
+        
+        snapshot_dir overrides config.SNAPSHOT_DIR, the directory the cached
+        worksheets are saved to and started from, and archive_dir
+        config.ARCHIVE_DIR, the local copy of archived appointments.
+        """
         self.scope = ['https://spreadsheets.google.com/feeds',
                       'https://www.googleapis.com/auth/drive']
         
+        # Worksheet records and their indexes are kept in memory between calls
+        table_types = {}
+        if config.APPOINTMENT_STORE == "columnar":
+            table_types["Appointments"] = ColumnarAppointments
+        self.cache = TableCache(index_specs=WORKSHEET_INDEXES, table_types=table_types)
+        # Expired tables are refreshed with only the rows that changed
+        self.sync = SheetSync(self)
+        
+        # Writes to the same slot or email are serialized; IDs are never handed out twice
+        self._write_locks = LockManager()
+        self._append_lock = threading.Lock()
+        self._id_allocators = {
+            "Patients": IdAllocator("P"),
+            "Doctors": IdAllocator("D"),
+            "Appointments": IdAllocator("A")
+        }
+        
+        # Worksheet handles by title, so lookups don't cost a metadata request
+        self._worksheets = {}
+        
+        # New rows waiting to be appended in the background, when write-behind is enabled
+        self.writes = None
+        
+        # Local copy of the cached worksheets, when enabled; the cache version it was last saved at
+        self.snapshot = None
+        self._snapshot_version = None
+        self._reconciler = None
+        
+        # Local copy of the archive worksheet, when enabled; archiving runs one at a time
+        self.archive = None
+        self._archive_lock = threading.RLock()
+        
+        # Cache, sync, write-behind and API counters are read at metrics export time
+        registry.register_collector("database", self._collect_metrics)
+        
+        self.client = None
         try:
-            # Authenticate with Google Sheets
-            credentials = ServiceAccountCredentials.from_json_keyfile_name(
-                config.GOOGLE_SHEETS_CREDENTIALS_FILE, self.scope)
-            self.client = gspread.authorize(credentials)
-            
-            # Open the spreadsheet
-            self.spreadsheet = self.client.open_by_key(config.SPREADSHEET_ID)
+            if spreadsheet is not None:
+                self.spreadsheet = spreadsheet
+            else:
+                # Authenticate with Google Sheets
+                credentials = ServiceAccountCredentials.from_json_keyfile_name(
+                    config.GOOGLE_SHEETS_CREDENTIALS_FILE, self.scope)
+                # Requests are paced to the API quota, and throttled ones retried
+                self.client = gspread.authorize(credentials, client_factory=RateLimitedClient)
+                
+                # Keep enough pooled HTTPS connections for every session sharing this client
+                adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_SIZE, pool_maxsize=config.HTTP_POOL_SIZE)
+                self.client.session.mount("https://", adapter)
+                
+                # Open the spreadsheet
+                self.spreadsheet = self.client.open_by_key(config.SPREADSHEET_ID)
             
             # Initialize worksheets if they don't exist
             self._initialize_worksheets()
             
+            archive_dir = archive_dir if archive_dir is not None else config.ARCHIVE_DIR
+            if archive_dir:
+                self.archive = AppointmentArchive(archive_dir)
+                self._sync_archive()
+            
+            if config.WRITE_BEHIND:
+                self.writes = WriteBehindQueue(self)
+                self.writes.start()
+            
+            snapshot_dir = snapshot_dir if snapshot_dir is not None else config.SNAPSHOT_DIR
+            if snapshot_dir:
+                self.snapshot = SnapshotStore(snapshot_dir, getattr(self.spreadsheet, "id", ""))
+                self._load_snapshot()
+                self.snapshot.start(self.save_snapshot)
+            
             print("Successfully connected to Google Sheets!")
         except Exception as e:
             print(f"Error connecting to Google Sheets: {e}")
             self.client = None
             self.spreadsheet = None
     
+    @property
+    def connected(self):
+        """Whether the spreadsheet was opened successfully"""
+        return self.spreadsheet is not None
+    
     def _initialize_worksheets(self):
         """Initialize the required worksheets if they don't exist"""
-        worksheet_names = [sheet.title for sheet in self.spreadsheet.worksheets()]
+        self._worksheets = {sheet.title: sheet for sheet in self.spreadsheet.worksheets()}
         
         # Create patients worksheet if it doesn't exist
-        if "Patients" not in worksheet_names:
+        if "Patients" not in self._worksheets:
             patients_sheet = self.spreadsheet.add_worksheet(title="Patients", rows=1000, cols=10)
-            patients_sheet.append_row([
-                "PatientID", "Name", "Email", "Phone", "DateOfBirth", 
-                "Address", "MedicalHistory", "RegisteredDate"
-            ])
+            patients_sheet.append_row(TABLE_COLUMNS["Patients"])
+            self._worksheets["Patients"] = patients_sheet
         
         # Create doctors worksheet if it doesn't exist
-        if "Doctors" not in worksheet_names:
+        if "Doctors" not in self._worksheets:
             doctors_sheet = self.spreadsheet.add_worksheet(title="Doctors", rows=100, cols=10)
-            doctors_sheet.append_row([
-                "DoctorID", "Name", "Specialty", "Email", "Phone", "Schedule"
-            ])
+            doctors_sheet.append_row(TABLE_COLUMNS["Doctors"])
+            self._worksheets["Doctors"] = doctors_sheet
         
         # Create appointments worksheet if it doesn't exist
-        if "Appointments" not in worksheet_names:
+        if "Appointments" not in self._worksheets:
             appointments_sheet = self.spreadsheet.add_worksheet(title="Appointments", rows=1000, cols=10)
-            appointments_sheet.append_row([
-                "AppointmentID", "PatientID", "DoctorID", "Date", "Time", 
-                "Status", "Notes", "CreatedAt"
-            ])
+            appointments_sheet.append_row(TABLE_COLUMNS["Appointments"])
+            self._worksheets["Appointments"] = appointments_sheet
+    
+    def _load_snapshot(self):
+        """Cache the worksheets saved by the last process and reconcile them with Sheets in the background
+        
+        A table started from the snapshot is in the state of one that has
+        been cached since the snapshot was saved, so the usual delta sync
+        brings it up to date: rows appended since are fetched, and edits are
+        caught by the sampled comparison.
+        """
+        loaded = []
+        for sheet_name in TABLE_COLUMNS:
+            # Already loaded while replaying the write-behind journal
+            if self.cache.peek(sheet_name) is not None:
+                continue
+            records = self.snapshot.load(sheet_name)
+            if records is None:
+                continue
+            # Queued rows follow the ones already in the sheet, as in a full load
+            if self.writes is not None:
+                records.extend(self.writes.pending_records(sheet_name))
+            self.cache.get(sheet_name, lambda: records)
+            loaded.append(sheet_name)
+        
+        self._snapshot_version = self.cache.version
+        if loaded:
+            print(f"Serving {', '.join(loaded)} from the local snapshot while syncing with Google Sheets")
+            self._reconciler = threading.Thread(
+                target=self._reconcile_snapshot, args=(loaded,), name="snapshot-reconcile", daemon=True
+            )
+            self._reconciler.start()
+    
+    def _reconcile_snapshot(self, sheet_names):
+        """Bring tables loaded from the snapshot up to date, reloading any whose rows no longer line up"""
+        for sheet_name in sheet_names:
+            try:
+                table = self.cache.peek(sheet_name)
+                if table is not None and not self.sync.refresh(sheet_name, table):
+                    self.invalidate_cache(sheet_name)
+                    self._get_table(sheet_name)
+            except Exception as e:
+                print(f"Error syncing {sheet_name} from the snapshot: {e}")
+    
+    def save_snapshot(self):
+        """Save the cached worksheets to the local snapshot, if anything changed since the last save"""
+        if self.snapshot is None or self.cache.version == self._snapshot_version:
+            return
+        version = self.cache.version
+        
+        for sheet_name in TABLE_COLUMNS:
+            table = self.cache.peek(sheet_name)
+            if table is None:
+                continue
+            # Queued rows aren't in the sheet yet, and are replayed from the journal instead
+            with self._append_lock:
+                count = len(table)
+                if self.writes is not None:
+                    count -= self.writes.pending_count(sheet_name)
+            self.snapshot.save(sheet_name, table.records[:count])
+        self._snapshot_version = version
+    
+    def _sync_archive(self, wait=True):
+        """Copy rows added to the archive worksheet since the local archive was last synced
+        
+        The local archive holds the worksheet's rows in order, so only the
+        rows after the ones it already has are read. With wait False the
+        sync is skipped if an archive run holds the lock; that run syncs anyway.
+        """
+        if not self._archive_lock.acquire(blocking=wait):
+            return
+        try:
+            try:
+                worksheet = self._worksheet(ARCHIVE_SHEET)
+            except WorksheetNotFound:
+                # Nothing has been archived yet
+                return
+            last_column = re.sub(r"\d", "", rowcol_to_a1(1, len(TABLE_COLUMNS["Appointments"])))
+            rows = worksheet.get_values(f"A{self.archive.source_rows + 2}:{last_column}")
+            registry.increment("sheets_rows_read_total", len(rows), sheet=ARCHIVE_SHEET)
+            if rows:
+                self.archive.append(self._to_record("Appointments", row) for row in rows)
+            # Archived IDs are no longer in the Appointments sheet, but must not be handed out again
+            self._id_allocators["Appointments"].reserve(self.archive.highest_id)
+        finally:
+            self._archive_lock.release()
+    
+    def _worksheet(self, sheet_name):
+        """Get the handle of a worksheet, fetching it only the first time"""
+        worksheet = self._worksheets.get(sheet_name)
+        if worksheet is None:
+            worksheet = self.spreadsheet.worksheet(sheet_name)
+            self._worksheets[sheet_name] = worksheet
+        return worksheet
+    
+    def _get_table(self, sheet_name):
+        """Get the indexed records of a worksheet, downloading them only on a cache miss
+        
+        Once loaded, an expired worksheet is brought up to date with a delta
+        sync rather than downloaded again.
+        """
+        model = TABLE_MODELS[sheet_name]
+        
+        def load():
+            # Cells are read as text; the models parse dates and times once, here
+            records = [
+                model.from_dict(record)
+                for record in self._worksheet(sheet_name).get_all_records(numericise_ignore=["all"])
+            ]
+            registry.increment("sheets_rows_read_total", len(records), sheet=sheet_name)
+            # A full reload may follow another process archiving rows, so pick those up too
+            if sheet_name == "Appointments" and self.archive is not None:
+                self._sync_archive(wait=False)
+            # Rows still waiting in the write-behind queue follow the ones already in the sheet
+            if self.writes is not None:
+                records.extend(self.writes.pending_records(sheet_name))
+            return records
+        
+        return self.cache.get(sheet_name, load, partial(self.sync.refresh, sheet_name))
+    
+    def _get_records(self, sheet_name):
+        """Get the records of a worksheet, downloading them only on a cache miss"""
+        return self._get_table(sheet_name).records
+    
+    @staticmethod
+    def _to_record(sheet_name, row_data):
+        """Convert a worksheet row to the model its table's records are loaded as"""
+        headers = TABLE_COLUMNS[sheet_name]
+        row_data = list(row_data) + [""] * (len(headers) - len(row_data))
+        return TABLE_MODELS[sheet_name].from_dict(dict(zip(headers, row_data)))
+    
+    def _list_page(self, sheet_name, keep, cursor, page_size):
+        """Get one Page of a cached worksheet in sheet order; the cursor is the position to resume at
+        
+        Without a filter only the page itself is read and the total comes from
+        the ID index. With one every row is checked, to count the matches.
+        """
+        table = self._get_table(sheet_name)
+        records = table.records
+        start = cursor or 0
+        items = []
+        next_cursor = None
+        
+        if keep is None:
+            id_index = table.indexes[TABLE_COLUMNS[sheet_name][0]]
+            # Blank rows are kept so positions match sheet rows, and share the empty ID
+            total = len(id_index) - ("" in id_index)
+            for position in range(start, len(records)):
+                if not records[position].id:
+                    continue
+                if len(items) == page_size:
+                    next_cursor = position
+                    break
+                items.append(records[position])
+            return Page(tuple(items), next_cursor, total)
+        
+        total = 0
+        for position, record in enumerate(records):
+            if not record.id or not keep(record):
+                continue
+            total += 1
+            if position < start:
+                continue
+            if len(items) < page_size:
+                items.append(record)
+            elif next_cursor is None:
+                next_cursor = position
+        return Page(tuple(items), next_cursor, total)
+    
+    def _search_page(self, sheet_name, search, keep, cursor, page_size):
+        """Get one Page of a cached worksheet's search results, best match first; the cursor is the rank to resume at"""
+        table = self._get_table(sheet_name)
+        records = table.records
+        start = cursor or 0
+        positions, total = table.indexes["Search"].search(
+            search, start, page_size,
+            keep=None if keep is None else lambda position: keep(records[position])
+        )
+        next_cursor = start + len(positions) if start + len(positions) < total else None
+        return Page(tuple(records[position] for position in positions), next_cursor, total)
+    
+    def _next_id(self, sheet_name):
+        """Allocate a new ID for a worksheet"""
+        table = self._get_table(sheet_name)
+        return self._id_allocators[sheet_name].next_id(table.records, "id")
+    
+    def _append_row(self, sheet_name, row_data):
+        """Append a row to a worksheet and write it through to the cache in sheet order
+        
+        Returns the cache position of the new row, or None if the worksheet
+        isn't cached. Rows appended by other processes since the cache was
+        loaded are fetched as well, so cache positions keep matching sheet rows.
+        
+        With write-behind enabled the row is only cached and queued, and None
+        is returned; its sheet row is known once the queue has written it.
+        """
+        if self.writes is not None:
+            self.writes.enqueue(sheet_name, row_data)
+            return None
+        return self._append_rows(sheet_name, [row_data])
+    
+    @staticmethod
+    def _appended_position(response):
+        """Get the cache position of the first row an append request wrote, or None"""
+        # The response names the range written, e.g. "Appointments!A42:H50"
+        updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+        match = re.search(r"![A-Z]+(\d+)", updated_range)
+        return int(match.group(1)) - 2 if match else None  # Header row and 1-based rows
+    
+    def _append_rows(self, sheet_name, rows):
+        """Append rows to a worksheet in one request; returns the cache position of the first one, or None if unknown"""
+        # Queued rows go first, so the sheet keeps the order rows were added in
+        if self.writes is not None:
+            self.writes.drain(sheet_name)
+        
+        worksheet = self._worksheet(sheet_name)
+        response = worksheet.append_rows(rows)
+        registry.increment("sheets_rows_written_total", len(rows), sheet=sheet_name)
+        position = self._appended_position(response)
+        
+        with self._append_lock:
+            table = self.cache.peek(sheet_name)
+            if table is None or position is None:
+                self.cache.invalidate(sheet_name)
+                return None
+            if position < len(table):
+                # Rows appended at the same time by another thread may have cached ours already; if they
+                # didn't, another process deleted rows, e.g. while archiving, and positions no longer match
+                cached = table.records[position:position + len(rows)]
+                if cached != [self._to_record(sheet_name, row_data) for row_data in rows]:
+                    self.cache.invalidate(sheet_name)
+                    return None
+            
+            if position > len(table):
+                # Other writers appended rows we haven't seen yet
+                last_column = re.sub(r"\d", "", rowcol_to_a1(1, len(TABLE_COLUMNS[sheet_name])))
+                missing = worksheet.get_values(f"A{len(table) + 2}:{last_column}{position + 1}")
+                registry.increment("sheets_rows_read_total", len(missing), sheet=sheet_name)
+                for row in missing:
+                    self.cache.append(sheet_name, self._to_record(sheet_name, row))
+            if position == len(table):
+                for row_data in rows:
+                    self.cache.append(sheet_name, self._to_record(sheet_name, row_data))
+            return position
+    
+    def _bulk_add(self, sheet_name, rows, key=None, taken=None):
+        """Append rows in one request, giving them a block of new IDs and skipping rows whose key is taken
+        
+        key(row) gives the value that must be unique, or None for rows that
+        never clash, and taken(table, value) whether it is already stored; by
+        default rows are keyed by email. Each row's first column is overwritten
+        with its new ID. Returns the cache position of the first appended row
+        and the new IDs aligned with rows, with None for rows that were skipped.
+        """
+        table = self._get_table(sheet_name)
+        if key is None:
+            email_column = TABLE_COLUMNS[sheet_name].index("Email")
+            key = lambda row_data: row_data[email_column]
+            taken = lambda table, email: table.contains("Email", email)
+        
+        accepted = []
+        seen_keys = set()
+        for index, row_data in enumerate(rows):
+            value = key(row_data)
+            if value is None:
+                accepted.append(index)
+            elif value not in seen_keys and not taken(table, value):
+                seen_keys.add(value)
+                accepted.append(index)
+        
+        new_ids = [None] * len(rows)
+        id_block = self._id_allocators[sheet_name].next_ids(table.records, "id", len(accepted))
+        for index, new_id in zip(accepted, id_block):
+            rows[index][0] = new_id
+            new_ids[index] = new_id
+        
+        position = None
+        if accepted:
+            position = self._append_rows(sheet_name, [rows[index] for index in accepted])
+        return position, new_ids
+    
+    def _find_row(self, sheet_name, table, row_data):
+        """Get the position of the cached row holding exactly row_data, or None
+        
+        Rows are searched from the end, where a just appended one is; the ID
+        index can't be used, as it only holds the first row using an ID and
+        another process may have handed out the same one.
+        """
+        record = self._to_record(sheet_name, row_data)
+        records = table.records
+        for position in range(len(records) - 1, -1, -1):
+            if records[position] == record:
+                return position
+        return None
+    
+    def _claim_id(self, sheet_name, position, new_id):
+        """Make sure the row at position is the first one using new_id, re-numbering it if not"""
+        if position is None:
+            return new_id
+        
+        id_index = TABLE_COLUMNS[sheet_name][0]
+        table = self.cache.peek(sheet_name)
+        positions = table.positions(id_index, new_id) if table is not None else []
+        while positions and positions[0] != position:
+            # Another process handed out the same ID first
+            renumbered = self._id_allocators[sheet_name].next_id(table.records, "id")
+            if not self._write_at(sheet_name, [(position, new_id, {"id": renumbered})]):
+                raise RuntimeError(f"{new_id} was moved by another process before it could be renumbered")
+            new_id = renumbered
+            positions = table.positions(id_index, new_id)
+        return new_id
+    
+    @staticmethod
+    def _runs(positions):
+        """Group positions into [start, end) runs of consecutive ones, in order"""
+        runs = []
+        for position in sorted(positions):
+            if runs and runs[-1][1] == position:
+                runs[-1][1] = position + 1
+            else:
+                runs.append([position, position + 1])
+        return runs
+    
+    def _rows_hold(self, sheet_name, expected):
+        """Whether the rows at some cache positions still hold the expected IDs, given as {position: ID}
+        
+        Another process may have deleted rows since the positions were cached,
+        e.g. by archiving, moving the rows after them up. The ID cells are read
+        in one request, so check right before writing by position. On a
+        mismatch the cached table is invalidated, so positions looked up again
+        come from a fresh copy.
+        """
+        runs = self._runs(expected)
+        if len(runs) > MAX_CHECK_RANGES:
+            runs = [[runs[0][0], runs[-1][1]]]
+        results = self._worksheet(sheet_name).batch_get([f"A{start + 2}:A{end + 1}" for start, end in runs])
+        registry.increment("sheets_rows_read_total", sum(len(rows) for rows in results), sheet=sheet_name)
+        
+        for (start, end), rows in zip(runs, results):
+            # Blank cells at the end of a range aren't returned
+            cells = [str(row[0]) if row else "" for row in rows] + [""] * (end - start - len(rows))
+            for position, cell in zip(range(start, end), cells):
+                if position in expected and cell != expected[position]:
+                    self.cache.invalidate(sheet_name)
+                    return False
+        return True
+    
+    def _write_at(self, sheet_name, writes):
+        """Write fields of rows by cache position, given as (position, expected ID, {field: value}), to the sheet and the cache
+        
+        Nothing is written, and False returned, if any row no longer holds its
+        expected ID; look the rows up again and retry.
+        """
+        if not self._rows_hold(sheet_name, {position: row_id for position, row_id, _ in writes}):
+            return False
+        
+        # Model fields are in column order
+        names = [field.name for field in fields(TABLE_MODELS[sheet_name])]
+        self._worksheet(sheet_name).batch_update([
+            {
+                "range": rowcol_to_a1(position + 2, names.index(name) + 1),  # Header row and 1-based rows
+                "values": [[value]]
+            }
+            for position, _, changes in writes
+            for name, value in changes.items()
+        ])
+        for position, _, changes in writes:
+            self.cache.update_at(sheet_name, position, changes)
+        return True
+    
+    def cache_stats(self):
+        """Get cache hit/miss counters, per-worksheet sizes, and delta sync, write-behind and API counters"""
+        stats = self.cache.stats()
+        stats["sync"] = self.sync.stats()
+        if self.archive is not None:
+            stats["archive"] = self.archive.stats()
+        if self.client is not None:
+            stats["api"] = self.client.stats()
+        if self.writes is not None:
+            stats["write_behind"] = self.writes.stats()
+        return stats
+    
+    def _collect_metrics(self):
+        """Yield cache, delta sync, write-behind and API counters as (metric, type, help, labels, value)"""
+        stats = self.cache_stats()
+        yield "cache_hits_total", "counter", "Worksheet lookups served from the cache", {}, stats["hits"]
+        yield "cache_misses_total", "counter", "Worksheet lookups that reloaded or refreshed", {}, stats["misses"]
+        yield "cache_stale_served_total", "counter", "Expired worksheets served because reloading failed", {}, stats["stale_served"]
+        yield "cache_version", "gauge", "Cached data version", {}, self.cache.version
+        for sheet_name, table in stats["tables"].items():
+            yield "cache_rows", "gauge", "Rows held per cached worksheet", {"sheet": sheet_name}, table["rows"]
+            yield "cache_age_seconds", "gauge", "Age of each cached worksheet", {"sheet": sheet_name}, table["age_seconds"]
+        for name, value in stats["sync"].items():
+            yield f"sheets_sync_{name}_total", "counter", f"Delta sync {name.replace('_', ' ')}", {}, value
+        for name, value in stats.get("write_behind", {}).items():
+            kind = "gauge" if name == "pending" else "counter"
+            metric = f"write_behind_{name}" if kind == "gauge" else f"write_behind_{name}_total"
+            yield metric, kind, f"Write-behind {name.replace('_', ' ')}", {}, value
+        for name, value in stats.get("api", {}).items():
+            yield f"sheets_api_{name}_total", "counter", f"Sheets API {name.replace('_', ' ')}", {}, value
+    
+    def invalidate_cache(self, sheet_name=None):
+        """Force one worksheet, or all of them, to be downloaded again on next read"""
+        self.cache.invalidate(sheet_name)
     
     def add_patient(self, patient_data):
         """Add a new patient to the database"""
@@ -60,35 +586,58 @@ class GoogleSheetsDatabase:
             return False, "Database connection error"
         
         try:
-            patients_sheet = self.spreadsheet.worksheet("Patients")
-            
-            # Check if patient with same email already exists
-            existing_emails = patients_sheet.col_values(3)[1:]  # Skip header
-            if patient_data["email"] in existing_emails:
-                return False, "Patient with this email already exists"
-            
-            # Generate patient ID (simple implementation)
-            all_ids = patients_sheet.col_values(1)[1:]  # Skip header
-            new_id = f"P{len(all_ids) + 1:04d}"
-            
-            # Prepare row data
+            with self._write_locks.hold(("Patients", patient_data["email"])):
+                patients = self._get_table("Patients")
+                
+                # Check if patient with same email already exists
+                if patients.contains("Email", patient_data["email"]):
+                    return False, "Patient with this email already exists"
+                
+                # Generate patient ID
+                new_id = self._next_id("Patients")
+                
+                # Prepare row data
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                row_data = [
+                    new_id,
+                    patient_data["name"],
+                    patient_data["email"],
+                    patient_data["phone"],
+                    patient_data["dob"],
+                    patient_data["address"],
+                    patient_data["medical_history"],
+                    now
+                ]
+                
+                # Add the new patient
+                position = self._append_row("Patients", row_data)
+                return True, self._claim_id("Patients", position, new_id)
+        except Exception as e:
+            return False, f"Error adding patient: {str(e)}"
+    
+    def bulk_add_patients(self, patients):
+        """Add many patients with one append request; returns the new IDs, None for duplicate emails"""
+        if not self.spreadsheet:
+            return False, "Database connection error"
+        
+        try:
             now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            row_data = [
-                new_id,
-                patient_data["name"],
-                patient_data["email"],
-                patient_data["phone"],
-                patient_data["dob"],
-                patient_data["address"],
-                patient_data["medical_history"],
-                now
+            rows = [
+                [
+                    None,
+                    patient_data["name"],
+                    patient_data["email"],
+                    patient_data["phone"],
+                    patient_data["dob"],
+                    patient_data["address"],
+                    patient_data["medical_history"],
+                    now
+                ]
+                for patient_data in patients
             ]
-            
-            # Add the new patient
-            patients_sheet.append_row(row_data)
-            return True, new_id
+            return True, self._bulk_add("Patients", rows)[1]
         except Exception as e:
-            return False, f"Error adding patient: {str(e)}"
+            return False, f"Error adding patients: {str(e)}"
     
     def get_all_patients(self):
         """Get all patients from the database"""
@@ -96,27 +645,59 @@ class GoogleSheetsDatabase:
             return []
         
         try:
-            patients_sheet = self.spreadsheet.worksheet("Patients")
-            records = patients_sheet.get_all_records()
-            return records
+            return list(self._get_records("Patients"))
         except Exception as e:
             print(f"Error getting patients: {e}")
             return []
     
+    def list_patients(self, search="", doctor_id=None, cursor=None, page_size=50):
+        """Get one Page of patients in the order they were added"""
+        if not self.spreadsheet:
+            return Page()
+        
+        try:
+            keep = None
+            if doctor_id is not None:
+                patient_ids = {appt.patient_id for appt in self.get_appointments(doctor_id=doctor_id, fields=())}
+                keep = lambda patient: patient.id in patient_ids
+            if search and search.strip():
+                return self._search_page("Patients", search, keep, cursor, page_size)
+            return self._list_page("Patients", keep, cursor, page_size)
+        except Exception as e:
+            print(f"Error listing patients: {e}")
+            return Page()
+    
     def get_patient_by_id(self, patient_id):
         """Get a patient by ID"""
         if not self.spreadsheet:
             return None
         
         try:
-            patients_sheet = self.spreadsheet.worksheet("Patients")
-            patient_data = patients_sheet.get_all_records()
-            
-            for patient in patient_data:
-                if patient["PatientID"] == patient_id:
-                    return patient
-            
+            return self._get_table("Patients").find("PatientID", patient_id)
+        except Exception as e:
+            print(f"Error getting patient: {e}")
             return None
+    
+    def get_patients_by_ids(self, patient_ids):
+        """Get the patients with the given IDs, in ID order; unknown IDs are left out"""
+        if not self.spreadsheet:
+            return []
+        
+        try:
+            patients = self._get_table("Patients")
+            found = (patients.find("PatientID", patient_id) for patient_id in set(patient_ids))
+            return sorted((patient for patient in found if patient is not None), key=lambda patient: patient.id)
+        except Exception as e:
+            print(f"Error getting patients: {e}")
+            return []
+    
+    def get_patient_by_email(self, email):
+        """Get a patient by email address"""
+        if not self.spreadsheet:
+            return None
+        
+        try:
+            return self._get_table("Patients").find("Email", email)
         except Exception as e:
             print(f"Error getting patient: {e}")
             return None
@@ -127,58 +708,106 @@ class GoogleSheetsDatabase:
             return False, "Database connection error"
         
         try:
-            doctors_sheet = self.spreadsheet.worksheet("Doctors")
-            
-            # Check if doctor with same email already exists
-            existing_emails = doctors_sheet.col_values(4)[1:]  # Skip header
-            if doctor_data["email"] in existing_emails:
-                return False, "Doctor with this email already exists"
-            
-            # Generate doctor ID
-            all_ids = doctors_sheet.col_values(1)[1:]  # Skip header
-            new_id = f"D{len(all_ids) + 1:04d}"
-            
-            # Prepare row data
-            row_data = [
-                new_id,
-                doctor_data["name"],
-                doctor_data["specialty"],
-                doctor_data["email"],
-                doctor_data["phone"],
-                doctor_data["schedule"]
-            ]
-            
-            # Add the new doctor
-            doctors_sheet.append_row(row_data)
-            return True, new_id
+            with self._write_locks.hold(("Doctors", doctor_data["email"])):
+                doctors = self._get_table("Doctors")
+                
+                # Check if doctor with same email already exists
+                if doctors.contains("Email", doctor_data["email"]):
+                    return False, "Doctor with this email already exists"
+                
+                # Generate doctor ID
+                new_id = self._next_id("Doctors")
+                
+                # Prepare row data
+                row_data = [
+                    new_id,
+                    doctor_data["name"],
+                    doctor_data["specialty"],
+                    doctor_data["email"],
+                    doctor_data["phone"],
+                    doctor_data["schedule"]
+                ]
+                
+                # Add the new doctor
+                position = self._append_row("Doctors", row_data)
+                return True, self._claim_id("Doctors", position, new_id)
         except Exception as e:
             return False, f"Error adding doctor: {str(e)}"
     
+    def bulk_add_doctors(self, doctors):
+        """Add many doctors with one append request; returns the new IDs, None for duplicate emails"""
+        if not self.spreadsheet:
+            return False, "Database connection error"
+        
+        try:
+            rows = [
+                [
+                    None,
+                    doctor_data["name"],
+                    doctor_data["specialty"],
+                    doctor_data["email"],
+                    doctor_data["phone"],
+                    doctor_data["schedule"]
+                ]
+                for doctor_data in doctors
+            ]
+            return True, self._bulk_add("Doctors", rows)[1]
+        except Exception as e:
+            return False, f"Error adding doctors: {str(e)}"
+    
     def get_all_doctors(self):
         """Get all doctors from the database"""
         if not self.spreadsheet:
             return []
         
         try:
-            doctors_sheet = self.spreadsheet.worksheet("Doctors")
-            records = doctors_sheet.get_all_records()
-            return records
+            return list(self._get_records("Doctors"))
         except Exception as e:
             print(f"Error getting doctors: {e}")
             return []
     
+    def list_doctors(self, search="", cursor=None, page_size=50):
+        """Get one Page of doctors in the order they were added"""
+        if not self.spreadsheet:
+            return Page()
+        
+        try:
+            if search and search.strip():
+                return self._search_page("Doctors", search, None, cursor, page_size)
+            return self._list_page("Doctors", None, cursor, page_size)
+        except Exception as e:
+            print(f"Error listing doctors: {e}")
+            return Page()
+    
+    def get_doctor_by_id(self, doctor_id):
+        """Get a doctor by ID"""
+        if not self.spreadsheet:
+            return None
+        
+        try:
+            return self._get_table("Doctors").find("DoctorID", doctor_id)
+        except Exception as e:
+            print(f"Error getting doctor: {e}")
+            return None
+    
+    def get_doctor_by_email(self, email):
+        """Get a doctor by email address"""
+        if not self.spreadsheet:
+            return None
+        
+        try:
+            return self._get_table("Doctors").find("Email", email)
+        except Exception as e:
+            print(f"Error getting doctor: {e}")
+            return None
+    
     def get_doctors_by_specialty(self, specialty):
         """Get doctors by specialty"""
         if not self.spreadsheet:
             return []
         
         try:
-            doctors_sheet = self.spreadsheet.worksheet("Doctors")
-            all_doctors = doctors_sheet.get_all_records()
-            
-            # Filter doctors by specialty
-            filtered_doctors = [doc for doc in all_doctors if doc["Specialty"] == specialty]
-            return filtered_doctors
+            return self._get_table("Doctors").find_all("Specialty", specialty)
         except Exception as e:
             print(f"Error getting doctors by specialty: {e}")
             return []
@@ -188,122 +817,424 @@ class GoogleSheetsDatabase:
         if not self.spreadsheet:
             return False, "Database connection error"
         
+        doctor_id = appointment_data["doctor_id"]
+        date = parse_date(appointment_data["date"])
+        time = parse_time(appointment_data["time"])
+        if date is None or time is None:
+            return False, "Invalid appointment date or time"
+        
         try:
-            appointments_sheet = self.spreadsheet.worksheet("Appointments")
-            
-            # Check if the time slot is available
-            existing_appointments = appointments_sheet.get_all_records()
-            for appt in existing_appointments:
-                if (appt["DoctorID"] == appointment_data["doctor_id"] and
-                    appt["Date"] == appointment_data["date"] and
-                    appt["Time"] == appointment_data["time"] and
-                    appt["Status"] != "Cancelled"):
+            # Bookings for the same slot run one at a time; other slots aren't blocked
+            with self._write_locks.hold(("Appointments", doctor_id, date, time)):
+                existing_appointments = self._get_table("Appointments")
+                
+                # Check if the time slot is available
+                if (self._find_slot_booking(existing_appointments, doctor_id, date, time) is not None
+                        or self._archived_booking(doctor_id, date, time)):
                     return False, "This time slot is already booked"
-            
-            # Generate appointment ID
-            all_ids = appointments_sheet.col_values(1)[1:]  # Skip header
-            new_id = f"A{len(all_ids) + 1:04d}"
-            
-            # Prepare row data
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            row_data = [
-                new_id,
-                appointment_data["patient_id"],
-                appointment_data["doctor_id"],
-                appointment_data["date"],
-                appointment_data["time"],
-                "Scheduled",
-                appointment_data.get("notes", ""),
-                now
-            ]
-            
-            # Add the new appointment
-            appointments_sheet.append_row(row_data)
-            return True, new_id
+                
+                # Generate appointment ID
+                new_id = self._next_id("Appointments")
+                
+                # Prepare row data
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                row_data = [
+                    new_id,
+                    appointment_data["patient_id"],
+                    doctor_id,
+                    format_date(date),
+                    format_time(time),
+                    "Scheduled",
+                    appointment_data.get("notes", ""),
+                    now
+                ]
+                
+                # Add the new appointment
+                position = self._append_row("Appointments", row_data)
+                appointments = self.cache.peek("Appointments")
+                if position is None or appointments is None:
+                    # The cache was dropped meanwhile, e.g. as another process deleted rows, so find the row in a fresh copy
+                    appointments = self._get_table("Appointments")
+                    position = self._find_row("Appointments", appointments, row_data)
+                    if position is None:
+                        return True, new_id
+                
+                # Optimistic check: another process may have booked the slot just before us.
+                # The earliest row wins and later ones are cancelled.
+                if self._find_slot_booking(appointments, doctor_id, date, time) != position:
+                    self._cancel_booking(position, new_id)
+                    self._claim_id("Appointments", position, new_id)
+                    return False, "This time slot is already booked"
+                
+                return True, self._claim_id("Appointments", position, new_id)
         except Exception as e:
             return False, f"Error booking appointment: {str(e)}"
     
-    def get_patient_appointments(self, patient_id):
-        """Get all appointments for a specific patient"""
+    def bulk_add_appointments(self, appointments):
+        """Add many appointments with one append request; returns the new IDs, None for slots already booked"""
         if not self.spreadsheet:
-            return []
+            return False, "Database connection error"
         
         try:
-            appointments_sheet = self.spreadsheet.worksheet("Appointments")
-            all_appointments = appointments_sheet.get_all_records()
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            rows = [
+                [
+                    None,
+                    appointment_data["patient_id"],
+                    appointment_data["doctor_id"],
+                    format_date(parse_date(appointment_data["date"])),
+                    format_time(parse_time(appointment_data["time"])),
+                    appointment_data.get("status", "Scheduled"),
+                    appointment_data.get("notes", ""),
+                    appointment_data.get("created_at", now)
+                ]
+                for appointment_data in appointments
+            ]
             
-            # Filter appointments by patient ID
-            patient_appointments = [appt for appt in all_appointments if appt["PatientID"] == patient_id]
+            def slot(row_data):
+                # Cancelled appointments don't hold their slot
+                if row_data[5] == "Cancelled":
+                    return None
+                return row_data[2], parse_date(row_data[3]), parse_time(row_data[4])
             
-            # Enrich with doctor information
-            doctors = {doc["DoctorID"]: doc for doc in self.get_all_doctors()}
+            def booked(table, slot_key):
+                return self._find_slot_booking(table, *slot_key) is not None or self._archived_booking(*slot_key)
             
-            for appt in patient_appointments:
-                doctor = doctors.get(appt["DoctorID"], {})
-                appt["DoctorName"] = doctor.get("Name", "Unknown")
-                appt["Specialty"] = doctor.get("Specialty", "Unknown")
+            position, new_ids = self._bulk_add("Appointments", rows, slot, booked)
+            appointments_table = self.cache.peek("Appointments")
+            added = [index for index, new_id in enumerate(new_ids) if new_id is not None]
+            if not added:
+                return True, new_ids
+            if position is None or appointments_table is None:
+                # As in book_appointment, the rows were appended together, so finding the first in a fresh copy places them all
+                appointments_table = self._get_table("Appointments")
+                position = self._find_row("Appointments", appointments_table, rows[added[0]])
+                if position is None:
+                    return True, new_ids
             
-            return patient_appointments
+            # Same optimistic check as book_appointment: rows that lost their slot
+            # to another process's earlier booking are cancelled
+            offset = 0
+            for index, new_id in enumerate(new_ids):
+                if new_id is None:
+                    continue
+                row_position = position + offset
+                offset += 1
+                new_id = self._claim_id("Appointments", row_position, new_id)
+                slot_key = slot(rows[index])
+                if slot_key is not None and self._find_slot_booking(appointments_table, *slot_key) != row_position:
+                    self._cancel_booking(row_position, new_id)
+                    new_id = None
+                new_ids[index] = new_id
+            return True, new_ids
         except Exception as e:
-            print(f"Error getting patient appointments: {e}")
+            return False, f"Error adding appointments: {str(e)}"
+    
+    def _cancel_booking(self, position, appointment_id):
+        """Cancel the appointment at a cache position in the sheet and the cache"""
+        if not self._write_at("Appointments", [(position, appointment_id, {"status": "Cancelled"})]):
+            raise RuntimeError(f"{appointment_id} was moved by another process before it could be cancelled")
+    
+    @staticmethod
+    def _find_slot_booking(appointments, doctor_id, date, time):
+        """Get the position of the earliest live appointment in a slot, or None if it's free"""
+        for position in appointments.positions("DoctorDate", (doctor_id, date)):
+            appt = appointments.records[position]
+            if appt.time == time and appt.status != "Cancelled":
+                return position
+        return None
+    
+    def _archived_booking(self, doctor_id, date, time):
+        """Whether a slot is held by an archived appointment; only months with archived rows are read"""
+        if self.archive is None or not self.archive.covers(date):
+            return False
+        return any(
+            appt.time == time and appt.status != "Cancelled"
+            for appt in self.archive.query(doctor_id=doctor_id, start=date, end=date)
+        )
+    
+    def get_all_appointments(self):
+        """Get all appointments as stored, without patient or doctor details"""
+        if not self.spreadsheet:
             return []
+        
+        try:
+            return list(self._get_records("Appointments"))
+        except Exception as e:
+            print(f"Error getting appointments: {e}")
+            return []
+    
+    def appointment_columns(self):
+        """Get the ID, doctor ID, date and status of every appointment, archived ones included, as arrays"""
+        if not self.spreadsheet:
+            return self._record_columns([])
+        
+        try:
+            appointments = self._get_table("Appointments")
+            # Rows are only appended under the append lock, so every column covers the same rows
+            records = None
+            with self._append_lock:
+                # The columnar store already holds them as arrays
+                if isinstance(appointments, ColumnarAppointments):
+                    columns = appointments.columns()
+                else:
+                    records = list(appointments.records)
+            if records is not None:
+                columns = self._record_columns(records)
+            return self._with_archived(columns)
+        except Exception as e:
+            print(f"Error getting appointment columns: {e}")
+            return self._record_columns([])
     
-    def get_doctor_appointments(self, doctor_id, date=None):
-        """Get all appointments for a specific doctor, optionally filtered by date"""
+    def get_appointments(self, doctor_id=None, patient_id=None, start=None, end=None, status=None, fields=None):
+        """Get appointments matching every given filter, sorted by date and time"""
         if not self.spreadsheet:
             return []
+        joins = self._joined_fields(fields)
         
         try:
-            appointments_sheet = self.spreadsheet.worksheet("Appointments")
-            all_appointments = appointments_sheet.get_all_records()
+            appointments = self._get_table("Appointments")
+            start, end, statuses = self._appointment_filters(start, end, status)
             
-            # Filter appointments by doctor ID and optionally by date
-            if date:
-                doctor_appointments = [
-                    appt for appt in all_appointments 
-                    if appt["DoctorID"] == doctor_id and appt["Date"] == date
-                ]
+            # Read only the requested date range from the most selective sorted index
+            if doctor_id is not None:
+                matches = appointments.range("DoctorSchedule", (doctor_id,), start, end)
+            elif patient_id is not None:
+                matches = appointments.range("PatientSchedule", (patient_id,), start, end)
             else:
-                doctor_appointments = [
-                    appt for appt in all_appointments 
-                    if appt["DoctorID"] == doctor_id
-                ]
-            
-            # Enrich with patient information
-            patients = {pat["PatientID"]: pat for pat in self.get_all_patients()}
+                matches = appointments.range("Schedule", (), start, end)
             
-            for appt in doctor_appointments:
-                patient = patients.get(appt["PatientID"], {})
-                appt["PatientName"] = patient.get("Name", "Unknown")
-                appt["PatientPhone"] = patient.get("Phone", "Unknown")
+            matches = [
+                appt for appt in matches
+                if (patient_id is None or appt.patient_id == patient_id)
+                and (statuses is None or appt.status in statuses)
+            ]
             
-            return doctor_appointments
+            # Archived appointments only cost a read of the months the range covers
+            if self.archive is not None:
+                archived = self.archive.query(doctor_id, patient_id, start, end, statuses)
+                if archived:
+                    matches = list(heapq.merge(archived, matches, key=_schedule_key))
+            return self._join(matches, joins)
         except Exception as e:
-            print(f"Error getting doctor appointments: {e}")
+            print(f"Error getting appointments: {e}")
             return []
     
+    def _join(self, appointments, joins):
+        """Fill joined fields into copies of appointments from the cached tables; cached records are immutable
+        
+        Each distinct patient and doctor is looked up once, so a page of
+        appointments costs one index probe per person rather than per row.
+        """
+        if not joins or not appointments:
+            return appointments
+        
+        # Per table: the appointment key and {key value: joined field values}
+        lookups = []
+        for sheet_name, columns in joins.items():
+            table = self._get_table(sheet_name)
+            id_index = TABLE_COLUMNS[sheet_name][0]
+            key = columns[0][1]
+            values = {}
+            for appt in appointments:
+                value = getattr(appt, key)
+                if value not in values:
+                    record = table.find(id_index, value)
+                    values[value] = {
+                        field: getattr(record, attribute) if record else "Unknown"
+                        for field, _, attribute in columns
+                    }
+            lookups.append((key, values))
+        
+        results = []
+        for appt in appointments:
+            changes = {}
+            for key, values in lookups:
+                changes.update(values[getattr(appt, key)])
+            results.append(replace(appt, **changes))
+        return results
+    
+    def _booked_masks(self, doctor_ids, dates):
+        """Read booked slot masks straight from the availability bitmap of the cached appointments"""
+        availability = self._get_table("Appointments").indexes["Availability"]
+        masks = {
+            (doctor_id, day): availability.get((doctor_id, day))
+            for doctor_id in doctor_ids for day in dates
+        }
+        
+        # Days old enough to be archived add the slots their archived appointments held
+        if self.archive is not None:
+            for doctor_id, day in masks:
+                if self.archive.covers(day):
+                    times = [
+                        appt.time for appt in self.archive.query(doctor_id=doctor_id, start=day, end=day)
+                        if appt.status != "Cancelled"
+                    ]
+                    masks[doctor_id, day] |= booked_mask(times)
+        return masks
+    
     def update_appointment_status(self, appointment_id, new_status):
         """Update the status of an appointment"""
         if not self.spreadsheet:
             return False, "Database connection error"
         
+        success, message = self.update_appointment_statuses({appointment_id: new_status})
+        if success:
+            return True, "Appointment status updated successfully"
+        return False, message
+    
+    def update_appointment_statuses(self, statuses):
+        """Update the status of several appointments, given as {appointment ID: new status}, in one request"""
+        if not self.spreadsheet:
+            return False, "Database connection error"
+        
         try:
-            appointments_sheet = self.spreadsheet.worksheet("Appointments")
-            
-            # Find the appointment
-            all_appointments = appointments_sheet.get_all_records()
-            row_idx = None
-            
-            for idx, appt in enumerate(all_appointments, start=2):  # Start from 2 to account for header row
-                if appt["AppointmentID"] == appointment_id:
-                    row_idx = idx
-                    break
-            
-            if row_idx is None:
-                return False, "Appointment not found"
+            # Rows can't be deleted by an archive run in this process between finding them and writing to them
+            with self._archive_lock:
+                # Queued bookings need a sheet row before their status can change
+                if self.writes is not None:
+                    self.writes.drain("Appointments")
+                
+                # Rows deleted by another process show up as IDs out of place, and the rows are looked up again
+                for attempt in range(2):
+                    appointments = self._get_table("Appointments")
+                    
+                    # Find the row of every appointment through the AppointmentID index
+                    positions = {}
+                    for appointment_id in statuses:
+                        found = appointments.positions("AppointmentID", appointment_id)
+                        if not found:
+                            if self.archive is not None and self.archive.archived_ids([appointment_id]):
+                                return False, f"Archived appointments can't be changed: {appointment_id}"
+                            return False, f"Appointment not found: {appointment_id}"
+                        positions[appointment_id] = found[0]
+                    
+                    # Send every change in a single batch_update call
+                    writes = [
+                        (positions[appointment_id], appointment_id, {"status": new_status})
+                        for appointment_id, new_status in statuses.items()
+                    ]
+                    if self._write_at("Appointments", writes):
+                        return True, f"{len(statuses)} appointment statuses updated successfully"
+                return False, "Appointments were moved by another process while being updated; please try again"
+        except Exception as e:
+            return False, f"Error updating appointment status: {str(e)}"
+    
+    def archive_appointments(self, before=None):
+        """Move finished appointments dated before a cutoff out of the Appointments sheet into the archive
+        
+        before defaults to config.ARCHIVE_AFTER_DAYS ago, and only statuses in
+        config.ARCHIVE_STATUSES are moved. The rows are appended to the
+        archive worksheet, copied into the local archive, then deleted from
+        the Appointments sheet in one request, so the cached table, its
+        indexes and every slot check only cover the remaining rows. A run
+        interrupted after the append is finished by the next one.
+        
+        Other processes notice the shorter sheet on their next sync and
+        reload it. Until then their cached row positions are out of date, so
+        every write by position, here and there, first checks that the row
+        still holds the expected ID.
+        """
+        if not self.spreadsheet:
+            return False, "Database connection error"
+        if self.archive is None:
+            return False, "The appointment archive is not enabled"
+        
+        cutoff = parse_date(before) if before else date.today() - timedelta(days=config.ARCHIVE_AFTER_DAYS)
+        if cutoff is None:
+            return False, "Invalid archive cutoff date"
+        
+        try:
+            with self._archive_lock:
+                # Queued bookings need a sheet row before rows around them can be deleted
+                if self.writes is not None:
+                    self.writes.drain("Appointments")
+                
+                # A retry starts from a reloaded table, and rows it already archived are only deleted
+                for attempt in range(2):
+                    appointments = self._get_table("Appointments")
+                    
+                    # Rows appended meanwhile land after these positions; rows deleted elsewhere are caught below
+                    moving = [
+                        (position, appt) for position, appt in enumerate(appointments.records)
+                        if appt.date is not None and appt.date < cutoff
+                        and appt.status in config.ARCHIVE_STATUSES
+                    ]
+                    if not moving:
+                        return True, "No appointments to archive"
+                    # Another process may have archived since the table was cached, moving these rows
+                    expected = {position: appt.id for position, appt in moving}
+                    if not self._rows_hold("Appointments", expected):
+                        continue
+                    
+                    # Rows already archived by an interrupted run are only deleted
+                    archived = self.archive.archived_ids(appt.id for _, appt in moving)
+                    rows = []
+                    for _, appt in moving:
+                        if appt.id not in archived:
+                            record = appt.to_dict()
+                            rows.append([record[column] for column in TABLE_COLUMNS["Appointments"]])
+                    if rows:
+                        worksheet = self._archive_worksheet()
+                        for start in range(0, len(rows), config.IMPORT_CHUNK_SIZE):
+                            worksheet.append_rows(rows[start:start + config.IMPORT_CHUNK_SIZE])
+                        registry.increment("sheets_rows_written_total", len(rows), sheet=ARCHIVE_SHEET)
+                        # The local archive copies the worksheet, so it reads back what was appended
+                        self._sync_archive()
+                    
+                    # Checked again in case another run deleted rows while these were copied
+                    if self._rows_hold("Appointments", expected):
+                        break
+                else:
+                    return False, "Appointments were moved by another process while archiving; please try again"
+                
+                self._delete_rows("Appointments", [position for position, _ in moving])
+                self.invalidate_cache("Appointments")
             
-            # Update the status (column 6)
-            appointments_sheet.update_cell(row_idx, 6, new_status)
-            return True, "Appointment status updated successfully"
+            # Reload the smaller table now rather than on the next request
+            self._get_table("Appointments")
+            return True, f"{len(moving)} appointments archived"
+        except Exception as e:
+            return False, f"Error archiving appointments: {str(e)}"
+    
+    def _archive_worksheet(self):
+        """Get the archive worksheet, creating it on the first archive run"""
+        try:
+            return self._worksheet(ARCHIVE_SHEET)
+        except WorksheetNotFound:
+            worksheet = self.spreadsheet.add_worksheet(title=ARCHIVE_SHEET, rows=1000, cols=10)
+            worksheet.append_row(TABLE_COLUMNS["Appointments"])
+            self._worksheets[ARCHIVE_SHEET] = worksheet
+            return worksheet
+    
+    def _delete_rows(self, sheet_name, positions):
+        """Delete the rows at some cache positions from a worksheet in one request"""
+        # Consecutive rows are deleted as one range, last range first so earlier ones don't shift
+        ranges = self._runs(positions)
+        requests = [
+            {
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": self._worksheet(sheet_name).id,
+                        "dimension": "ROWS",
+                        "startIndex": start + 1,  # Header row; indexes are 0-based and the end exclusive
+                        "endIndex": end + 1
+                    }
+                }
+            }
+            for start, end in reversed(ranges)
+        ]
+        self.spreadsheet.batch_update({"requests": requests})
+    
+    def data_version(self, tables=None):
+        """Get a counter that changes whenever a cached worksheet is reloaded or written, or one per table in tables"""
+        try:
+            # Reload any worksheet whose TTL ran out so outside edits are noticed
+            if self.spreadsheet:
+                for sheet_name in tables or WORKSHEET_INDEXES:
+                    self._get_table(sheet_name)
         except Exception as e:
-            return False, f"Error updating appointment status: {str(e)}"
\ No newline at end of file
+            print(f"Error checking data version: {e}")
+        if tables is None:
+            return self.cache.version
+        return tuple(self.cache.table_versions.get(sheet_name, 0) for sheet_name in tables)
@@ -0,0 +1,395 @@
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import numpy as np
+from availability import SLOT_TIMES
+from models import parse_date, format_date, format_time
+from repository import TABLE_COLUMNS
+import config
+
+# Share of doctors in each specialty, relative to 1 for specialties not listed
+SPECIALTY_WEIGHTS = {
+    "General Medicine": 4,
+    "Pediatrics": 2,
+    "Dentistry": 1.5,
+    "Gynecology": 1.5
+}
+
+# Weekdays each schedule works, Monday = 0, and the share of doctors on it
+SCHEDULE_DAYS = {
+    "Mon-Fri": ((0, 1, 2, 3, 4), 0.7),
+    "Mon-Thu": ((0, 1, 2, 3), 0.15),
+    "Tue-Sat": ((1, 2, 3, 4, 5), 0.15)
+}
+
+# Demand on each weekday relative to a Wednesday; Mondays fill up, Saturdays are quiet
+WEEKDAY_DEMAND = (1.15, 1.05, 1.0, 1.0, 0.9, 0.7, 0.0)
+
+# Demand relative to the yearly mean peaks in mid-January and bottoms out in mid-July
+SEASONAL_AMPLITUDE = 0.15
+SEASONAL_PEAK_DAY = 15
+
+# Share of past appointments that were cancelled, and of upcoming ones already cancelled
+PAST_CANCEL_RATE = 0.12
+UPCOMING_CANCEL_RATE = 0.06
+
+# Mean days between booking an appointment and the appointment itself
+MEAN_BOOKING_LEAD_DAYS = 10
+MAX_BOOKING_LEAD_DAYS = 120
+
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+    "Aisha", "Wei", "Priya", "Mateo", "Fatima", "Hiroshi", "Olga", "Kwame", "Sofia", "Arjun"
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Chen", "Patel", "Kim", "Nguyen", "Okafor", "Ivanova", "Sato", "Mensah", "Rossi", "Singh"
+]
+STREETS = ["Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Lake", "Hill", "Park", "River"]
+MEDICAL_HISTORY = ["", "", "", "", "Asthma", "Hypertension", "Type 2 diabetes", "Penicillin allergy", "Migraine"]
+NOTES = ["Follow-up", "Annual check-up", "Test results review", "Prescription renewal", "New symptoms"]
+
+def _working_hours_text():
+    """Format the configured working hours the way the doctor form asks for, e.g. 9AM-5PM"""
+    def hour_text(hour):
+        return f"{(hour - 1) % 12 + 1}{'AM' if hour < 12 else 'PM'}"
+    return f"{hour_text(config.WORKING_HOURS['start'])}-{hour_text(config.WORKING_HOURS['end'])}"
+
+def _slot_demand():
+    """Demand of each slot of a day relative to the daily mean; mornings book first, lunchtime last"""
+    weights = np.array([1.1 if slot.hour < 12 else 0.8 if slot.hour < 14 else 1.0 for slot in SLOT_TIMES])
+    return weights / weights.mean()
+
+@dataclass
+class GeneratorReport:
+    """Rows generated and written per table"""
+    doctors: int = 0
+    patients: int = 0
+    appointments: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+    
+    @property
+    def rows_per_second(self):
+        total = self.doctors + self.patients + self.appointments
+        return total / self.seconds if self.seconds else 0.0
+
+class ClinicDataGenerator:
+    """Reproducible synthetic doctors, patients and appointments for load testing
+
+    Appointments are generated one day at a time: each working doctor's slots
+    are booked with a probability following weekday, time of day and seasonal
+    demand, so no slot is ever double-booked. Past appointments are Completed
+    or Cancelled, upcoming ones Scheduled or Cancelled. Every table is yielded
+    in chunks of storage rows, in TABLE_COLUMNS order, so memory use depends on
+    the chunk size and the number of doctors, not on the number of rows.
+
+    The doctor count defaults to what the appointment count needs at the given
+    occupancy; the last days are cut short once that many have been generated.
+    """
+    
+    def __init__(self, appointments, patients=None, doctors=None, days_back=540, days_ahead=90,
+                 occupancy=0.6, today=None, seed=42):
+        self.appointment_count = appointments
+        self.today = parse_date(today) if today is not None else datetime.now().date()
+        self.start = self.today - timedelta(days=days_back)
+        self.days = days_back + days_ahead
+        self.occupancy = occupancy
+        self.seed = seed
+        self._slot_demand = _slot_demand()
+        
+        rng = np.random.default_rng(seed)
+        self.doctor_count = doctors or self._doctors_needed()
+        self.patient_count = patients or max(100, appointments // 8)
+        
+        # Doctors are few, so their attributes are drawn once and kept
+        specialties = np.array(config.SPECIALTIES)
+        weights = np.array([SPECIALTY_WEIGHTS.get(specialty, 1) for specialty in config.SPECIALTIES], dtype=float)
+        self._doctor_specialties = specialties[rng.choice(len(specialties), self.doctor_count, p=weights / weights.sum())]
+        schedules = list(SCHEDULE_DAYS)
+        shares = np.array([share for _, share in SCHEDULE_DAYS.values()])
+        self._doctor_schedules = rng.choice(len(schedules), self.doctor_count, p=shares / shares.sum())
+        # works[weekday] is a boolean mask of the doctors working that day
+        self._works = np.array([
+            np.isin(self._doctor_schedules, [index for index, name in enumerate(schedules) if weekday in SCHEDULE_DAYS[name][0]])
+            for weekday in range(7)
+        ])
+    
+    def _day_demand(self, day):
+        """Expected share of a working doctor's slots booked on a day"""
+        season = 1 + SEASONAL_AMPLITUDE * math.cos(2 * math.pi * (day.timetuple().tm_yday - SEASONAL_PEAK_DAY) / 365.25)
+        return self.occupancy * season * WEEKDAY_DEMAND[day.weekday()]
+    
+    def _doctors_needed(self):
+        """Doctors needed to reach the appointment count at the configured occupancy, with a little headroom"""
+        total_share = sum(share for _, share in SCHEDULE_DAYS.values())
+        # Share of doctors working on each weekday
+        working = [
+            sum(share for days, share in SCHEDULE_DAYS.values() if weekday in days) / total_share
+            for weekday in range(7)
+        ]
+        per_doctor = 0.0
+        for offset in range(self.days):
+            day = self.start + timedelta(days=offset)
+            slot_odds = np.minimum(self._day_demand(day) * self._slot_demand, 0.98)
+            per_doctor += working[day.weekday()] * slot_odds.sum()
+        return max(1, math.ceil(self.appointment_count / max(per_doctor, 1) * 1.05))
+    
+    @staticmethod
+    def _chunks(rows, chunk_size):
+        for offset in range(0, len(rows), chunk_size):
+            yield rows[offset:offset + chunk_size]
+    
+    def doctors(self, chunk_size=10000):
+        """Yield chunks of Doctors rows"""
+        rng = np.random.default_rng([self.seed, 1])
+        first = rng.choice(FIRST_NAMES, self.doctor_count).tolist()
+        last = rng.choice(LAST_NAMES, self.doctor_count).tolist()
+        phones = rng.integers(2000000000, 9999999999, self.doctor_count).tolist()
+        schedules = list(SCHEDULE_DAYS)
+        hours = _working_hours_text()
+        rows = [
+            [
+                f"D{number:04d}",
+                f"Dr. {first[index]} {last[index]}",
+                str(self._doctor_specialties[index]),
+                f"dr.{first[index].lower()}.{last[index].lower()}{number}@clinic.example.com",
+                str(phones[index]),
+                f"{schedules[self._doctor_schedules[index]]}, {hours}"
+            ]
+            for index, number in enumerate(range(1, self.doctor_count + 1))
+        ]
+        yield from self._chunks(rows, chunk_size)
+    
+    def patients(self, chunk_size=10000):
+        """Yield chunks of Patients rows"""
+        rng = np.random.default_rng([self.seed, 2])
+        for first_number in range(1, self.patient_count + 1, chunk_size):
+            size = min(chunk_size, self.patient_count + 1 - first_number)
+            first = rng.choice(FIRST_NAMES, size).tolist()
+            last = rng.choice(LAST_NAMES, size).tolist()
+            phones = rng.integers(2000000000, 9999999999, size).tolist()
+            # Ages spread evenly up to 90; registered up to five years before the data starts
+            born = (rng.integers(0, 90 * 365, size)).tolist()
+            registered = rng.integers(0, 5 * 365, size).tolist()
+            houses = rng.integers(1, 2000, size).tolist()
+            streets = rng.choice(STREETS, size).tolist()
+            histories = rng.choice(MEDICAL_HISTORY, size).tolist()
+            yield [
+                [
+                    f"P{number:04d}",
+                    f"{first[index]} {last[index]}",
+                    f"{first[index].lower()}.{last[index].lower()}{number}@example.com",
+                    str(phones[index]),
+                    format_date(self.today - timedelta(days=born[index])),
+                    f"{houses[index]} {streets[index]} Street",
+                    histories[index],
+                    f"{format_date(self.start - timedelta(days=registered[index]))} 09:00:00"
+                ]
+                for index, number in enumerate(range(first_number, first_number + size))
+            ]
+    
+    def appointments(self, chunk_size=10000):
+        """Yield chunks of Appointments rows, in date order"""
+        rng = np.random.default_rng([self.seed, 3])
+        doctor_ids = [f"D{number:04d}" for number in range(1, self.doctor_count + 1)]
+        slot_texts = [format_time(slot) for slot in SLOT_TIMES]
+        # Booking times of day, 08:00 to 17:59
+        clock_texts = [f" {hour:02d}:{minute:02d}:00" for hour in range(8, 18) for minute in range(60)]
+        
+        number = 1
+        pending = []
+        for offset in range(self.days):
+            if number > self.appointment_count:
+                break
+            day = self.start + timedelta(days=offset)
+            working = np.flatnonzero(self._works[day.weekday()])
+            if not len(working):
+                continue
+            
+            # Book each working doctor's slots independently, with the day's and slot's demand
+            booked = rng.random((len(working), len(SLOT_TIMES))) < np.minimum(self._day_demand(day) * self._slot_demand, 0.98)
+            doctor_rows, slots = np.nonzero(booked)
+            count = min(len(slots), self.appointment_count + 1 - number)
+            doctor_rows, slots = doctor_rows[:count], slots[:count]
+            
+            # Regular patients: low patient numbers come back far more often than high ones
+            patients = (self.patient_count * rng.random(count) ** 2).astype(np.int64) + 1
+            cancelled = rng.random(count) < (PAST_CANCEL_RATE if day < self.today else UPCOMING_CANCEL_RATE)
+            has_note = rng.random(count) < 0.1
+            notes = rng.integers(0, len(NOTES), count)
+            leads = np.minimum(rng.geometric(1 / (MEAN_BOOKING_LEAD_DAYS + 1), count) - 1, MAX_BOOKING_LEAD_DAYS)
+            clocks = rng.integers(0, len(clock_texts), count)
+            
+            date_text = format_date(day)
+            booked_on = [format_date(day - timedelta(days=lead)) for lead in range(MAX_BOOKING_LEAD_DAYS + 1)]
+            live_status = "Completed" if day < self.today else "Scheduled"
+            for doctor_row, slot, patient, is_cancelled, with_note, note, lead, clock in zip(
+                working[doctor_rows].tolist(), slots.tolist(), patients.tolist(), cancelled.tolist(),
+                has_note.tolist(), notes.tolist(), leads.tolist(), clocks.tolist()
+            ):
+                pending.append([
+                    f"A{number:04d}",
+                    f"P{patient:04d}",
+                    doctor_ids[doctor_row],
+                    date_text,
+                    slot_texts[slot],
+                    "Cancelled" if is_cancelled else live_status,
+                    NOTES[note] if with_note else "",
+                    booked_on[lead] + clock_texts[clock]
+                ])
+                number += 1
+            
+            while len(pending) >= chunk_size:
+                yield pending[:chunk_size]
+                del pending[:chunk_size]
+        if pending:
+            yield pending
+
+class FileWriter:
+    """Writes each table to <table>.csv or <table>.jsonl in a directory, with TABLE_COLUMNS headers"""
+    
+    def __init__(self, directory, file_format="csv"):
+        if file_format not in ("csv", "jsonl"):
+            raise ValueError(f"Unsupported output format: {file_format}")
+        self.directory = directory
+        self.file_format = file_format
+        self._files = {}
+        os.makedirs(directory, exist_ok=True)
+    
+    def _open(self, sheet_name):
+        output = self._files.get(sheet_name)
+        if output is None:
+            path = os.path.join(self.directory, f"{sheet_name.lower()}.{self.file_format}")
+            output = self._files[sheet_name] = open(path, "w", newline="")
+            if self.file_format == "csv":
+                csv.writer(output).writerow(TABLE_COLUMNS[sheet_name])
+        return output
+    
+    def write(self, sheet_name, rows):
+        """Write a chunk of rows; returns how many were written"""
+        output = self._open(sheet_name)
+        if self.file_format == "csv":
+            csv.writer(output).writerows(rows)
+        else:
+            columns = TABLE_COLUMNS[sheet_name]
+            output.write("".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows))
+        return len(rows)
+    
+    def close(self):
+        for output in self._files.values():
+            output.close()
+        self._files.clear()
+
+class DatabaseWriter:
+    """Loads generated rows into a storage backend through its bulk add methods
+
+    The backend hands out its own IDs. Appointments are rewritten to the IDs
+    their patient and doctor were actually given; only IDs that differ from the
+    generated ones are remembered, so loading into an empty database keeps no
+    mapping at all.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+        self._renumbered = {}
+    
+    def _remember(self, rows, new_ids):
+        for row, new_id in zip(rows, new_ids):
+            if new_id is not None and new_id != row[0]:
+                self._renumbered[row[0]] = new_id
+    
+    def write(self, sheet_name, rows):
+        """Write a chunk of rows; returns how many were accepted"""
+        if sheet_name == "Doctors":
+            success, result = self.db.bulk_add_doctors([
+                {"name": row[1], "specialty": row[2], "email": row[3], "phone": row[4], "schedule": row[5]}
+                for row in rows
+            ])
+        elif sheet_name == "Patients":
+            success, result = self.db.bulk_add_patients([
+                {"name": row[1], "email": row[2], "phone": row[3], "dob": row[4], "address": row[5],
+                 "medical_history": row[6]}
+                for row in rows
+            ])
+        else:
+            renumbered = self._renumbered
+            success, result = self.db.bulk_add_appointments([
+                {"patient_id": renumbered.get(row[1], row[1]), "doctor_id": renumbered.get(row[2], row[2]),
+                 "date": row[3], "time": row[4], "status": row[5], "notes": row[6], "created_at": row[7]}
+                for row in rows
+            ])
+        if not success:
+            raise RuntimeError(result)
+        if sheet_name != "Appointments":
+            self._remember(rows, result)
+        return sum(new_id is not None for new_id in result)
+    
+    def close(self):
+        pass
+
+def generate(generator, writer, chunk_size=None, progress=True):
+    """Write every table of a generator through a writer, doctors first so appointments can refer to them"""
+    chunk_size = chunk_size or config.IMPORT_CHUNK_SIZE
+    report = GeneratorReport()
+    started = time.perf_counter()
+    try:
+        for sheet_name, chunks in (
+            ("Doctors", generator.doctors(chunk_size)),
+            ("Patients", generator.patients(chunk_size)),
+            ("Appointments", generator.appointments(chunk_size))
+        ):
+            attribute = sheet_name.lower()
+            for chunk in chunks:
+                written = writer.write(sheet_name, chunk)
+                setattr(report, attribute, getattr(report, attribute) + written)
+                report.rejected += len(chunk) - written
+                if progress and attribute == "appointments" and report.appointments % 1000000 < len(chunk):
+                    print(f"  {report.appointments:,} appointments ({time.perf_counter() - started:.0f}s)")
+    finally:
+        writer.close()
+        report.seconds = time.perf_counter() - started
+    return report
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Generate synthetic doctors, patients and appointments for load testing")
+    parser.add_argument("--appointments", type=int, default=100000, help="Appointments to generate")
+    parser.add_argument("--patients", type=int, help="Patients to generate (default: one per 8 appointments)")
+    parser.add_argument("--doctors", type=int, help="Doctors to generate (default: enough for the appointments)")
+    parser.add_argument("--days-back", type=int, default=540, help="Days of appointment history before today")
+    parser.add_argument("--days-ahead", type=int, default=90, help="Days of upcoming appointments")
+    parser.add_argument("--occupancy", type=float, default=0.6, help="Mean share of slots booked")
+    parser.add_argument("--today", help="Date treated as today, YYYY-MM-DD (default: the real date)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; the same arguments give the same data")
+    parser.add_argument("--chunk-size", type=int, default=config.IMPORT_CHUNK_SIZE, help="Rows per write")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="Output file format")
+    parser.add_argument("--output", default="generated", help="Directory to write the files to")
+    parser.add_argument("--backend", choices=["sheets", "sqlite"], help="Load into this storage backend instead of files")
+    args = parser.parse_args()
+    
+    generator = ClinicDataGenerator(
+        args.appointments, args.patients, args.doctors, args.days_back, args.days_ahead,
+        args.occupancy, args.today, args.seed
+    )
+    if args.backend:
+        from repository import create_database
+        writer = DatabaseWriter(create_database(args.backend))
+    else:
+        writer = FileWriter(args.output, args.format)
+    
+    print(f"Generating {generator.doctor_count:,} doctors, {generator.patient_count:,} patients "
+          f"and {args.appointments:,} appointments")
+    report = generate(generator, writer, args.chunk_size)
+    print(f"Wrote {report.doctors:,} doctors, {report.patients:,} patients and {report.appointments:,} appointments "
+          f"in {report.seconds:.1f}s ({report.rows_per_second:,.0f} rows/s), rejected {report.rejected:,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_to_rowcol, numericise_all, rowcol_to_a1
+
+class _QuotaResponse:
+    """Just enough of a requests.Response for gspread's APIError"""
+    
+    status_code = 429
+    headers = {"Retry-After": "1"}
+    text = "Quota exceeded"
+    
+    def json(self):
+        return {"error": {"code": 429, "message": "Quota exceeded for quota metric 'Requests'", "status": "RESOURCE_EXHAUSTED"}}
+
+def _column_letters(column):
+    return re.sub(r"\d", "", rowcol_to_a1(1, column))
+
+class FakeWorksheet:
+    """In-memory worksheet with the subset of the gspread Worksheet API this app uses
+
+    Cells are stored as text, the way the API returns formatted values. Every
+    call goes through the spreadsheet, which applies the simulated latency and
+    quota and counts it.
+    """
+    
+    def __init__(self, spreadsheet, title, rows=1000, cols=26, sheet_id=0):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self._rows = []
+    
+    def _call(self, method):
+        self.spreadsheet._call(method)
+    
+    @staticmethod
+    def _cell(value):
+        return "" if value is None else str(value)
+    
+    def _last_row(self):
+        """Get the number of rows up to the last one with any value"""
+        for index in range(len(self._rows), 0, -1):
+            if any(self._rows[index - 1]):
+                return index
+        return 0
+    
+    def _range(self, name):
+        """Get the 1-based (first row, first column, last row, last column) of an A1 range; open ends are None"""
+        match = re.fullmatch(r"(?:.*!)?([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?", name)
+        if match is None:
+            raise ValueError(f"Unsupported range: {name}")
+        first_column, first_row, last_column, last_row = match.groups()
+        first_row = int(first_row) if first_row else 1
+        first_column = a1_to_rowcol(f"{first_column}1")[1]
+        if last_column is None:
+            return first_row, first_column, first_row, first_column
+        return first_row, first_column, int(last_row) if last_row else None, a1_to_rowcol(f"{last_column}1")[1]
+    
+    def _read(self, name):
+        """Read a range the way the API does, without trailing empty cells or rows"""
+        first_row, first_column, last_row, last_column = self._range(name)
+        last_row = min(last_row or len(self._rows), len(self._rows))
+        values = []
+        for row in self._rows[first_row - 1:last_row]:
+            cells = row[first_column - 1:last_column]
+            while cells and cells[-1] == "":
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        self.spreadsheet.rows_read += len(values)
+        return values
+    
+    def _write_cell(self, row, column, value):
+        while len(self._rows) < row:
+            self._rows.append([])
+        cells = self._rows[row - 1]
+        if len(cells) < column:
+            cells.extend([""] * (column - len(cells)))
+        cells[column - 1] = self._cell(value)
+    
+    def get_all_records(self, numericise_ignore=None, **kwargs):
+        self._call("get_all_records")
+        with self.spreadsheet._lock:
+            values = self._read("A1:ZZ")
+        if not values:
+            return []
+        headers = values[0]
+        records = []
+        for row in values[1:]:
+            row = row + [""] * (len(headers) - len(row))
+            if numericise_ignore != ["all"]:
+                row = numericise_all(row)
+            records.append(dict(zip(headers, row)))
+        return records
+    
+    def get_values(self, range_name=None, **kwargs):
+        self._call("get_values")
+        with self.spreadsheet._lock:
+            return self._read(range_name or "A1:ZZ")
+    
+    def batch_get(self, ranges, **kwargs):
+        self._call("batch_get")
+        with self.spreadsheet._lock:
+            return [self._read(name) for name in ranges]
+    
+    def col_values(self, col, **kwargs):
+        self._call("col_values")
+        with self.spreadsheet._lock:
+            return [row[0] if row else "" for row in self._read(f"{_column_letters(col)}1:{_column_letters(col)}")]
+    
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+    
+    def append_rows(self, values, **kwargs):
+        self._call("append_rows")
+        with self.spreadsheet._lock:
+            start = self._last_row() + 1
+            for offset, row in enumerate(values):
+                for column, value in enumerate(row, start=1):
+                    self._write_cell(start + offset, column, value)
+            self.spreadsheet.rows_written += len(values)
+            width = max((len(row) for row in values), default=1)
+            end = start + len(values) - 1
+        return {"updates": {"updatedRange": f"{self.title}!A{start}:{_column_letters(width)}{end}"}}
+    
+    def update_cell(self, row, col, value):
+        self._call("update_cell")
+        with self.spreadsheet._lock:
+            self._write_cell(row, col, value)
+    
+    def batch_update(self, data, **kwargs):
+        self._call("batch_update")
+        with self.spreadsheet._lock:
+            for change in data:
+                first_row, first_column, _, _ = self._range(change["range"])
+                for row_offset, row in enumerate(change["values"]):
+                    for column_offset, value in enumerate(row):
+                        self._write_cell(first_row + row_offset, first_column + column_offset, value)
+    
+    def load(self, rows):
+        """Fill the worksheet directly, without going through the simulated API"""
+        with self.spreadsheet._lock:
+            for row in rows:
+                self._rows.append([self._cell(value) for value in row])
+
+class FakeSpreadsheet:
+    """In-memory stand-in for a gspread Spreadsheet, for benchmarks and offline runs
+
+    latency is the simulated seconds every API call takes. With
+    requests_per_minute set, calls beyond that many in the trailing minute fail
+    with a 429 APIError, like the Sheets quota. calls counts API calls by
+    method; rows_read and rows_written count rows transferred.
+    """
+    
+    def __init__(self, latency=0.0, requests_per_minute=None):
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.calls = Counter()
+        self.rows_read = 0
+        self.rows_written = 0
+        self._worksheets = {}
+        self._recent = deque()
+        self._lock = threading.RLock()
+    
+    def _call(self, method):
+        """Count an API call, enforcing the quota and sleeping for the simulated latency"""
+        with self._lock:
+            now = time.monotonic()
+            if self.requests_per_minute is not None:
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.requests_per_minute:
+                    self.calls["throttled"] += 1
+                    raise APIError(_QuotaResponse())
+                self._recent.append(now)
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+    
+    @property
+    def api_calls(self):
+        """Total API calls made, throttled ones excluded"""
+        return sum(count for method, count in self.calls.items() if method != "throttled")
+    
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.rows_read = 0
+            self.rows_written = 0
+    
+    def worksheets(self):
+        self._call("worksheets")
+        return list(self._worksheets.values())
+    
+    def worksheet(self, title):
+        self._call("worksheet")
+        if title not in self._worksheets:
+            raise WorksheetNotFound(title)
+        return self._worksheets[title]
+    
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        self._call("add_worksheet")
+        worksheet = self._worksheets[title] = FakeWorksheet(self, title, rows, cols, len(self._worksheets))
+        return worksheet
+    
+    def batch_update(self, body):
+        """Apply spreadsheet-level requests; only deleteDimension of rows is supported"""
+        self._call("spreadsheet_batch_update")
+        with self._lock:
+            worksheets = {worksheet.id: worksheet for worksheet in self._worksheets.values()}
+            for request in body["requests"]:
+                target = request["deleteDimension"]["range"]
+                if target["dimension"] != "ROWS":
+                    raise ValueError(f"Unsupported dimension: {target['dimension']}")
+                del worksheets[target["sheetId"]]._rows[target["startIndex"]:target["endIndex"]]
+        return {"replies": [{} for _ in body["requests"]]}
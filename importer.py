@@ -0,0 +1,148 @@
+import argparse
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+from utils import validate_email, validate_phone, validate_date, sanitize_input
+import config
+
+# Input fields expected in each import file, in the same form add_patient/add_doctor take
+IMPORT_FIELDS = {
+    "patients": ["name", "email", "phone", "dob", "address", "medical_history"],
+    "doctors": ["name", "email", "phone", "specialty", "schedule"]
+}
+
+# Fields that may be left empty
+OPTIONAL_FIELDS = {"medical_history"}
+
+# Worksheet-style headers that are accepted as well, e.g. a CSV exported from Sheets
+COLUMN_ALIASES = {
+    "dateofbirth": "dob",
+    "medicalhistory": "medical_history"
+}
+
+@dataclass
+class ImportReport:
+    """Outcome of a bulk import"""
+    imported: int = 0
+    rejected: List[Tuple[int, str]] = field(default_factory=list)  # (line number, reason)
+    seconds: float = 0.0
+    
+    @property
+    def rows_per_second(self):
+        """Rows processed per second, accepted or not"""
+        total = self.imported + len(self.rejected)
+        return total / self.seconds if self.seconds else 0.0
+
+def read_chunks(source, file_format, chunk_size):
+    """Stream a CSV or JSONL file (path or file object) as DataFrames of string columns"""
+    if file_format == "csv":
+        reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    elif file_format == "jsonl":
+        reader = pd.read_json(source, lines=True, dtype=False, chunksize=chunk_size)
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+    
+    # Rows are indexed by their line in the file so rejects can point at them
+    first_line = 2 if file_format == "csv" else 1
+    for chunk in reader:
+        chunk = chunk.rename(columns=lambda column: COLUMN_ALIASES.get(column.lower(), column.lower()))
+        chunk = chunk.fillna("").astype(str)
+        chunk.index = pd.RangeIndex(first_line, first_line + len(chunk))
+        first_line += len(chunk)
+        yield chunk
+
+def validate_chunk(chunk, kind):
+    """Check every row of a chunk at once; returns the valid rows and (line, reason) rejects"""
+    fields = IMPORT_FIELDS[kind]
+    for column in fields:
+        if column not in chunk:
+            chunk[column] = ""
+    chunk = chunk[fields].apply(lambda column: column.str.strip())
+    
+    # Each check covers the whole chunk; the first failing check names the reject reason
+    required = [column for column in fields if column not in OPTIONAL_FIELDS]
+    checks = [
+        ((chunk[required] == "").any(axis=1), "Missing required field"),
+        (~chunk["email"].map(validate_email), "Invalid email address"),
+        (~chunk["phone"].map(validate_phone), "Invalid phone number")
+    ]
+    if kind == "patients":
+        checks.append((~chunk["dob"].map(validate_date), "Invalid date of birth"))
+    else:
+        checks.append((~chunk["specialty"].isin(config.SPECIALTIES), "Unknown specialty"))
+    
+    reasons = np.select([mask.to_numpy(dtype=bool) for mask, _ in checks], [reason for _, reason in checks], default="")
+    invalid = reasons != ""
+    
+    rejects = list(zip(chunk.index[invalid].tolist(), reasons[invalid].tolist()))
+    return chunk[~invalid], rejects
+
+def import_file(db, source, kind, file_format=None, chunk_size=None):
+    """Import patients or doctors from a CSV or JSONL file into a database backend"""
+    if kind not in IMPORT_FIELDS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    if file_format is None:
+        file_format = os.path.splitext(getattr(source, "name", source))[1].lstrip(".").lower()
+    chunk_size = chunk_size or config.IMPORT_CHUNK_SIZE
+    
+    report = ImportReport()
+    started = time.perf_counter()
+    
+    # Emails already in the database, plus the ones imported so far
+    existing = db.get_all_patients() if kind == "patients" else db.get_all_doctors()
+    seen_emails = {record.email for record in existing}
+    bulk_add = db.bulk_add_patients if kind == "patients" else db.bulk_add_doctors
+    
+    for chunk in read_chunks(source, file_format, chunk_size):
+        valid, rejects = validate_chunk(chunk, kind)
+        report.rejected.extend(rejects)
+        
+        duplicate = valid["email"].isin(seen_emails) | valid["email"].duplicated()
+        report.rejected.extend((line, "Duplicate email") for line in valid.index[duplicate].tolist())
+        valid = valid[~duplicate]
+        if valid.empty:
+            continue
+        
+        records = [
+            {column: sanitize_input(value) for column, value in record.items()}
+            for record in valid.to_dict("records")
+        ]
+        success, result = bulk_add(records)
+        if not success:
+            report.rejected.extend((line, result) for line in valid.index.tolist())
+            continue
+        
+        for line, new_id, record in zip(valid.index.tolist(), result, records):
+            if new_id is None:
+                report.rejected.append((line, "Duplicate email"))
+            else:
+                report.imported += 1
+                seen_emails.add(record["email"])
+    
+    report.seconds = time.perf_counter() - started
+    return report
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Bulk import patients or doctors from a CSV or JSONL file")
+    parser.add_argument("kind", choices=sorted(IMPORT_FIELDS), help="What the file contains")
+    parser.add_argument("path", help="CSV or JSONL file to import")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="File format (default: from the extension)")
+    parser.add_argument("--chunk-size", type=int, default=config.IMPORT_CHUNK_SIZE, help="Rows per append request")
+    parser.add_argument("--backend", choices=["sheets", "sqlite"], help="Storage backend (default: from config)")
+    args = parser.parse_args()
+    
+    from repository import create_database
+    db = create_database(args.backend)
+    
+    report = import_file(db, args.path, args.kind, args.format, args.chunk_size)
+    print(f"Imported {report.imported} {args.kind} in {report.seconds:.1f}s "
+          f"({report.rows_per_second:.0f} rows/s), rejected {len(report.rejected)}")
+    for line, reason in report.rejected:
+        print(f"  line {line}: {reason}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import replace
+from functools import total_ordering
+from operator import attrgetter
+
+@total_ordering
+class _AfterAll:
+    """Compares greater than any other value, to bound a range by its first sort field"""
+    
+    def __eq__(self, other):
+        return other is self
+    
+    def __gt__(self, other):
+        return other is not self
+
+_AFTER_ALL = _AfterAll()
+
+@total_ordering
+class _BeforeAll:
+    """Compares less than any other value, so records with a blank sort field sort first"""
+    
+    def __eq__(self, other):
+        return other is self
+    
+    def __lt__(self, other):
+        return other is not self
+
+_BEFORE_ALL = _BeforeAll()
+
+class HashIndex:
+    """Hash map from the values of one or more record attributes to record positions"""
+    
+    def __init__(self, fields, unique=False):
+        self.fields = tuple(fields)
+        self.unique = unique
+        self._map = {}
+        # Gets the index key of a record (a tuple for compound indexes)
+        self.key = attrgetter(*self.fields)
+    
+    def add(self, record, position):
+        """Add a record stored at the given position"""
+        key = self.key(record)
+        if self.unique:
+            # Keep the first occurrence, like a top-down scan would find
+            self._map.setdefault(key, position)
+        else:
+            self._map.setdefault(key, []).append(position)
+    
+    def remove(self, record, position):
+        """Remove a record stored at the given position"""
+        key = self.key(record)
+        if self.unique:
+            if self._map.get(key) == position:
+                del self._map[key]
+        else:
+            positions = self._map.get(key, [])
+            if position in positions:
+                positions.remove(position)
+                if not positions:
+                    del self._map[key]
+    
+    def get(self, key):
+        """Get the positions stored under a key"""
+        found = self._map.get(key)
+        if found is None:
+            return []
+        if self.unique:
+            return [found]
+        return found
+    
+    def add_all(self, records):
+        """Add records stored at positions 0, 1, ..."""
+        keys = map(self.key, records)
+        if self.unique:
+            for position, key in enumerate(keys):
+                self._map.setdefault(key, position)
+        else:
+            for position, key in enumerate(keys):
+                positions = self._map.get(key)
+                if positions is None:
+                    self._map[key] = [position]
+                else:
+                    positions.append(position)
+    
+    def __contains__(self, key):
+        return key in self._map
+    
+    def __len__(self):
+        return len(self._map)
+
+class SortedIndex:
+    """Record positions grouped by some fields and kept sorted by others, for range queries"""
+    
+    def __init__(self, group_fields, sort_fields):
+        self.group_fields = tuple(group_fields)
+        self.sort_fields = tuple(sort_fields)
+        self.fields = self.group_fields + self.sort_fields
+        # Maps a group key to parallel lists of sort keys and positions
+        self._groups = {}
+        self._group_values = self._tuple_getter(self.group_fields)
+        self._sort_values = self._tuple_getter(self.sort_fields)
+    
+    @staticmethod
+    def _tuple_getter(fields):
+        """Get a function returning a tuple of the given attributes of a record"""
+        if not fields:
+            return lambda record: ()
+        if len(fields) == 1:
+            getter = attrgetter(fields[0])
+            return lambda record: (getter(record),)
+        return attrgetter(*fields)
+    
+    def _group_key(self, record):
+        return self._group_values(record)
+    
+    def _sort_key(self, record):
+        values = self._sort_values(record)
+        # Blank dates and times can't be compared with real ones
+        if None in values:
+            return tuple(_BEFORE_ALL if value is None else value for value in values)
+        return values
+    
+    def add(self, record, position):
+        """Add a record stored at the given position"""
+        keys, positions = self._groups.setdefault(self._group_key(record), ([], []))
+        key = (self._sort_key(record), position)
+        at = bisect_right(keys, key)
+        keys.insert(at, key)
+        positions.insert(at, position)
+    
+    def add_all(self, records):
+        """Add records stored at positions 0, 1, ..., sorting each group once rather than inserting into it"""
+        entries = {}
+        for position, record in enumerate(records):
+            entries.setdefault(self._group_key(record), []).append((self._sort_key(record), position))
+        for group_key, group_entries in entries.items():
+            keys, positions = self._groups.setdefault(group_key, ([], []))
+            group_entries.extend(keys)
+            group_entries.sort()
+            keys[:] = group_entries
+            positions[:] = [position for _, position in group_entries]
+    
+    def remove(self, record, position):
+        """Remove a record stored at the given position"""
+        group_key = self._group_key(record)
+        keys, positions = self._groups.get(group_key, ([], []))
+        at = bisect_left(keys, (self._sort_key(record), position))
+        if at < len(keys) and positions[at] == position:
+            del keys[at]
+            del positions[at]
+            if not keys:
+                del self._groups[group_key]
+    
+    def range(self, group=(), low=None, high=None):
+        """Get the positions in a group whose first sort field is between low and high, inclusive"""
+        keys, positions = self._groups.get(tuple(group), ([], []))
+        start = 0 if low is None else bisect_left(keys, ((low,),))
+        # Any key whose first sort field equals high sorts before (high, <greater than anything>)
+        end = len(keys) if high is None else bisect_left(keys, ((high, _AFTER_ALL),))
+        return positions[start:end]
+    
+    def get(self, group):
+        """Get every position in a group, in sort order"""
+        return self.range(group)
+    
+    def __contains__(self, group):
+        return tuple(group) in self._groups
+    
+    def __len__(self):
+        return len(self._groups)
+
+# Words are runs of letters and digits; a word mixing both is also split into its letter and digit parts
+_WORD = re.compile(r"[^\W_]+")
+_WORD_PART = re.compile(r"\d+|[^\W\d_]+")
+# Numbers with leading zeros, captured without them
+_ZERO_PADDED = re.compile(r"(?<!\d)0+([1-9]\d*)")
+
+# Match scores of a search term against a word
+EXACT_MATCH, PREFIX_MATCH, FUZZY_MATCH = 3, 2, 1
+
+def _normalize(value):
+    """Lowercase text and remove its accents"""
+    value = str(value).casefold()
+    if not value.isascii():
+        value = "".join(char for char in unicodedata.normalize("NFKD", value) if not unicodedata.combining(char))
+    return value
+
+def _within_edits(a, b, limit):
+    """Check whether two words are at most limit insertions, deletions, substitutions or swaps apart"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    # Optimal string alignment distance, giving up once a whole row exceeds the limit
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return False
+    return current[-1] <= limit
+
+class TextIndex:
+    """Inverted index from the words of some text attributes to record positions, for ranked search
+    
+    A search term matches a word exactly, as a prefix, or within one typo
+    (two for terms of eight letters or more). Every term of a query must
+    match, and records are ranked by the sum of their best match per term.
+    Numbers are indexed without leading zeros, and words mixing letters and
+    digits by their parts too, so "12" finds P0012 and "smith" finds
+    smith12@example.com.
+    
+    Records are only split into words on the first search, so loading a
+    table doesn't pay for an index nobody searches; after that, added
+    records are indexed straight away.
+    """
+    
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        # Records added before the first search, by position
+        self._pending = {}
+        self._build_lock = threading.Lock()
+        # Maps a word to its positions: a tuple while there's only one, as most IDs are, else a set
+        self._postings = {}
+        # Sorted words for prefix lookups, built along with the rest on the first search
+        self._sorted = None
+        # Bigrams of each alphabetic word, to find the candidates for a typo match
+        self._bigrams = {}
+        self._fuzzy_cache = {}
+    
+    def tokens(self, record):
+        """Get the set of words a record is indexed under"""
+        text = _normalize(" ".join(str(getattr(record, field)) for field in self.fields))
+        tokens = set(_WORD.findall(text))
+        tokens.update(_WORD_PART.findall(_ZERO_PADDED.sub(r"\1", text)))
+        return tokens
+    
+    @staticmethod
+    def _terms(query):
+        """Split a query into distinct search terms, numbers without leading zeros"""
+        return list(dict.fromkeys(
+            _ZERO_PADDED.sub(r"\1", word) if word.isdigit() else word
+            for word in _WORD.findall(_normalize(query))
+        ))
+    
+    @staticmethod
+    def _bigrams_of(word):
+        padded = f" {word} "
+        return {padded[i:i + 2] for i in range(len(padded) - 1)}
+    
+    def add(self, record, position):
+        """Add a record stored at the given position"""
+        if self._sorted is None:
+            with self._build_lock:
+                if self._sorted is None:
+                    self._pending[position] = record
+                    return
+        self._index(record, position)
+    
+    def _index(self, record, position):
+        postings = self._postings
+        for token in self.tokens(record):
+            positions = postings.get(token)
+            if positions is None:
+                postings[token] = (position,)
+                if self._sorted is not None:
+                    self._vocabulary_changed(token, added=True)
+            elif type(positions) is tuple:
+                postings[token] = {positions[0], position}
+            else:
+                positions.add(position)
+    
+    def remove(self, record, position):
+        """Remove a record stored at the given position"""
+        if self._sorted is None:
+            with self._build_lock:
+                if self._sorted is None:
+                    if self._pending.get(position) is record:
+                        del self._pending[position]
+                    return
+        for token in self.tokens(record):
+            positions = self._postings.get(token)
+            if positions is None or position not in positions:
+                continue
+            if type(positions) is tuple:
+                del self._postings[token]
+                self._vocabulary_changed(token, added=False)
+            else:
+                positions.discard(position)
+    
+    def _vocabulary_changed(self, token, added):
+        """Keep the sorted words and bigrams in step with a word added or removed"""
+        if added:
+            insort(self._sorted, token)
+        else:
+            del self._sorted[bisect_left(self._sorted, token)]
+        if token.isalpha() and len(token) >= 3:
+            for bigram in self._bigrams_of(token):
+                if added:
+                    self._bigrams.setdefault(bigram, set()).add(token)
+                else:
+                    self._bigrams[bigram].discard(token)
+        self._fuzzy_cache.clear()
+    
+    def _build(self):
+        """Index the records added before the first search"""
+        with self._build_lock:
+            # Another thread may have built it while we were waiting
+            if self._sorted is not None:
+                return
+            for position, record in self._pending.items():
+                self._index(record, position)
+            self._pending = {}
+            for token in self._postings:
+                if token.isalpha() and len(token) >= 3:
+                    for bigram in self._bigrams_of(token):
+                        self._bigrams.setdefault(bigram, set()).add(token)
+            self._sorted = sorted(self._postings)
+    
+    def _prefixed(self, term):
+        """Get the words starting with term"""
+        start = bisect_left(self._sorted, term)
+        end = bisect_left(self._sorted, term + "\U0010ffff", start)
+        return self._sorted[start:end]
+    
+    def _similar(self, term):
+        """Get the words within a typo or two of term"""
+        if not term.isalpha() or len(term) < 4:
+            return []
+        if term not in self._fuzzy_cache:
+            limit = 1 if len(term) < 8 else 2
+            # Each edit changes at most two of the term's bigrams, and a swap two edits' worth
+            shared = {}
+            for bigram in self._bigrams_of(term):
+                for token in self._bigrams.get(bigram, ()):
+                    shared[token] = shared.get(token, 0) + 1
+            needed = max(1, len(term) + 1 - 4 * limit)
+            self._fuzzy_cache[term] = [
+                token for token, count in shared.items()
+                if count >= needed and token != term and _within_edits(term, token, limit)
+            ]
+        return self._fuzzy_cache[term]
+    
+    def _term_scores(self, term):
+        """Get [(score, positions)] of the records matching one search term, best match first"""
+        exact = self._postings.get(term, ())
+        prefixed = set().union(*map(self._postings.__getitem__, self._prefixed(term)))
+        prefixed.difference_update(exact)
+        similar = set().union(*map(self._postings.__getitem__, self._similar(term)))
+        similar.difference_update(exact, prefixed)
+        return [(EXACT_MATCH, exact), (PREFIX_MATCH, prefixed), (FUZZY_MATCH, similar)]
+    
+    def _matches(self, query):
+        """Get {score: positions} of the records matching every term of a query; don't modify them"""
+        if self._sorted is None:
+            self._build()
+        terms = self._terms(query)
+        if not terms:
+            return {}
+        
+        per_term = [self._term_scores(term) for term in terms]
+        if len(per_term) == 1:
+            return {score: positions for score, positions in per_term[0] if positions}
+        
+        # Only records matching every term are scored, starting from the rarest term
+        per_term.sort(key=lambda levels: sum(len(positions) for _, positions in levels))
+        candidates = set().union(*(positions for _, positions in per_term[0]))
+        for levels in per_term[1:]:
+            candidates = set().union(*(candidates.intersection(positions) for _, positions in levels))
+        
+        buckets = {}
+        for position in candidates:
+            score = sum(
+                next(score for score, positions in levels if position in positions)
+                for levels in per_term
+            )
+            buckets.setdefault(score, set()).add(position)
+        return buckets
+    
+    def search(self, query, start=0, count=None, keep=None):
+        """Get (positions, total) for one page of a ranked search
+        
+        Positions are ranked best match first and then in record order;
+        start and count pick the page. keep, given a position, can narrow the
+        matches further, and total counts the matches across every page.
+        """
+        buckets = self._matches(query)
+        # Copied first, as positions can be added to a word's set while we iterate
+        if keep is not None:
+            buckets = {score: [p for p in list(positions) if keep(p)] for score, positions in buckets.items()}
+        
+        total = sum(len(positions) for positions in buckets.values())
+        end = total if count is None else min(total, start + count)
+        ranked = []
+        skipped = 0
+        for score in sorted(buckets, reverse=True):
+            positions = buckets[score]
+            # Whole buckets before the page are skipped without sorting them
+            if not ranked and skipped + len(positions) <= start:
+                skipped += len(positions)
+                continue
+            needed = end - skipped - len(ranked)
+            if needed <= 0:
+                break
+            ranked.extend(heapq.nsmallest(needed, list(positions)) if needed < len(positions) else sorted(positions))
+        return ranked[start - skipped:end - skipped], total
+    
+    def get(self, query):
+        """Get the positions of every record matching a query, best match first"""
+        return self.search(query)[0]
+    
+    def __contains__(self, word):
+        if self._sorted is None:
+            self._build()
+        return word in self._postings
+    
+    def __len__(self):
+        if self._sorted is None:
+            self._build()
+        return len(self._postings)
+
+class IndexedTable:
+    """Worksheet records (immutable model objects) plus the indexes declared for them"""
+    
+    def __init__(self, records, index_specs=None):
+        self.records = records
+        self.indexes = {}
+        
+        # Each spec is a callable returning an empty index; those that can be filled in one pass are
+        for name, make_index in (index_specs or {}).items():
+            index = make_index()
+            if hasattr(index, "add_all"):
+                index.add_all(records)
+            else:
+                for position, record in enumerate(records):
+                    index.add(record, position)
+            self.indexes[name] = index
+    
+    def positions(self, index_name, key):
+        """Get the positions of the records matching key in an index"""
+        return self.indexes[index_name].get(key)
+    
+    def range(self, index_name, group=(), low=None, high=None):
+        """Get the records of a group in a SortedIndex whose first sort field is between low and high"""
+        return [self.records[position] for position in self.indexes[index_name].range(group, low, high)]
+    
+    def find(self, index_name, key):
+        """Get the first record matching key in an index, or None"""
+        positions = self.positions(index_name, key)
+        if not positions:
+            return None
+        return self.records[positions[0]]
+    
+    def find_all(self, index_name, key):
+        """Get every record matching key in an index"""
+        return [self.records[position] for position in self.positions(index_name, key)]
+    
+    def contains(self, index_name, key):
+        """Check whether any record matches key in an index"""
+        return key in self.indexes[index_name]
+    
+    def append(self, record):
+        """Append a record and add it to every index"""
+        position = len(self.records)
+        self.records.append(record)
+        for index in self.indexes.values():
+            index.add(record, position)
+        return position
+    
+    def update(self, position, changes):
+        """Replace the record at a position with a copy having changed fields, re-indexing it if needed"""
+        record = self.records[position]
+        affected = [
+            index for index in self.indexes.values()
+            if any(field in changes for field in index.fields)
+        ]
+        
+        for index in affected:
+            index.remove(record, position)
+        record = self.records[position] = replace(record, **changes)
+        for index in affected:
+            index.add(record, position)
+    
+    def __len__(self):
+        return len(self.records)
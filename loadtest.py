@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from analytics import get_analytics
+from benchmark import ScenarioResult
+from datagen import ClinicDataGenerator, DatabaseWriter, generate
+import config
+
+# Relative share of each kind of virtual user
+DEFAULT_MIX = {"patient": 5, "front_desk": 3, "doctor": 2, "admin": 1}
+
+# What book_appointment returns when someone else took the slot first
+SLOT_TAKEN = "This time slot is already booked"
+
+class VirtualUser:
+    """One simulated session running the app's page flows against a shared database
+
+    Each step makes the same data layer calls as the page it stands for and
+    is timed on its own. Bookings that lose a race for their slot are counted
+    as conflicts; those are expected and correct. Every successful booking is
+    remembered so double bookings can be checked for after the run.
+    """
+    
+    def __init__(self, number, persona, db, analytics, identities, think_time, seed):
+        self.number = number
+        self.persona = persona
+        self.db = db
+        self.analytics = analytics
+        self.identities = identities
+        self.think_time = think_time
+        self.rng = random.Random(seed * 100003 + number)
+        self.results = {}
+        self.bookings = Counter()
+        self.booked = []
+    
+    def _step(self, name, operation, *args, **kwargs):
+        """Run one timed step; exceptions count as errors and return None"""
+        result = self.results.get(name)
+        if result is None:
+            result = self.results[name] = ScenarioResult(name)
+        started = time.perf_counter()
+        try:
+            return operation(*args, **kwargs)
+        except Exception:
+            result.errors += 1
+            return None
+        finally:
+            result.latencies.append(time.perf_counter() - started)
+    
+    def _think(self):
+        if self.think_time:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+    
+    def _book(self, patient_id, doctor_id, day, slot_time):
+        success, result = self._step("book_appointment", self.db.book_appointment, {
+            "patient_id": patient_id,
+            "doctor_id": doctor_id,
+            "date": day,
+            "time": slot_time,
+            "notes": f"Load test user {self.number}"
+        }) or (False, "Error")
+        if success:
+            self.bookings["booked"] += 1
+            self.booked.append((result, doctor_id, day, slot_time))
+        elif result == SLOT_TAKEN:
+            self.bookings["conflicts"] += 1
+        else:
+            self.bookings["failed"] += 1
+    
+    def _booking_flow(self, patient_id):
+        """The book appointment page: first available, or pick a doctor and a slot from the two-week grid"""
+        specialty = self.rng.choice(config.SPECIALTIES)
+        if self.rng.random() < 0.5:
+            slots = self._step("first_available", self.db.find_first_available, specialty, count=10) or []
+            self._think()
+            if slots:
+                # Most people take the earliest slot, so these bookings race each other
+                slot = slots[0] if self.rng.random() < 0.7 else self.rng.choice(slots)
+                self._book(patient_id, slot.doctor_id, slot.date, slot.time)
+            return
+        
+        doctors = self._step("doctors_by_specialty", self.db.get_doctors_by_specialty, specialty) or []
+        if not doctors:
+            return
+        doctor = self.rng.choice(doctors)
+        today = datetime.now().date()
+        dates = [today + timedelta(days=offset) for offset in range(1, 15)]
+        free_slots = self._step("available_slots", self.db.get_available_slots, doctor.id, dates) or {}
+        self._think()
+        open_dates = [day for day in dates if free_slots.get(day)]
+        if open_dates:
+            day = self.rng.choice(open_dates)
+            self._book(patient_id, doctor.id, day, self.rng.choice(free_slots[day]))
+    
+    def patient_session(self):
+        """Log in, look at the dashboard, book, and now and then cancel an upcoming appointment"""
+        patient = self._step("login", self.db.get_patient_by_email, self.rng.choice(self.identities["patients"]))
+        if patient is None:
+            return
+        self._step("patient_dashboard", lambda: (
+            self.db.get_patient_by_id(patient.id),
+            self.db.get_patient_appointments(patient.id, fields=("doctor_name", "specialty"))))
+        self._think()
+        self._booking_flow(patient.id)
+        self._think()
+        
+        if self.rng.random() < 0.1:
+            appointments = self._step("my_appointments", self.db.get_patient_appointments, patient.id,
+                                      fields=("doctor_name", "specialty")) or []
+            today = datetime.now().date()
+            upcoming = [appt for appt in appointments if appt.status == "Scheduled" and appt.date and appt.date > today]
+            if upcoming:
+                self._step("cancel_appointment", self.db.update_appointment_status, self.rng.choice(upcoming).id, "Cancelled")
+    
+    def front_desk_session(self):
+        """Search for a caller, look them up by email and book on their behalf"""
+        email = self.rng.choice(self.identities["patients"])
+        self._step("patient_search", self.db.list_patients, email.split("@")[0][:6])
+        patient = self._step("patient_lookup", self.db.get_patient_by_email, email)
+        self._think()
+        if patient is not None:
+            self._booking_flow(patient.id)
+    
+    def doctor_session(self):
+        """Log in, check today's list and the weekly schedule, and complete one of today's appointments"""
+        doctor = self._step("login", self.db.get_doctor_by_email, self.rng.choice(self.identities["doctors"]))
+        if doctor is None:
+            return
+        today = datetime.now().date()
+        dashboard = self._step("doctor_dashboard", lambda: (
+            self.db.get_doctor_by_id(doctor.id), self.db.get_doctor_appointments(doctor.id, today, fields=("patient_name",))))
+        todays_appointments = dashboard[1] if dashboard else []
+        self._think()
+        
+        start_of_week = today - timedelta(days=today.weekday())
+        self._step("weekly_schedule", self.db.get_appointments, doctor_id=doctor.id, start=start_of_week,
+                   end=start_of_week + timedelta(days=6), fields=("patient_name",))
+        self._think()
+        
+        scheduled = [appt for appt in todays_appointments if appt.status == "Scheduled"]
+        if scheduled and self.rng.random() < 0.3:
+            self._step("complete_appointment", self.db.update_appointment_status, self.rng.choice(scheduled).id, "Completed")
+    
+    def admin_session(self):
+        """Open the admin dashboard, then the appointment reports"""
+        analytics = self.analytics
+        self._step("admin_dashboard", lambda: (
+            self.db.list_patients(page_size=1), self.db.list_doctors(page_size=1),
+            analytics.total(), analytics.counts_by_status()))
+        self._think()
+        today = datetime.now().date()
+        self._step("appointment_reports", lambda: (
+            analytics.counts_by_status(), analytics.counts_by_specialty(),
+            analytics.counts_by_date_range(today - timedelta(days=6), today), analytics.counts_by_doctor()))
+        self._think()
+    
+    def run(self, deadline, sessions=None):
+        """Run sessions back to back until the deadline, or until a number of sessions is done"""
+        session = getattr(self, f"{self.persona}_session")
+        done = 0
+        while time.monotonic() < deadline and (sessions is None or done < sessions):
+            session()
+            done += 1
+        return self
+
+def _parse_mix(text):
+    """Parse a persona mix such as patient=5,doctor=1"""
+    mix = {}
+    for part in text.split(","):
+        persona, _, weight = part.partition("=")
+        if persona not in DEFAULT_MIX:
+            raise ValueError(f"Unknown persona: {persona}")
+        mix[persona] = float(weight or 1)
+    return mix
+
+def check_bookings(db, booked):
+    """Reread every appointment and count double-booked slots and lost confirmations among this run's bookings"""
+    if hasattr(db, "writes") and db.writes is not None:
+        db.writes.drain("Appointments")
+    if hasattr(db, "invalidate_cache"):
+        db.invalidate_cache()
+    appointments = db.get_all_appointments()
+    
+    # Only slots booked during the run, so existing data can't fail it
+    slots = {(doctor_id, day, slot_time) for _, doctor_id, day, slot_time in booked}
+    live = Counter(
+        (appt.doctor_id, appt.date, appt.time) for appt in appointments
+        if appt.status != "Cancelled" and (appt.doctor_id, appt.date, appt.time) in slots
+    )
+    stored = {appt.id for appt in appointments}
+    return {
+        "double_booked_slots": sum(1 for count in live.values() if count > 1),
+        "lost_bookings": sum(1 for appointment_id, _, _, _ in booked if appointment_id not in stored)
+    }
+
+def open_database(args):
+    """Create the backend under test, seeding local ones with generated data"""
+    if args.backend == "sheets":
+        from database import GoogleSheetsDatabase
+        return GoogleSheetsDatabase()
+    
+    generator = ClinicDataGenerator(args.seed_appointments, days_back=180, days_ahead=30, seed=args.seed)
+    if args.backend == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        path = args.sqlite_path or os.path.join(tempfile.mkdtemp(), "loadtest.db")
+        db = SQLiteDatabase(path)
+        if not db.get_all_doctors():
+            generate(generator, DatabaseWriter(db), progress=False)
+        return db
+    
+    from database import GoogleSheetsDatabase
+    from fake_sheets import FakeSpreadsheet
+    db = GoogleSheetsDatabase(spreadsheet=FakeSpreadsheet(latency=args.latency))
+    generate(generator, DatabaseWriter(db), progress=False)
+    return db
+
+def run_load(db, users, duration, mix=None, think_time=0.0, sessions=None, seed=42):
+    """Run users concurrent virtual users against db; returns (users, wall-clock seconds)"""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    patients = db.get_all_patients()
+    identities = {
+        "patients": [patient.email for patient in rng.sample(patients, min(1000, len(patients)))],
+        "doctors": [doctor.email for doctor in db.get_all_doctors()]
+    }
+    if not identities["patients"] or not identities["doctors"]:
+        raise RuntimeError("The database needs at least one patient and one doctor")
+    analytics = get_analytics(db)
+    
+    personas = rng.choices(list(mix), weights=list(mix.values()), k=users)
+    virtual_users = [
+        VirtualUser(number, persona, db, analytics, identities, think_time, seed)
+        for number, persona in enumerate(personas)
+    ]
+    
+    started = time.monotonic()
+    deadline = started + duration
+    # Every user gets its own thread, like every Streamlit session does
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix="virtual-user") as pool:
+        finished = list(pool.map(lambda user: user.run(deadline, sessions), virtual_users))
+    return finished, time.monotonic() - started
+
+def summarize(virtual_users, seconds, checks):
+    """Merge every user's step timings and booking counters into one report"""
+    steps = {}
+    bookings = Counter()
+    for user in virtual_users:
+        bookings.update(user.bookings)
+        for name, result in user.results.items():
+            merged = steps.setdefault(name, ScenarioResult(name))
+            merged.latencies.extend(result.latencies)
+            merged.errors += result.errors
+    
+    return {
+        "seconds": round(seconds, 2),
+        "users": Counter(user.persona for user in virtual_users),
+        "steps": {
+            name: {
+                "operations": result.operations,
+                "throughput": round(result.operations / seconds, 1) if seconds else 0.0,
+                "p50_ms": round(result.percentile(50), 3),
+                "p95_ms": round(result.percentile(95), 3),
+                "p99_ms": round(result.percentile(99), 3),
+                "max_ms": round(max(result.latencies, default=0) * 1000, 3),
+                "errors": result.errors
+            }
+            for name, result in sorted(steps.items())
+        },
+        "bookings": dict(bookings),
+        **checks
+    }
+
+def print_report(report):
+    users = ", ".join(f"{count} {persona}" for persona, count in sorted(report["users"].items()))
+    print(f"\n{sum(report['users'].values())} users ({users}) for {report['seconds']}s")
+    print(f"{'step':<24}{'ops':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for name, step in report["steps"].items():
+        print(f"{name:<24}{step['operations']:>8}{step['throughput']:>10,.1f}{step['p50_ms']:>10.2f}"
+              f"{step['p95_ms']:>10.2f}{step['p99_ms']:>10.2f}{step['max_ms']:>10.2f}{step['errors']:>8}")
+    
+    bookings = report["bookings"]
+    print(f"\nBookings: {bookings.get('booked', 0)} confirmed, {bookings.get('conflicts', 0)} lost a race for their slot, "
+          f"{bookings.get('failed', 0)} failed")
+    print(f"Double-booked slots: {report['double_booked_slots']}, confirmed bookings missing: {report['lost_bookings']}")
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Simulate many concurrent app sessions against one database")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run for")
+    parser.add_argument("--sessions", type=int, help="Stop each user after this many sessions")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX,
+                        help="Share of each persona, e.g. patient=5,front_desk=3,doctor=2,admin=1")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds users pause between steps")
+    parser.add_argument("--backend", choices=["fake", "sqlite", "sheets"], default="fake",
+                        help="fake: in-memory spreadsheet; sqlite: local file; sheets: the configured spreadsheet")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per API call (fake backend)")
+    parser.add_argument("--sqlite-path", help="SQLite file to use; seeded if empty (default: a temporary file)")
+    parser.add_argument("--seed-appointments", type=int, default=20000, help="Appointments generated for local backends")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+    
+    db = open_database(args)
+    virtual_users, seconds = run_load(db, args.users, args.duration, args.mix, args.think_time, args.sessions, args.seed)
+    booked = [booking for user in virtual_users for booking in user.booked]
+    report = summarize(virtual_users, seconds, check_bookings(db, booked))
+    print_report(report)
+    
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+    
+    # A double booking or a lost confirmation is a bug, so fail the run
+    if report["double_booked_slots"] or report["lost_bookings"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
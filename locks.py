@@ -0,0 +1,79 @@
+import re
+import threading
+from contextlib import contextmanager
+
+class LockManager:
+    """Hands out one lock per key so only writes to the same key are serialized"""
+    
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def hold(self, key):
+        """Hold the lock for a key for the duration of a with block"""
+        with self._lock:
+            lock, waiters = self._locks.get(key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._locks[key] = (lock, waiters + 1)
+        
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+            with self._lock:
+                lock, waiters = self._locks[key]
+                # Drop locks nobody is using so the map doesn't grow with every slot ever booked
+                if waiters == 1:
+                    del self._locks[key]
+                else:
+                    self._locks[key] = (lock, waiters - 1)
+    
+    def __len__(self):
+        return len(self._locks)
+
+class IdAllocator:
+    """Hands out sequential IDs such as P0001 that are never reused within the process"""
+    
+    def __init__(self, prefix, width=4):
+        self.prefix = prefix
+        self.width = width
+        self._pattern = re.compile(rf"^{re.escape(prefix)}(\d+)$")
+        self._highest = 0
+        self._records = None
+        self._scanned = 0
+        self._lock = threading.Lock()
+    
+    def _observe(self, records, id_field):
+        """Raise the highest known ID number to cover any records not seen yet"""
+        if records is not self._records:
+            # The table was reloaded, so scan it from the start
+            self._records = records
+            self._scanned = 0
+        
+        for record in records[self._scanned:]:
+            match = self._pattern.match(getattr(record, id_field))
+            if match:
+                self._highest = max(self._highest, int(match.group(1)))
+        self._scanned = len(records)
+    
+    def reserve(self, used_id):
+        """Never hand out used_id or any ID before it, e.g. one stored outside the scanned records"""
+        match = self._pattern.match(used_id)
+        if match:
+            with self._lock:
+                self._highest = max(self._highest, int(match.group(1)))
+    
+    def next_id(self, records, id_field):
+        """Allocate the ID following the highest one in records or handed out before"""
+        return self.next_ids(records, id_field, 1)[0]
+    
+    def next_ids(self, records, id_field, count):
+        """Allocate a block of consecutive IDs"""
+        with self._lock:
+            self._observe(records, id_field)
+            first = self._highest + 1
+            self._highest += count
+            return [f"{self.prefix}{number:0{self.width}d}" for number in range(first, first + count)]
@@ -0,0 +1,258 @@
+import functools
+import os
+import threading
+import time
+import types
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    """Counts of observations per bucket, with their sum and maximum"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus one for values above the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket holding it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+def _label_text(labels):
+    """Format labels the way the Prometheus text format expects, e.g. {method="get"}"""
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+class MetricsRegistry:
+    """Latency histograms and counters, plus collectors that report other components' counters"""
+    
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+    
+    def describe(self, name, kind, help_text):
+        """Set the type and help text a metric is exported with"""
+        with self._lock:
+            self._help[name] = (kind, help_text)
+    
+    def observe(self, name, value, **labels):
+        """Add a value to the histogram of a metric and label set"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+    
+    def increment(self, name, amount=1, **labels):
+        """Add to the counter of a metric and label set"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+    
+    @contextmanager
+    def timed(self, name, **labels):
+        """Record how long a with block takes in a latency histogram; failures are counted too"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment(name.replace("_seconds", "_errors_total"), **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+    
+    def instrumented(self, name, label, **labels):
+        """Decorator timing every call of a function, labelled with its name"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timed(name, **{label: function.__name__}, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+    
+    def instrument_methods(self, name, label="method", **labels):
+        """Class decorator timing every public method, including inherited ones"""
+        def decorate(cls):
+            decorator = self.instrumented(name, label, **labels)
+            methods = {}
+            for base in reversed(cls.__mro__[:-1]):
+                for attribute, value in vars(base).items():
+                    # Plain functions only; properties, static and class methods are left alone
+                    if not attribute.startswith("_") and isinstance(value, types.FunctionType):
+                        methods[attribute] = value
+                    else:
+                        methods.pop(attribute, None)
+            for attribute, method in methods.items():
+                setattr(cls, attribute, decorator(method))
+            return cls
+        return decorate
+    
+    def register_collector(self, name, collector):
+        """Have collector() called at export time; it yields (metric, type, help, labels, value)
+
+        Registering again under the same name replaces the earlier collector.
+        """
+        with self._lock:
+            self._collectors[name] = collector
+    
+    def summary(self, name):
+        """Get one row per label set of a latency histogram, slowest total time first"""
+        with self._lock:
+            rows = [
+                {
+                    **dict(labels),
+                    "calls": histogram.count,
+                    "total_ms": histogram.sum * 1000,
+                    "mean_ms": histogram.sum / histogram.count * 1000,
+                    "p50_ms": histogram.quantile(0.5) * 1000,
+                    "p95_ms": histogram.quantile(0.95) * 1000,
+                    "max_ms": histogram.max * 1000
+                }
+                for (metric, labels), histogram in self._histograms.items()
+                if metric == name and histogram.count
+            ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+    
+    def counters(self, name):
+        """Get {label set: value} for a counter"""
+        with self._lock:
+            return {labels: value for (metric, labels), value in self._counters.items() if metric == name}
+    
+    def render(self):
+        """Export every metric in the Prometheus text format"""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.buckets, h.count, h.sum) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+            help_texts = dict(self._help)
+            collectors = list(self._collectors.values())
+        
+        # Metric name -> (type, help, [(suffix, labels, value)])
+        families = {}
+        
+        def family(name, kind, help_text=None):
+            kind, help_text = help_texts.get(name, (kind, help_text or name.replace("_", " ")))
+            return families.setdefault(name, (kind, help_text, []))[2]
+        
+        for (name, labels), (counts, buckets, count, total) in sorted(histograms.items()):
+            samples = family(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", labels + (("le", bound),), cumulative))
+            samples.append(("_bucket", labels + (("le", "+Inf"),), count))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        
+        for (name, labels), value in sorted(counters.items()):
+            family(name, "counter").append(("", labels, value))
+        
+        for collector in collectors:
+            try:
+                for name, kind, help_text, labels, value in collector():
+                    family(name, kind, help_text).append(("", tuple(sorted(labels.items())), value))
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+    
+    def write(self, path):
+        """Write the export to a file, replacing it atomically so scrapers never read half of it"""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as export:
+            export.write(self.render())
+        os.replace(temporary, path)
+
+registry = MetricsRegistry()
+timed = registry.timed
+instrumented = registry.instrumented
+instrument_methods = registry.instrument_methods
+
+registry.describe("db_call_seconds", "histogram", "Time spent in each database method")
+registry.describe("db_call_errors_total", "counter", "Database method calls that raised")
+registry.describe("page_render_seconds", "histogram", "Time spent rendering each page")
+registry.describe("page_render_errors_total", "counter", "Page renders that raised")
+registry.describe("sheets_rows_read_total", "counter", "Worksheet rows downloaded")
+registry.describe("sheets_rows_written_total", "counter", "Worksheet rows appended")
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+def start_exporters():
+    """Start the configured Prometheus exports once per process: a text file, a /metrics endpoint, or both"""
+    global _exporters_started
+    
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    
+    if config.METRICS_FILE:
+        def export_forever():
+            while True:
+                try:
+                    registry.write(config.METRICS_FILE)
+                except Exception as e:
+                    print(f"Error writing metrics: {e}")
+                time.sleep(config.METRICS_EXPORT_SECONDS)
+        threading.Thread(target=export_forever, name="metrics-file", daemon=True).start()
+    
+    if config.METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer(("", config.METRICS_PORT), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        except OSError as e:
+            print(f"Error starting metrics endpoint: {e}")
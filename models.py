@@ -1,34 +1,104 @@
 from dataclasses import dataclass
-from datetime import datetime, date
+from datetime import datetime, date, time
+from functools import lru_cache
 from typing import List, Dict, Optional
 
-@dataclass
+# Parsed values are shared, so a million appointments hold only a few hundred date objects
+_date_from_string = lru_cache(maxsize=8192)(date.fromisoformat)
+
+@lru_cache(maxsize=1024)
+def _time_from_string(text):
+    try:
+        return time.fromisoformat(text)
+    except ValueError:
+        # Hand-edited cells may drop the leading zero, e.g. 9:00
+        return datetime.strptime(text, "%H:%M").time()
+
+def parse_date(value) -> Optional[date]:
+    """Parse a YYYY-MM-DD date, passing date objects through; None if it can't be parsed"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return _date_from_string(str(value).strip())
+    except ValueError:
+        return None
+
+def parse_time(value) -> Optional[time]:
+    """Parse an HH:MM time, passing time objects through; None if it can't be parsed"""
+    if isinstance(value, time):
+        return value
+    try:
+        return _time_from_string(str(value).strip())
+    except ValueError:
+        return None
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Parse a YYYY-MM-DD HH:MM:SS timestamp, passing datetime objects through; None if it can't be parsed"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+def format_date(value: Optional[date]) -> str:
+    """Format a date the way it is stored, YYYY-MM-DD"""
+    return value.strftime("%Y-%m-%d") if value else ""
+
+def format_time(value: Optional[time]) -> str:
+    """Format a time the way it is stored, HH:MM"""
+    return value.strftime("%H:%M") if value else ""
+
+def format_timestamp(value: Optional[datetime]) -> str:
+    """Format a timestamp the way it is stored, YYYY-MM-DD HH:MM:SS"""
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+def _text(value) -> str:
+    """Stored cells may come back as numbers or None; model text fields are always strings"""
+    return "" if value is None else str(value)
+
+@dataclass(frozen=True, slots=True)
 class Patient:
     """Patient data model"""
     id: str = ""
     name: str = ""
     email: str = ""
     phone: str = ""
-    dob: str = ""
+    dob: Optional[date] = None
     address: str = ""
     medical_history: str = ""
-    registered_date: str = ""
+    registered_date: Optional[datetime] = None
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'Patient':
         """Create a Patient object from a dictionary"""
         return cls(
-            id=data.get("PatientID", ""),
-            name=data.get("Name", ""),
-            email=data.get("Email", ""),
-            phone=data.get("Phone", ""),
-            dob=data.get("DateOfBirth", ""),
-            address=data.get("Address", ""),
-            medical_history=data.get("MedicalHistory", ""),
-            registered_date=data.get("RegisteredDate", "")
+            id=_text(data.get("PatientID")),
+            name=_text(data.get("Name")),
+            email=_text(data.get("Email")),
+            phone=_text(data.get("Phone")),
+            dob=parse_date(data.get("DateOfBirth")),
+            address=_text(data.get("Address")),
+            medical_history=_text(data.get("MedicalHistory")),
+            registered_date=parse_timestamp(data.get("RegisteredDate"))
         )
+    
+    def to_dict(self) -> Dict:
+        """Convert to a dictionary keyed by the Patients columns"""
+        return {
+            "PatientID": self.id,
+            "Name": self.name,
+            "Email": self.email,
+            "Phone": self.phone,
+            "DateOfBirth": format_date(self.dob),
+            "Address": self.address,
+            "MedicalHistory": self.medical_history,
+            "RegisteredDate": format_timestamp(self.registered_date)
+        }
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Doctor:
     """Doctor data model"""
     id: str = ""
@@ -42,28 +112,40 @@ class Doctor:
     def from_dict(cls, data: Dict) -> 'Doctor':
         """Create a Doctor object from a dictionary"""
         return cls(
-            id=data.get("DoctorID", ""),
-            name=data.get("Name", ""),
-            specialty=data.get("Specialty", ""),
-            email=data.get("Email", ""),
-            phone=data.get("Phone", ""),
-            schedule=data.get("Schedule", "")
+            id=_text(data.get("DoctorID")),
+            name=_text(data.get("Name")),
+            specialty=_text(data.get("Specialty")),
+            email=_text(data.get("Email")),
+            phone=_text(data.get("Phone")),
+            schedule=_text(data.get("Schedule"))
         )
+    
+    def to_dict(self) -> Dict:
+        """Convert to a dictionary keyed by the Doctors columns"""
+        return {
+            "DoctorID": self.id,
+            "Name": self.name,
+            "Specialty": self.specialty,
+            "Email": self.email,
+            "Phone": self.phone,
+            "Schedule": self.schedule
+        }
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Appointment:
     """Appointment data model"""
     id: str = ""
     patient_id: str = ""
     doctor_id: str = ""
-    date: str = ""
-    time: str = ""
+    date: Optional[date] = None
+    time: Optional[time] = None
     status: str = "Scheduled"
     notes: str = ""
-    created_at: str = ""
+    created_at: Optional[datetime] = None
     
     # Additional fields for display purposes
     patient_name: str = ""
+    patient_phone: str = ""
     doctor_name: str = ""
     specialty: str = ""
     
@@ -71,15 +153,47 @@ class Appointment:
     def from_dict(cls, data: Dict) -> 'Appointment':
         """Create an Appointment object from a dictionary"""
         return cls(
-            id=data.get("AppointmentID", ""),
-            patient_id=data.get("PatientID", ""),
-            doctor_id=data.get("DoctorID", ""),
-            date=data.get("Date", ""),
-            time=data.get("Time", ""),
-            status=data.get("Status", "Scheduled"),
-            notes=data.get("Notes", ""),
-            created_at=data.get("CreatedAt", ""),
-            patient_name=data.get("PatientName", ""),
-            doctor_name=data.get("DoctorName", ""),
-            specialty=data.get("Specialty", "")
-        )
\ No newline at end of file
+            id=_text(data.get("AppointmentID")),
+            patient_id=_text(data.get("PatientID")),
+            doctor_id=_text(data.get("DoctorID")),
+            date=parse_date(data.get("Date")),
+            time=parse_time(data.get("Time")),
+            status=_text(data.get("Status", "Scheduled")),
+            notes=_text(data.get("Notes")),
+            created_at=parse_timestamp(data.get("CreatedAt")),
+            patient_name=_text(data.get("PatientName")),
+            patient_phone=_text(data.get("PatientPhone")),
+            doctor_name=_text(data.get("DoctorName")),
+            specialty=_text(data.get("Specialty"))
+        )
+    
+    def to_dict(self) -> Dict:
+        """Convert to a dictionary keyed by the Appointments columns, without the display fields"""
+        return {
+            "AppointmentID": self.id,
+            "PatientID": self.patient_id,
+            "DoctorID": self.doctor_id,
+            "Date": format_date(self.date),
+            "Time": format_time(self.time),
+            "Status": self.status,
+            "Notes": self.notes,
+            "CreatedAt": format_timestamp(self.created_at)
+        }
+
+@dataclass(frozen=True, slots=True)
+class Slot:
+    """An open appointment slot of a doctor"""
+    date: date
+    time: time
+    doctor_id: str
+    doctor_name: str = ""
+    specialty: str = ""
+
+@dataclass(frozen=True, slots=True)
+class Page:
+    """One page of a listing, with the cursor that fetches the next one"""
+    items: tuple = ()
+    # Pass back to get the following page; None on the last page
+    next_cursor: Optional[int] = None
+    # Records matching the listing's filters across every page
+    total: int = 0
@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+import gspread
+from gspread.exceptions import APIError
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+from urllib3.exceptions import NewConnectionError
+import config
+
+# Statuses worth retrying: timeouts, quota exhaustion and server errors
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+# Statuses meaning the request was turned away without being applied, so even a write can be sent again
+REJECTED_STATUSES = {429}
+
+def _never_sent(error):
+    """Whether a request failed while connecting, before the server could have received it"""
+    if isinstance(error, ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+class TokenBucket:
+    """Lets requests through at a steady rate, with bursts of up to capacity after idle spells"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Take one token, sleeping until one is available; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class SingleFlight:
+    """Runs identical concurrent calls once and hands every caller the same result"""
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key, function):
+        """Call function(), or wait for the call already running under key; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+        
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+        
+        try:
+            call["result"] = function()
+            return call["result"], False
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+class RateLimitedClient(gspread.Client):
+    """gspread client that paces requests to the Sheets quota, retries throttled ones and coalesces reads
+
+    Every request takes a token from a bucket refilled at
+    SHEETS_REQUESTS_PER_MINUTE. Reads failing with 429, a timeout or a server
+    error are retried up to SHEETS_MAX_RETRIES times with exponential backoff
+    and full jitter, or after the server's Retry-After if it sends one. Writes
+    such as appends may have been applied before a timeout or server error,
+    and sending them again would duplicate rows, so they are only retried on
+    429 or when the connection couldn't be opened.
+    Identical GET requests made while one is in flight share its response.
+    Pass it to gspread.authorize as client_factory.
+    """
+    
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session)
+        self.limiter = TokenBucket(config.SHEETS_REQUESTS_PER_MINUTE / 60, config.SHEETS_REQUEST_BURST)
+        self.max_retries = config.SHEETS_MAX_RETRIES
+        self._reads = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "throttled": 0,
+            "retries": 0,
+            "failures": 0,
+            "coalesced": 0,
+            "limiter_wait_seconds": 0.0,
+            "backoff_seconds": 0.0
+        }
+    
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+    
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        def send():
+            return self._send_with_retries(method, endpoint, params, data, json, files, headers)
+        
+        if method != "get":
+            return send()
+        
+        key = (endpoint, repr(sorted((params or {}).items())))
+        response, shared = self._reads.do(key, send)
+        if shared:
+            self._count("coalesced")
+        return response
+    
+    def _send_with_retries(self, method, endpoint, params, data, json, files, headers):
+        """Send one request through the limiter, retrying throttled and failed attempts"""
+        # Only reads can be repeated whenever they fail; a write is retried only if it can't have been applied
+        idempotent = method == "get"
+        attempt = 0
+        while True:
+            self._count("limiter_wait_seconds", self.limiter.acquire())
+            self._count("requests")
+            try:
+                return super().request(
+                    method, endpoint, params=params, data=data, json=json, files=files, headers=headers
+                )
+            except APIError as e:
+                status = e.response.status_code
+                if status == 429:
+                    self._count("throttled")
+                retryable = status in (RETRY_STATUSES if idempotent else REJECTED_STATUSES)
+                if not retryable or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                retry_after = e.response.headers.get("Retry-After")
+            except (ConnectionError, Timeout) as e:
+                if not (idempotent or _never_sent(e)) or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                retry_after = None
+            
+            delay = self._backoff(attempt, retry_after)
+            self._count("retries")
+            self._count("backoff_seconds", delay)
+            time.sleep(delay)
+            attempt += 1
+    
+    @staticmethod
+    def _backoff(attempt, retry_after=None):
+        """Seconds to wait before a retry: the server's Retry-After, or a random share of 2^attempt"""
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, min(2 ** attempt, 64))
+    
+    def stats(self):
+        """Get counters of requests sent, throttled, retried, failed and coalesced, and time spent waiting"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["limiter_wait_seconds"] = round(stats["limiter_wait_seconds"], 3)
+        stats["backoff_seconds"] = round(stats["backoff_seconds"], 3)
+        return stats
@@ -0,0 +1,323 @@
+import heapq
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from itertools import islice
+import numpy as np
+from availability import booked_mask, free_times
+from models import Patient, Doctor, Appointment, Slot, Page, parse_date
+import config
+
+# Columns of each table, in storage order
+TABLE_COLUMNS = {
+    "Patients": [
+        "PatientID", "Name", "Email", "Phone", "DateOfBirth",
+        "Address", "MedicalHistory", "RegisteredDate"
+    ],
+    "Doctors": [
+        "DoctorID", "Name", "Specialty", "Email", "Phone", "Schedule"
+    ],
+    "Appointments": [
+        "AppointmentID", "PatientID", "DoctorID", "Date", "Time",
+        "Status", "Notes", "CreatedAt"
+    ]
+}
+
+# Model attributes each table's text search matches
+SEARCH_FIELDS = {
+    "Patients": ["name", "email", "id"],
+    "Doctors": ["name", "email", "specialty", "id"]
+}
+
+# Appointment display fields filled in from other tables: field -> (table, appointment key, joined attribute)
+JOINED_FIELDS = {
+    "patient_name": ("Patients", "patient_id", "name"),
+    "patient_phone": ("Patients", "patient_id", "phone"),
+    "doctor_name": ("Doctors", "doctor_id", "name"),
+    "specialty": ("Doctors", "doctor_id", "specialty")
+}
+
+# Model each table's records are returned as
+TABLE_MODELS = {
+    "Patients": Patient,
+    "Doctors": Doctor,
+    "Appointments": Appointment
+}
+
+class Repository(ABC):
+    """Storage interface implemented by every database backend
+
+    Write methods return a (success, result) tuple where result is the new ID
+    or an error message. Read methods return the immutable Patient, Doctor and
+    Appointment models, with dates and times already parsed, and an empty
+    result on errors.
+    """
+    
+    # Old appointments moved out of the main table and read back by get_appointments; None if not archiving
+    archive = None
+    
+    @property
+    def connected(self):
+        """Whether the backend is ready to serve requests"""
+        return True
+    
+    @abstractmethod
+    def add_patient(self, patient_data):
+        """Add a new patient to the database"""
+    
+    @abstractmethod
+    def bulk_add_patients(self, patients):
+        """Add many patients with one append request; returns the new IDs, None for duplicate emails"""
+    
+    @abstractmethod
+    def get_all_patients(self):
+        """Get all patients from the database"""
+    
+    @abstractmethod
+    def list_patients(self, search="", doctor_id=None, cursor=None, page_size=50):
+        """Get one Page of patients in the order they were added, or best match first when searching
+        
+        search keeps patients whose name, email or ID match every word of it,
+        allowing prefixes and typos (see indexes.TextIndex), and doctor_id
+        those with an appointment with that doctor. cursor is the next_cursor
+        of the previous page, None for the first one.
+        """
+    
+    @abstractmethod
+    def get_patient_by_id(self, patient_id):
+        """Get a patient by ID"""
+    
+    @abstractmethod
+    def get_patients_by_ids(self, patient_ids):
+        """Get the patients with the given IDs, in ID order; unknown IDs are left out"""
+    
+    @abstractmethod
+    def get_patient_by_email(self, email):
+        """Get a patient by email address"""
+    
+    @abstractmethod
+    def add_doctor(self, doctor_data):
+        """Add a new doctor to the database"""
+    
+    @abstractmethod
+    def bulk_add_doctors(self, doctors):
+        """Add many doctors with one append request; returns the new IDs, None for duplicate emails"""
+    
+    @abstractmethod
+    def get_all_doctors(self):
+        """Get all doctors from the database"""
+    
+    @abstractmethod
+    def list_doctors(self, search="", cursor=None, page_size=50):
+        """Get one Page of doctors in the order they were added, like list_patients
+        
+        search matches the doctors' name, email, specialty and ID.
+        """
+    
+    @abstractmethod
+    def get_doctor_by_id(self, doctor_id):
+        """Get a doctor by ID"""
+    
+    @abstractmethod
+    def get_doctor_by_email(self, email):
+        """Get a doctor by email address"""
+    
+    @abstractmethod
+    def get_doctors_by_specialty(self, specialty):
+        """Get doctors by specialty"""
+    
+    @abstractmethod
+    def book_appointment(self, appointment_data):
+        """Book a new appointment"""
+    
+    @abstractmethod
+    def bulk_add_appointments(self, appointments):
+        """Add many appointments with one append request; returns the new IDs, None for slots already booked
+
+        Unlike book_appointment, each appointment may carry its own status and
+        created_at, so historical data can be loaded as it was.
+        """
+    
+    @abstractmethod
+    def get_all_appointments(self):
+        """Get all appointments as stored, without patient or doctor details"""
+    
+    @abstractmethod
+    def get_appointments(self, doctor_id=None, patient_id=None, start=None, end=None, status=None, fields=None):
+        """Get appointments matching every given filter, sorted by date and time
+        
+        start and end are inclusive dates (date objects or YYYY-MM-DD strings)
+        and status is one status or a collection of them. fields names the
+        JOINED_FIELDS to fill in, by default all of them; the others are left
+        empty, and tables none of them come from aren't read at all.
+        Archived appointments are included.
+        """
+    
+    def appointment_columns(self):
+        """Get the ID, doctor ID, date and status of every appointment, archived ones included, as arrays
+        
+        Dates are datetime64[D], NaT where missing; the rest are strings.
+        Meant for statistics, which don't need a model per appointment.
+        """
+        return self._with_archived(self._record_columns(self.get_all_appointments()))
+    
+    @staticmethod
+    def _record_columns(appointments):
+        """Get the appointment_columns arrays of some Appointment models"""
+        return {
+            "id": np.array([appt.id for appt in appointments], dtype=object),
+            "doctor_id": np.array([appt.doctor_id for appt in appointments], dtype=object),
+            "date": np.array([appt.date for appt in appointments], dtype="datetime64[D]"),
+            "status": np.array([appt.status for appt in appointments], dtype=object)
+        }
+    
+    def _with_archived(self, columns):
+        """Put the archived appointments' columns before those of the stored ones"""
+        if self.archive is None:
+            return columns
+        archived = self.archive.columns()
+        return {name: np.concatenate([archived[name], values]) for name, values in columns.items()}
+    
+    def get_patient_appointments(self, patient_id, fields=None):
+        """Get all appointments for a specific patient"""
+        return self.get_appointments(patient_id=patient_id, fields=fields)
+    
+    def get_doctor_appointments(self, doctor_id, date=None, fields=None):
+        """Get all appointments for a specific doctor, optionally filtered by date"""
+        return self.get_appointments(doctor_id=doctor_id, start=date, end=date, fields=fields)
+    
+    def get_available_slots(self, doctor_id, dates):
+        """Get {date: free times} for a doctor over several dates (date objects or YYYY-MM-DD strings)"""
+        dates = [parse_date(day) for day in dates]
+        if not dates:
+            return {}
+        
+        try:
+            masks = self._booked_masks([doctor_id], dates)
+        except Exception as e:
+            print(f"Error getting available slots: {e}")
+            return {}
+        return {day: free_times(masks.get((doctor_id, day), 0)) for day in dates}
+    
+    def find_first_available(self, specialty, count=5, days=14, now=None):
+        """Get the earliest open slots across every doctor of a specialty
+        
+        Returns up to count Slots in time order. Slots earlier today than now
+        are skipped.
+        """
+        doctors = {doctor.id: doctor for doctor in self.get_doctors_by_specialty(specialty)}
+        if not doctors or days < 1:
+            return []
+        
+        now = now or datetime.now()
+        dates = [now.date() + timedelta(days=offset) for offset in range(days)]
+        today, current_time = dates[0], now.time()
+        
+        try:
+            masks = self._booked_masks(doctors, dates)
+        except Exception as e:
+            print(f"Error finding available slots: {e}")
+            return []
+        
+        def open_slots(doctor_id):
+            # Already in time order, so heapq.merge only has to compare the heads
+            for day in dates:
+                for time in free_times(masks.get((doctor_id, day), 0)):
+                    if day != today or time > current_time:
+                        yield day, time, doctor_id
+        
+        merged = heapq.merge(*(open_slots(doctor_id) for doctor_id in doctors))
+        return [
+            Slot(day, time, doctor_id, doctors[doctor_id].name, doctors[doctor_id].specialty)
+            for day, time, doctor_id in islice(merged, count)
+        ]
+    
+    def _booked_masks(self, doctor_ids, dates):
+        """Get {(doctor ID, date): mask of booked slots} from one snapshot of live appointments"""
+        doctor_ids = set(doctor_ids)
+        live_statuses = [status for status in config.APPOINTMENT_STATUSES if status != "Cancelled"]
+        # A single doctor can use the per-doctor query; otherwise read the date range once
+        appointments = self.get_appointments(
+            doctor_id=next(iter(doctor_ids)) if len(doctor_ids) == 1 else None,
+            start=min(dates), end=max(dates), status=live_statuses, fields=()
+        )
+        
+        booked = {}
+        for appt in appointments:
+            if appt.doctor_id in doctor_ids:
+                booked.setdefault((appt.doctor_id, appt.date), []).append(appt.time)
+        return {key: booked_mask(times) for key, times in booked.items()}
+    
+    @staticmethod
+    def _joined_fields(fields):
+        """Normalize a get_appointments projection to {table: [(field, appointment key, joined attribute)]}"""
+        if fields is None:
+            fields = JOINED_FIELDS
+        joins = {}
+        for field in fields:
+            if field not in JOINED_FIELDS:
+                raise ValueError(f"Unknown appointment field: {field}")
+            table, key, attribute = JOINED_FIELDS[field]
+            joins.setdefault(table, []).append((field, key, attribute))
+        return joins
+    
+    @staticmethod
+    def _appointment_filters(start, end, status):
+        """Normalize get_appointments filters to (start date, end date, set of statuses or None)"""
+        if status is None:
+            statuses = None
+        elif isinstance(status, str):
+            statuses = {status}
+        else:
+            statuses = set(status)
+        start = parse_date(start) if start else None
+        end = parse_date(end) if end else None
+        return start, end, statuses
+    
+    @abstractmethod
+    def update_appointment_status(self, appointment_id, new_status):
+        """Update the status of an appointment"""
+    
+    @abstractmethod
+    def update_appointment_statuses(self, statuses):
+        """Update the status of several appointments, given as {appointment ID: new status}, in one request"""
+    
+    def archive_appointments(self, before=None):
+        """Move finished appointments dated before a cutoff, by default config.ARCHIVE_AFTER_DAYS ago, to the archive"""
+        return False, "This backend doesn't archive appointments"
+    
+    @abstractmethod
+    def data_version(self, tables=None):
+        """Get a value that changes whenever stored data may have changed, for keying derived caches
+        
+        tables names the tables the cache is derived from; backends that
+        can tell which tables changed ignore writes to the others.
+        """
+
+def create_database(backend=None):
+    """Create the database backend selected by config.DATABASE_BACKEND"""
+    backend = backend or config.DATABASE_BACKEND
+    
+    # Backends are imported lazily so each one only needs its own dependencies
+    if backend == "sheets":
+        from database import GoogleSheetsDatabase
+        return GoogleSheetsDatabase()
+    if backend == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(config.SQLITE_DATABASE_PATH)
+    
+    raise ValueError(f"Unknown database backend: {backend}")
+
+_shared_database = None
+_shared_database_lock = threading.Lock()
+
+def get_database():
+    """Get the database shared by every session in this process, creating it on first use"""
+    global _shared_database
+    
+    if _shared_database is None or not _shared_database.connected:
+        with _shared_database_lock:
+            # Check again now that we hold the lock; a failed connection is retried
+            if _shared_database is None or not _shared_database.connected:
+                _shared_database = create_database()
+    return _shared_database
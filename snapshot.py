@@ -0,0 +1,157 @@
+import atexit
+import json
+import os
+import threading
+import time
+from dataclasses import fields
+from datetime import date
+import numpy as np
+from columnar import EPOCH_ORDINAL, NO_DAY, NO_MINUTE, ColumnarAppointments, _minute_to_time
+from repository import TABLE_COLUMNS, TABLE_MODELS
+import config
+
+# Bumped whenever the file layout changes, so older snapshots are ignored rather than misread
+SNAPSHOT_FORMAT = 1
+
+# Separates the values of a text column in its UTF-8 buffer; cells never legitimately contain it
+_SEPARATOR = "\x00"
+
+# Columns whose model fields are parsed into dates, times or timestamps; the rest are text
+COLUMN_KINDS = {
+    "DateOfBirth": "date",
+    "RegisteredDate": "timestamp",
+    "Date": "date",
+    "Time": "time",
+    "CreatedAt": "timestamp"
+}
+
+def _table_fields(table):
+    """Get (model attribute, storage kind) for each column of a table, in column order"""
+    # Models declare their stored fields first, in column order
+    model_fields = fields(TABLE_MODELS[table])
+    return [
+        (field.name, COLUMN_KINDS.get(column, "text"))
+        for field, column in zip(model_fields, TABLE_COLUMNS[table])
+    ]
+
+def _encode(kind, values):
+    """Pack one column of model values into a NumPy array"""
+    if kind == "date":
+        return np.array([ColumnarAppointments._day(value) for value in values], dtype=np.int32)
+    if kind == "time":
+        return np.array([ColumnarAppointments._minute(value) for value in values], dtype=np.int16)
+    if kind == "timestamp":
+        return np.array([ColumnarAppointments._timestamp(value) for value in values], dtype=np.int64)
+    text = _SEPARATOR.join(value.replace(_SEPARATOR, "") for value in values)
+    return np.frombuffer(text.encode(), dtype=np.uint8)
+
+def _shared(codes, missing, convert):
+    """Convert repeated codes to shared Python objects, converting each distinct one once"""
+    if not len(codes):
+        return []
+    distinct, inverse = np.unique(codes, return_inverse=True)
+    objects = [None if code == missing else convert(code) for code in distinct.tolist()]
+    return [objects[index] for index in inverse.tolist()]
+
+def _decode(kind, array, count):
+    """Unpack one column saved by _encode into a list of model values"""
+    if kind == "date":
+        return _shared(array, NO_DAY, lambda day: date.fromordinal(day + EPOCH_ORDINAL))
+    if kind == "time":
+        return _shared(array, NO_MINUTE, _minute_to_time)
+    if kind == "timestamp":
+        # Missing timestamps are stored as the smallest int64, which is NumPy's NaT and converts to None
+        return array.view("datetime64[s]").tolist()
+    if not count:
+        return []
+    return array.tobytes().decode().split(_SEPARATOR)
+
+class SnapshotStore:
+    """Compact local copy of the cached worksheets, so a new process can serve before downloading them
+
+    Each table is one uncompressed .npz file of typed columns: text as a
+    single UTF-8 buffer, dates, times and timestamps as integers. Loading
+    one is a few NumPy reads and splits rather than a download and a parse
+    of every cell. The file is stamped with the format, the spreadsheet and
+    the columns it was saved for, and when; anything that doesn't match, or
+    is older than max_age_hours, is ignored.
+    """
+    
+    def __init__(self, directory, source="", max_age_hours=None):
+        self.directory = directory
+        # Identifies the spreadsheet, so a snapshot of another one is never served
+        self.source = source
+        if max_age_hours is None:
+            max_age_hours = config.SNAPSHOT_MAX_AGE_HOURS
+        self.max_age_seconds = max_age_hours * 3600
+        self._lock = threading.Lock()
+        self._saver = None
+    
+    def _path(self, table):
+        return os.path.join(self.directory, f"{table}.npz")
+    
+    def _stamp(self, table, count):
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "source": self.source,
+            "columns": TABLE_COLUMNS[table],
+            "rows": count,
+            "saved_at": time.time()
+        }
+    
+    def save(self, table, records):
+        """Write the records of a table, replacing its previous snapshot in one step"""
+        records = list(records)
+        arrays = {
+            name: _encode(kind, [getattr(record, name) for record in records])
+            for name, kind in _table_fields(table)
+        }
+        arrays["stamp"] = np.array(json.dumps(self._stamp(table, len(records))))
+        
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            # Readers only ever see a complete file, the old one or the new one
+            temporary = self._path(table) + ".tmp"
+            with open(temporary, "wb") as output:
+                np.savez(output, **arrays)
+            os.replace(temporary, self._path(table))
+    
+    def load(self, table):
+        """Get the records saved for a table, or None if there is no usable snapshot"""
+        path = self._path(table)
+        if not os.path.exists(path):
+            return None
+        
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                stamp = json.loads(str(saved["stamp"]))
+                expected = self._stamp(table, stamp.get("rows"))
+                if any(stamp.get(key) != expected[key] for key in ("format", "source", "columns")):
+                    return None
+                if time.time() - stamp["saved_at"] > self.max_age_seconds:
+                    return None
+                
+                columns = [_decode(kind, saved[name], stamp["rows"]) for name, kind in _table_fields(table)]
+            if any(len(column) != stamp["rows"] for column in columns):
+                return None
+            return [TABLE_MODELS[table](*values) for values in zip(*columns)]
+        except Exception as e:
+            print(f"Error loading snapshot of {table}: {e}")
+            return None
+    
+    def start(self, save_all, interval_seconds=None):
+        """Call save_all every interval_seconds in the background, and once more when the process exits"""
+        if interval_seconds is None:
+            interval_seconds = config.SNAPSHOT_INTERVAL_SECONDS
+        
+        def save_forever():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    save_all()
+                except Exception as e:
+                    print(f"Error saving snapshot: {e}")
+        
+        atexit.register(save_all)
+        self._saver = threading.Thread(target=save_forever, name="snapshot", daemon=True)
+        self._saver.start()
@@ -0,0 +1,559 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+from datetime import datetime
+from indexes import TextIndex
+from models import Patient, Doctor, Appointment, Page, parse_date, parse_time, format_date, format_time
+from repository import Repository, TABLE_COLUMNS, SEARCH_FIELDS
+from metrics import instrument_methods
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Patients (
+    PatientID TEXT PRIMARY KEY,
+    Name TEXT NOT NULL,
+    Email TEXT NOT NULL,
+    Phone TEXT,
+    DateOfBirth TEXT,
+    Address TEXT,
+    MedicalHistory TEXT,
+    RegisteredDate TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_email ON Patients (Email);
+
+CREATE TABLE IF NOT EXISTS Doctors (
+    DoctorID TEXT PRIMARY KEY,
+    Name TEXT NOT NULL,
+    Specialty TEXT NOT NULL,
+    Email TEXT NOT NULL,
+    Phone TEXT,
+    Schedule TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_doctors_email ON Doctors (Email);
+CREATE INDEX IF NOT EXISTS idx_doctors_specialty ON Doctors (Specialty);
+
+CREATE TABLE IF NOT EXISTS Appointments (
+    AppointmentID TEXT PRIMARY KEY,
+    PatientID TEXT NOT NULL,
+    DoctorID TEXT NOT NULL,
+    Date TEXT NOT NULL,
+    Time TEXT NOT NULL,
+    Status TEXT NOT NULL,
+    Notes TEXT,
+    CreatedAt TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON Appointments (PatientID, Date);
+CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date ON Appointments (DoctorID, Date, Time);
+CREATE INDEX IF NOT EXISTS idx_appointments_date ON Appointments (Date, Time);
+-- A slot can hold at most one live appointment, whichever connection writes it
+CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_live_slot
+    ON Appointments (DoctorID, Date, Time) WHERE Status != 'Cancelled';
+
+-- Bumped by a trigger on every write so readers can cheaply tell whether anything changed
+CREATE TABLE IF NOT EXISTS DataVersion (Version INTEGER NOT NULL);
+INSERT INTO DataVersion SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM DataVersion);
+""" + "".join(
+    f"CREATE TRIGGER IF NOT EXISTS bump_version_{table}_{event.lower()} AFTER {event} ON {table} "
+    f"BEGIN UPDATE DataVersion SET Version = Version + 1; END;\n"
+    for table in TABLE_COLUMNS for event in ("INSERT", "UPDATE", "DELETE")
+)
+
+# Table alias used in get_appointments joins
+JOIN_ALIASES = {"Patients": "p", "Doctors": "d"}
+
+@instrument_methods("db_call_seconds", backend="sqlite")
+class SQLiteDatabase(Repository):
+    """Local SQLite backend with the same API as GoogleSheetsDatabase"""
+    
+    def __init__(self, path):
+        self.path = path
+        # Each thread gets its own connection; WAL lets readers run alongside a writer
+        self._local = threading.local()
+        # In-memory search indexes keyed by rowid: table -> (TextIndex, last rowid indexed)
+        self._search_indexes = {}
+        self._search_lock = threading.Lock()
+        
+        # executescript() manages its own transaction
+        self._connection().executescript(SCHEMA)
+    
+    def _connection(self):
+        """Get the connection of the current thread, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode so transactions are started explicitly in _transaction()
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def _transaction(self):
+        """Run a block in a write transaction that holds the database lock from the start"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+    
+    def _query(self, model, sql, params=()):
+        """Run a read query and return the rows as model objects"""
+        return [model.from_dict(dict(row)) for row in self._connection().execute(sql, params)]
+    
+    def _query_one(self, model, sql, params=()):
+        """Run a read query and return the first row as a model object, or None"""
+        row = self._connection().execute(sql, params).fetchone()
+        return model.from_dict(dict(row)) if row else None
+    
+    @staticmethod
+    def _next_id(conn, table, prefix):
+        """Generate the next ID of a table; call inside a write transaction"""
+        id_column = TABLE_COLUMNS[table][0]
+        row = conn.execute(
+            f"SELECT MAX(CAST(SUBSTR({id_column}, 2) AS INTEGER)) FROM {table}"
+        ).fetchone()
+        return f"{prefix}{(row[0] or 0) + 1:04d}"
+    
+    def _bulk_insert(self, table, prefix, rows):
+        """Insert rows whose first column is a placeholder for the ID, skipping known emails
+
+        Returns the new IDs aligned with rows, with None for rows that were skipped.
+        """
+        email_column = TABLE_COLUMNS[table].index("Email")
+        new_ids = [None] * len(rows)
+        
+        with self._transaction() as conn:
+            existing_emails = {row[0] for row in conn.execute(f"SELECT Email FROM {table}")}
+            accepted = []
+            for index, row_data in enumerate(rows):
+                if row_data[email_column] not in existing_emails:
+                    existing_emails.add(row_data[email_column])
+                    accepted.append(index)
+            
+            # Hand out the whole block of IDs at once while holding the write lock
+            first = int(self._next_id(conn, table, prefix)[len(prefix):])
+            for number, index in enumerate(accepted, start=first):
+                rows[index][0] = new_ids[index] = f"{prefix}{number:04d}"
+            
+            columns = TABLE_COLUMNS[table]
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [rows[index] for index in accepted]
+            )
+        return new_ids
+    
+    def _list_page(self, model, table, conditions, params, cursor, page_size):
+        """Get one Page of a table in insertion order, resuming after the rowid in cursor"""
+        where = " AND ".join(conditions) or "1"
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+        # One extra row tells whether there is a next page
+        rows = conn.execute(
+            f"SELECT rowid AS RowID, * FROM {table} WHERE {where} AND rowid > ? ORDER BY rowid LIMIT ?",
+            [*params, cursor or 0, page_size + 1]
+        ).fetchall()
+        items = tuple(model.from_dict(dict(row)) for row in rows[:page_size])
+        next_cursor = rows[page_size - 1]["RowID"] if len(rows) > page_size else None
+        return Page(items, next_cursor, total)
+    
+    def _search_index(self, model, table):
+        """Get the search index of a table, first adding the rows inserted since it was last used
+        
+        Rows are never edited or deleted through this backend, so following
+        the rowid catches up with what every connection has written.
+        """
+        with self._search_lock:
+            index, last_rowid = self._search_indexes.get(table) or (TextIndex(SEARCH_FIELDS[table]), 0)
+            rows = self._connection().execute(
+                f"SELECT rowid AS RowID, * FROM {table} WHERE rowid > ? ORDER BY rowid", (last_rowid,)
+            )
+            for row in rows:
+                index.add(model.from_dict(dict(row)), row["RowID"])
+                last_rowid = row["RowID"]
+            self._search_indexes[table] = (index, last_rowid)
+        return index
+    
+    def _search_page(self, model, table, search, keep, cursor, page_size):
+        """Get one Page of search results, best match first; the cursor is the rank to resume at"""
+        start = cursor or 0
+        rowids, total = self._search_index(model, table).search(search, start, page_size, keep=keep)
+        rows = self._connection().execute(
+            f"SELECT rowid AS RowID, * FROM {table} WHERE rowid IN ({', '.join('?' * len(rowids))})", rowids
+        ).fetchall()
+        by_rowid = {row["RowID"]: model.from_dict(dict(row)) for row in rows}
+        next_cursor = start + len(rowids) if start + len(rowids) < total else None
+        return Page(tuple(by_rowid[rowid] for rowid in rowids if rowid in by_rowid), next_cursor, total)
+    
+    @staticmethod
+    def _insert(conn, table, row_data):
+        """Insert a row given as a list in TABLE_COLUMNS order"""
+        columns = TABLE_COLUMNS[table]
+        conn.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            row_data
+        )
+    
+    def add_patient(self, patient_data):
+        """Add a new patient to the database"""
+        try:
+            with self._transaction() as conn:
+                # Check if patient with same email already exists
+                if conn.execute("SELECT 1 FROM Patients WHERE Email = ?", (patient_data["email"],)).fetchone():
+                    return False, "Patient with this email already exists"
+                
+                new_id = self._next_id(conn, "Patients", "P")
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._insert(conn, "Patients", [
+                    new_id,
+                    patient_data["name"],
+                    patient_data["email"],
+                    patient_data["phone"],
+                    patient_data["dob"],
+                    patient_data["address"],
+                    patient_data["medical_history"],
+                    now
+                ])
+            return True, new_id
+        except Exception as e:
+            return False, f"Error adding patient: {str(e)}"
+    
+    def bulk_add_patients(self, patients):
+        """Add many patients in one transaction; returns the new IDs, None for duplicate emails"""
+        try:
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            rows = [
+                [
+                    None,
+                    patient_data["name"],
+                    patient_data["email"],
+                    patient_data["phone"],
+                    patient_data["dob"],
+                    patient_data["address"],
+                    patient_data["medical_history"],
+                    now
+                ]
+                for patient_data in patients
+            ]
+            return True, self._bulk_insert("Patients", "P", rows)
+        except Exception as e:
+            return False, f"Error adding patients: {str(e)}"
+    
+    def get_all_patients(self):
+        """Get all patients from the database"""
+        try:
+            return self._query(Patient, "SELECT * FROM Patients ORDER BY PatientID")
+        except Exception as e:
+            print(f"Error getting patients: {e}")
+            return []
+    
+    def list_patients(self, search="", doctor_id=None, cursor=None, page_size=50):
+        """Get one Page of patients in the order they were added"""
+        conditions, params = [], []
+        if doctor_id is not None:
+            conditions.append("PatientID IN (SELECT PatientID FROM Appointments WHERE DoctorID = ?)")
+            params.append(doctor_id)
+        
+        try:
+            if search and search.strip():
+                keep = None
+                if doctor_id is not None:
+                    keep = {row[0] for row in self._connection().execute(
+                        f"SELECT rowid FROM Patients WHERE {conditions[0]}", params
+                    )}.__contains__
+                return self._search_page(Patient, "Patients", search, keep, cursor, page_size)
+            return self._list_page(Patient, "Patients", conditions, params, cursor, page_size)
+        except Exception as e:
+            print(f"Error listing patients: {e}")
+            return Page()
+    
+    def get_patient_by_id(self, patient_id):
+        """Get a patient by ID"""
+        try:
+            return self._query_one(Patient, "SELECT * FROM Patients WHERE PatientID = ?", (patient_id,))
+        except Exception as e:
+            print(f"Error getting patient: {e}")
+            return None
+    
+    def get_patients_by_ids(self, patient_ids):
+        """Get the patients with the given IDs, in ID order; unknown IDs are left out"""
+        patient_ids = sorted(set(patient_ids))
+        try:
+            patients = []
+            # Stay under SQLite's limit on query parameters
+            for offset in range(0, len(patient_ids), 500):
+                chunk = patient_ids[offset:offset + 500]
+                patients.extend(self._query(
+                    Patient, f"SELECT * FROM Patients WHERE PatientID IN ({', '.join('?' * len(chunk))})", chunk
+                ))
+            return sorted(patients, key=lambda patient: patient.id)
+        except Exception as e:
+            print(f"Error getting patients: {e}")
+            return []
+    
+    def get_patient_by_email(self, email):
+        """Get a patient by email address"""
+        try:
+            return self._query_one(Patient, "SELECT * FROM Patients WHERE Email = ?", (email,))
+        except Exception as e:
+            print(f"Error getting patient: {e}")
+            return None
+    
+    def add_doctor(self, doctor_data):
+        """Add a new doctor to the database"""
+        try:
+            with self._transaction() as conn:
+                # Check if doctor with same email already exists
+                if conn.execute("SELECT 1 FROM Doctors WHERE Email = ?", (doctor_data["email"],)).fetchone():
+                    return False, "Doctor with this email already exists"
+                
+                new_id = self._next_id(conn, "Doctors", "D")
+                self._insert(conn, "Doctors", [
+                    new_id,
+                    doctor_data["name"],
+                    doctor_data["specialty"],
+                    doctor_data["email"],
+                    doctor_data["phone"],
+                    doctor_data["schedule"]
+                ])
+            return True, new_id
+        except Exception as e:
+            return False, f"Error adding doctor: {str(e)}"
+    
+    def bulk_add_doctors(self, doctors):
+        """Add many doctors in one transaction; returns the new IDs, None for duplicate emails"""
+        try:
+            rows = [
+                [
+                    None,
+                    doctor_data["name"],
+                    doctor_data["specialty"],
+                    doctor_data["email"],
+                    doctor_data["phone"],
+                    doctor_data["schedule"]
+                ]
+                for doctor_data in doctors
+            ]
+            return True, self._bulk_insert("Doctors", "D", rows)
+        except Exception as e:
+            return False, f"Error adding doctors: {str(e)}"
+    
+    def get_all_doctors(self):
+        """Get all doctors from the database"""
+        try:
+            return self._query(Doctor, "SELECT * FROM Doctors ORDER BY DoctorID")
+        except Exception as e:
+            print(f"Error getting doctors: {e}")
+            return []
+    
+    def list_doctors(self, search="", cursor=None, page_size=50):
+        """Get one Page of doctors in the order they were added"""
+        try:
+            if search and search.strip():
+                return self._search_page(Doctor, "Doctors", search, None, cursor, page_size)
+            return self._list_page(Doctor, "Doctors", [], [], cursor, page_size)
+        except Exception as e:
+            print(f"Error listing doctors: {e}")
+            return Page()
+    
+    def get_doctor_by_id(self, doctor_id):
+        """Get a doctor by ID"""
+        try:
+            return self._query_one(Doctor, "SELECT * FROM Doctors WHERE DoctorID = ?", (doctor_id,))
+        except Exception as e:
+            print(f"Error getting doctor: {e}")
+            return None
+    
+    def get_doctor_by_email(self, email):
+        """Get a doctor by email address"""
+        try:
+            return self._query_one(Doctor, "SELECT * FROM Doctors WHERE Email = ?", (email,))
+        except Exception as e:
+            print(f"Error getting doctor: {e}")
+            return None
+    
+    def get_doctors_by_specialty(self, specialty):
+        """Get doctors by specialty"""
+        try:
+            return self._query(Doctor, "SELECT * FROM Doctors WHERE Specialty = ? ORDER BY DoctorID", (specialty,))
+        except Exception as e:
+            print(f"Error getting doctors by specialty: {e}")
+            return []
+    
+    def book_appointment(self, appointment_data):
+        """Book a new appointment"""
+        date = parse_date(appointment_data["date"])
+        time = parse_time(appointment_data["time"])
+        if date is None or time is None:
+            return False, "Invalid appointment date or time"
+        date, time = format_date(date), format_time(time)
+        
+        try:
+            with self._transaction() as conn:
+                # Check if the time slot is available
+                conflict = conn.execute(
+                    "SELECT 1 FROM Appointments "
+                    "WHERE DoctorID = ? AND Date = ? AND Time = ? AND Status != 'Cancelled'",
+                    (appointment_data["doctor_id"], date, time)
+                ).fetchone()
+                if conflict:
+                    return False, "This time slot is already booked"
+                
+                new_id = self._next_id(conn, "Appointments", "A")
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._insert(conn, "Appointments", [
+                    new_id,
+                    appointment_data["patient_id"],
+                    appointment_data["doctor_id"],
+                    date,
+                    time,
+                    "Scheduled",
+                    appointment_data.get("notes", ""),
+                    now
+                ])
+            return True, new_id
+        except Exception as e:
+            return False, f"Error booking appointment: {str(e)}"
+    
+    def bulk_add_appointments(self, appointments):
+        """Add many appointments in one transaction; returns the new IDs, None for slots already booked"""
+        try:
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            columns = TABLE_COLUMNS["Appointments"]
+            insert = (
+                f"INSERT OR IGNORE INTO Appointments ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})"
+            )
+            new_ids = []
+            
+            with self._transaction() as conn:
+                number = int(self._next_id(conn, "Appointments", "A")[1:])
+                for appointment_data in appointments:
+                    new_id = f"A{number:04d}"
+                    # The live-slot unique index turns a double booking into an ignored insert
+                    cursor = conn.execute(insert, [
+                        new_id,
+                        appointment_data["patient_id"],
+                        appointment_data["doctor_id"],
+                        format_date(parse_date(appointment_data["date"])),
+                        format_time(parse_time(appointment_data["time"])),
+                        appointment_data.get("status", "Scheduled"),
+                        appointment_data.get("notes", ""),
+                        appointment_data.get("created_at", now)
+                    ])
+                    if cursor.rowcount:
+                        new_ids.append(new_id)
+                        number += 1
+                    else:
+                        new_ids.append(None)
+            return True, new_ids
+        except Exception as e:
+            return False, f"Error adding appointments: {str(e)}"
+    
+    def get_all_appointments(self):
+        """Get all appointments as stored, without patient or doctor details"""
+        try:
+            return self._query(Appointment, "SELECT * FROM Appointments ORDER BY AppointmentID")
+        except Exception as e:
+            print(f"Error getting appointments: {e}")
+            return []
+    
+    def appointment_columns(self):
+        """Get the ID, doctor ID, date and status of every appointment as arrays, read without building models"""
+        try:
+            rows = self._connection().execute(
+                "SELECT AppointmentID, DoctorID, Date, Status FROM Appointments ORDER BY AppointmentID"
+            ).fetchall()
+        except Exception as e:
+            print(f"Error getting appointment columns: {e}")
+            rows = []
+        ids, doctor_ids, dates, statuses = zip(*rows) if rows else ((), (), (), ())
+        return {
+            "id": np.array(ids, dtype=object),
+            "doctor_id": np.array(doctor_ids, dtype=object),
+            # Stored as YYYY-MM-DD; blank dates become NaT
+            "date": np.array([parse_date(day) for day in dates], dtype="datetime64[D]"),
+            "status": np.array(statuses, dtype=object)
+        }
+    
+    def get_appointments(self, doctor_id=None, patient_id=None, start=None, end=None, status=None, fields=None):
+        """Get appointments matching every given filter, sorted by date and time"""
+        start, end, statuses = self._appointment_filters(start, end, status)
+        joins = self._joined_fields(fields)
+        
+        conditions = []
+        params = []
+        for column, value in (("a.DoctorID", doctor_id), ("a.PatientID", patient_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            conditions.append("a.Date >= ?")
+            params.append(format_date(start))
+        if end is not None:
+            conditions.append("a.Date <= ?")
+            params.append(format_date(end))
+        if statuses is not None:
+            conditions.append(f"a.Status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        
+        # Only the requested columns, and only joins to the tables they come from;
+        # e.g. patient_name is read from p.Name and returned as PatientName
+        columns = ["a.*"] + [
+            f"COALESCE({JOIN_ALIASES[table]}.{attribute.title()}, 'Unknown') AS {field.title().replace('_', '')}"
+            for table, joined in joins.items() for field, _, attribute in joined
+        ]
+        sql = f"SELECT {', '.join(columns)} FROM Appointments a"
+        if "Patients" in joins:
+            sql += " LEFT JOIN Patients p ON p.PatientID = a.PatientID"
+        if "Doctors" in joins:
+            sql += " LEFT JOIN Doctors d ON d.DoctorID = a.DoctorID"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        
+        try:
+            return self._query(Appointment, sql + " ORDER BY a.Date, a.Time", params)
+        except Exception as e:
+            print(f"Error getting appointments: {e}")
+            return []
+    
+    def update_appointment_status(self, appointment_id, new_status):
+        """Update the status of an appointment"""
+        try:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE Appointments SET Status = ? WHERE AppointmentID = ?",
+                    (new_status, appointment_id)
+                )
+            if cursor.rowcount == 0:
+                return False, "Appointment not found"
+            return True, "Appointment status updated successfully"
+        except Exception as e:
+            return False, f"Error updating appointment status: {str(e)}"
+    
+    def update_appointment_statuses(self, statuses):
+        """Update the status of several appointments, given as {appointment ID: new status}, in one request"""
+        try:
+            with self._transaction() as conn:
+                for appointment_id in statuses:
+                    if not conn.execute(
+                        "SELECT 1 FROM Appointments WHERE AppointmentID = ?", (appointment_id,)
+                    ).fetchone():
+                        return False, f"Appointment not found: {appointment_id}"
+                
+                conn.executemany(
+                    "UPDATE Appointments SET Status = ? WHERE AppointmentID = ?",
+                    [(new_status, appointment_id) for appointment_id, new_status in statuses.items()]
+                )
+            return True, f"{len(statuses)} appointment statuses updated successfully"
+        except Exception as e:
+            return False, f"Error updating appointment status: {str(e)}"
+    
+    def data_version(self, tables=None):
+        """Get a counter that changes whenever any table is written, by any connection; tables is ignored"""
+        return self._connection().execute("SELECT Version FROM DataVersion").fetchone()[0]
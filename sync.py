@@ -0,0 +1,196 @@
+import re
+import threading
+from dataclasses import fields
+import numpy as np
+from gspread.utils import rowcol_to_a1
+from columnar import ColumnarAppointments
+from repository import TABLE_COLUMNS, TABLE_MODELS
+from metrics import registry
+import config
+
+# Fields compared over the whole table on a full check, besides the ID
+CHECKED_FIELDS = {"Appointments": ("status",)}
+
+def _column_letter(column):
+    """Get the letter of a 1-based column number, e.g. 6 -> "F" """
+    return re.sub(r"\d", "", rowcol_to_a1(1, column))
+
+class SheetSync:
+    """Refreshes cached worksheets by fetching only what changed since the last sync
+
+    Rows appended since the cache was loaded are read from an open-ended
+    range after the last known row. In-place edits, such as a status changed
+    by another process, are caught by comparing a rotating window of cached
+    rows with the sheet, so each refresh reads new rows plus one window and
+    every row is re-checked once per full rotation. A full rotation of a
+    large table takes many refreshes, so every few refreshes the same request
+    also reads the ID column, and the status column of appointments, for the
+    whole table: a status changed elsewhere is merged, and IDs that no longer
+    line up, in the window or the full check, mean rows were deleted or
+    inserted, and the table is reloaded in full instead.
+    """
+    
+    def __init__(self, db, sample_rows=None, full_check_every=None):
+        self.db = db
+        if sample_rows is None:
+            sample_rows = config.SYNC_SAMPLE_ROWS
+        self.sample_rows = sample_rows
+        if full_check_every is None:
+            full_check_every = config.SYNC_FULL_CHECK_EVERY
+        self.full_check_every = full_check_every
+        # Position of the next sampled window, and refreshes so far, per worksheet
+        self._cursors = {}
+        self._refreshes = {}
+        self._lock = threading.Lock()
+        self._stats = {"syncs": 0, "rows_appended": 0, "rows_updated": 0, "full_checks": 0, "full_reloads": 0}
+    
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+    
+    def _next_window(self, sheet_name, row_count):
+        """Get the [start, end) positions of the cached rows to compare on this sync"""
+        if not self.sample_rows or not row_count:
+            return None
+        with self._lock:
+            start = self._cursors.get(sheet_name, 0)
+            if start >= row_count:
+                start = 0
+            end = min(start + self.sample_rows, row_count)
+            # A window cut short by the last row reaches back instead, so it is always full-sized
+            start = max(0, end - self.sample_rows)
+            self._cursors[sheet_name] = end
+        return start, end
+    
+    def _full_check_due(self, sheet_name):
+        """Count a refresh of a worksheet; whether it is one whose key columns are compared in full"""
+        if not self.full_check_every:
+            return False
+        with self._lock:
+            refreshes = self._refreshes.get(sheet_name, 0) + 1
+            self._refreshes[sheet_name] = refreshes
+        return refreshes % self.full_check_every == 0
+    
+    @staticmethod
+    def _checked_columns(sheet_name):
+        """Get (column letter, field name) of the ID and any CHECKED_FIELDS of a worksheet, ID first"""
+        names = [field.name for field in fields(TABLE_MODELS[sheet_name])]
+        return [
+            (_column_letter(names.index(name) + 1), name)
+            for name in ("id",) + CHECKED_FIELDS.get(sheet_name, ())
+        ]
+    
+    def refresh(self, sheet_name, table):
+        """Merge rows appended or edited since the last sync into a cached table
+
+        Returns False if the table has to be downloaded again in full.
+        """
+        db = self.db
+        # Queued rows are cached but not in the sheet yet, so positions wouldn't line up until they are written
+        if db.writes is not None and db.writes.pending_count(sheet_name):
+            return True
+        
+        worksheet = db._worksheet(sheet_name)
+        last_column = _column_letter(len(TABLE_COLUMNS[sheet_name]))
+        
+        # Appends through this process write to the sheet and the cache in the same order
+        with db._append_lock:
+            row_count = len(table)
+            window = self._next_window(sheet_name, row_count)
+            checked = []
+            if row_count and self._full_check_due(sheet_name):
+                checked = self._checked_columns(sheet_name)
+            ranges = [f"A{row_count + 2}:{last_column}"]
+            if window is not None:
+                ranges.append(f"A{window[0] + 2}:{last_column}{window[1] + 1}")
+            ranges.extend(f"{column}2:{column}{row_count + 1}" for column, _ in checked)
+            
+            # One request for the new rows, the sampled window and any columns checked in full
+            results = worksheet.batch_get(ranges)
+            self._count("syncs")
+            registry.increment("sheets_rows_read_total", sum(len(rows) for rows in results), sheet=sheet_name)
+            
+            if checked:
+                self._count("full_checks")
+                changes = self._check_columns(table, checked, results[-len(checked):])
+                if changes is None:
+                    self._count("full_reloads")
+                    return False
+                for position, changed in changes:
+                    db.cache.update_at(sheet_name, position, changed)
+                self._count("rows_updated", len(changes))
+            
+            if window is not None:
+                changes = self._compare(sheet_name, table, window, results[1])
+                if changes is None:
+                    self._count("full_reloads")
+                    return False
+                for position, changed in changes:
+                    db.cache.update_at(sheet_name, position, changed)
+                self._count("rows_updated", len(changes))
+            
+            # Blank rows are kept, as in a full load, so positions keep matching sheet rows
+            appended = results[0]
+            for row in appended:
+                db.cache.append(sheet_name, db._to_record(sheet_name, row))
+            self._count("rows_appended", len(appended))
+        return True
+    
+    def _compare(self, sheet_name, table, window, rows):
+        """Get (position, changed fields) for each sampled row that differs from the cache
+
+        Returns None if the rows no longer line up with the cached ones.
+        """
+        start, end = window
+        if len(rows) < end - start:
+            return None
+        
+        changes = []
+        for position, row in zip(range(start, end), rows):
+            cached = table.records[position]
+            current = self.db._to_record(sheet_name, row)
+            if current.id != cached.id:
+                return None
+            if current != cached:
+                changed = {
+                    field.name: getattr(current, field.name)
+                    for field in fields(current)
+                    if getattr(current, field.name) != getattr(cached, field.name)
+                }
+                changes.append((position, changed))
+        return changes
+    
+    @staticmethod
+    def _cached_columns(table, names):
+        """Get the cached values of some fields, one array per field"""
+        # The columnar store already holds them as arrays
+        if isinstance(table, ColumnarAppointments):
+            columns = table.columns()
+            return {name: columns[name] for name in names}
+        return {
+            name: np.array([getattr(record, name) for record in table.records], dtype=object)
+            for name in names
+        }
+    
+    def _check_columns(self, table, checked, results):
+        """Get (position, changed fields) for each row whose checked columns differ from the cache
+
+        Returns None if the IDs no longer line up with the cached ones.
+        """
+        cached = self._cached_columns(table, [name for _, name in checked])
+        changes = {}
+        for (_, name), rows in zip(checked, results):
+            # Blank cells at the end of the range aren't returned
+            current = [str(row[0]) if row else "" for row in rows]
+            current += [""] * (len(table) - len(current))
+            differs = np.flatnonzero(np.array(current, dtype=object) != cached[name])
+            if name == "id" and len(differs):
+                return None
+            for position in differs.tolist():
+                changes.setdefault(position, {})[name] = current[position]
+        return list(changes.items())
+    
+    def stats(self):
+        """Get counters of syncs, rows merged, full checks and full reloads"""
+        with self._lock:
+            return dict(self._stats)
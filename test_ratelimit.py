@@ -0,0 +1,68 @@
+import json
+import unittest
+from unittest import mock
+import gspread
+import requests
+from gspread.exceptions import APIError
+from requests.exceptions import ConnectionError, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from ratelimit import RateLimitedClient
+
+APPEND_ENDPOINT = "https://sheets.googleapis.com/v4/spreadsheets/sheet/values/Appointments:append"
+READ_ENDPOINT = "https://sheets.googleapis.com/v4/spreadsheets/sheet/values/Appointments"
+
+def _api_error(status):
+    """Build the APIError gspread raises for a response with an HTTP status"""
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps({"error": {"code": status, "message": "error", "status": "ERROR"}}).encode()
+    return APIError(response)
+
+def _connect_error():
+    """Build the ConnectionError requests raises when the connection can't be opened"""
+    reason = NewConnectionError(None, "Failed to establish a new connection")
+    return ConnectionError(MaxRetryError(None, "/", reason=reason))
+
+class RetryTest(unittest.TestCase):
+    """Which failed requests RateLimitedClient sends again"""
+    
+    def setUp(self):
+        self.client = RateLimitedClient(None, session=requests.Session())
+        self.client.max_retries = 3
+        # Retry at once rather than after a backoff
+        patcher = mock.patch.object(RateLimitedClient, "_backoff", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def send(self, method, endpoint, *outcomes):
+        """Make a request whose attempts fail with, or return, each outcome in turn; returns the mock sender"""
+        with mock.patch.object(gspread.Client, "request", side_effect=list(outcomes)) as sender:
+            try:
+                self.client.request(method, endpoint, json={"values": [["A0001"]]})
+            except Exception:
+                pass
+        return sender
+    
+    def test_append_with_server_error_is_sent_once(self):
+        sender = self.send("post", APPEND_ENDPOINT, _api_error(503), "ok")
+        self.assertEqual(sender.call_count, 1)
+        self.assertEqual(self.client.stats()["failures"], 1)
+    
+    def test_append_with_read_timeout_is_sent_once(self):
+        sender = self.send("post", APPEND_ENDPOINT, ReadTimeout(), "ok")
+        self.assertEqual(sender.call_count, 1)
+    
+    def test_throttled_append_is_retried(self):
+        sender = self.send("post", APPEND_ENDPOINT, _api_error(429), "ok")
+        self.assertEqual(sender.call_count, 2)
+    
+    def test_append_that_could_not_connect_is_retried(self):
+        sender = self.send("post", APPEND_ENDPOINT, _connect_error(), "ok")
+        self.assertEqual(sender.call_count, 2)
+    
+    def test_read_with_server_error_is_retried(self):
+        sender = self.send("get", READ_ENDPOINT, _api_error(503), ReadTimeout(), "ok")
+        self.assertEqual(sender.call_count, 3)
+
+if __name__ == "__main__":
+    unittest.main()
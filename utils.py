@@ -1,5 +1,5 @@
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 import config
 
 def validate_email(email):
@@ -34,23 +34,26 @@ def generate_time_slots(start_hour=9, end_hour=17, interval_minutes=30):
     
     return slots
 
-def calculate_age(birth_date_str):
-    """Calculate age from birth date"""
-    try:
-        birth_date = datetime.strptime(birth_date_str, '%Y-%m-%d')
-        today = datetime.today()
-        age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-        return age
-    except ValueError:
-        return None
+def calculate_age(birth_date):
+    """Calculate age from birth date (a date or a YYYY-MM-DD string)"""
+    if not isinstance(birth_date, date):
+        try:
+            birth_date = datetime.strptime(birth_date, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return None
+    today = datetime.today()
+    age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    return age
 
-def format_date_for_display(date_str):
-    """Format date for display (e.g., 'Monday, January 1, 2023')"""
+def format_date_for_display(date_value):
+    """Format date for display (e.g., 'Monday, January 1, 2023'); takes a date or a YYYY-MM-DD string"""
+    if isinstance(date_value, date):
+        return date_value.strftime('%A, %B %d, %Y')
     try:
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+        date_obj = datetime.strptime(date_value, '%Y-%m-%d')
         return date_obj.strftime('%A, %B %d, %Y')
-    except ValueError:
-        return date_str
+    except (TypeError, ValueError):
+        return date_value or ""
 
 def get_next_available_dates(days=7):
     """Get a list of the next available dates"""
@@ -0,0 +1,240 @@
+import json
+import os
+import threading
+import time
+from repository import TABLE_COLUMNS
+from metrics import registry
+import config
+
+class WriteJournal:
+    """Append-only file of queued rows and of the ones written to Sheets, replayed after a restart"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+    
+    def replay(self):
+        """Get the queued entries that were never marked as written, in order"""
+        entries = {}
+        try:
+            with open(self.path) as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may be cut short by a crash
+                        continue
+                    if "done" in entry:
+                        for seq in entry["done"]:
+                            entries.pop(seq, None)
+                    else:
+                        entries[entry["seq"]] = entry
+        except FileNotFoundError:
+            pass
+        return list(entries.values())
+    
+    def _write(self, entry):
+        """Append an entry and make sure it is on disk before returning"""
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(entry, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def add(self, entry):
+        """Record a queued row"""
+        self._write(entry)
+    
+    def done(self, seqs):
+        """Record that queued rows were written to Sheets"""
+        self._write({"done": seqs})
+    
+    def clear(self):
+        """Empty the journal once every queued row has been written"""
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "w")
+
+class WriteBehindQueue:
+    """Confirms new rows once they are cached and journaled, and appends them to Sheets in the background
+
+    A background worker sends everything queued for a worksheet in one
+    append_rows request, retrying with exponential backoff while Sheets is
+    failing. When more than max_pending rows are waiting, new writes block
+    for up to max_wait seconds and then fail instead of growing the queue.
+
+    Writes are checked against this process's cache only. ID clashes and
+    double bookings with other writers surface once the rows reach the sheet,
+    and are resolved then the same way as for direct writes: the later row is
+    renumbered or cancelled.
+    """
+    
+    def __init__(self, db, journal_path=None, max_pending=None, max_wait=None):
+        self.db = db
+        self.journal = WriteJournal(journal_path or config.WRITE_BEHIND_JOURNAL)
+        self.max_pending = max_pending or config.WRITE_BEHIND_MAX_PENDING
+        self.max_wait = max_wait if max_wait is not None else config.WRITE_BEHIND_MAX_WAIT
+        # Maps a worksheet to its queued entries, oldest first
+        self._pending = {}
+        self._next_seq = 1
+        self._condition = threading.Condition()
+        self._flush_locks = {}
+        self._worker = None
+        self._stats = {"queued": 0, "written": 0, "requests": 0, "retries": 0, "conflicts": 0}
+    
+    def start(self):
+        """Queue any rows left in the journal by a previous run and start the background worker"""
+        for entry in self.journal.replay():
+            self._next_seq = max(self._next_seq, entry["seq"] + 1)
+            if self._already_written(entry):
+                self.journal.done([entry["seq"]])
+            else:
+                self._queue(entry)
+        
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+    
+    def _already_written(self, entry):
+        """Whether a replayed row reached the sheet before the journal could record it"""
+        sheet_name = entry["sheet"]
+        record = self.db._to_record(sheet_name, entry["row"])
+        table = self.db._get_table(sheet_name)
+        return any(
+            table.records[position] == record
+            for position in table.positions(TABLE_COLUMNS[sheet_name][0], record.id)
+        )
+    
+    def _flush_lock(self, sheet_name):
+        with self._condition:
+            return self._flush_locks.setdefault(sheet_name, threading.Lock())
+    
+    def _queued_count(self):
+        return sum(len(entries) for entries in self._pending.values())
+    
+    def _queue(self, entry, journal=False):
+        """Add an entry to the queue and its row to the cached worksheet, if it is cached"""
+        sheet_name = entry["sheet"]
+        with self.db._append_lock:
+            with self._condition:
+                if journal:
+                    entry["seq"] = self._next_seq
+                    self._next_seq += 1
+                    # Journaled in the same step as queued, so an empty queue always means nothing to replay
+                    self.journal.add(entry)
+                self._pending.setdefault(sheet_name, []).append(entry)
+                self._stats["queued"] += 1
+                self._condition.notify_all()
+            self.db.cache.append(sheet_name, self.db._to_record(sheet_name, entry["row"]))
+    
+    def enqueue(self, sheet_name, row_data):
+        """Journal a new row and add it to the cache; it is written to Sheets later"""
+        with self._condition:
+            deadline = time.monotonic() + self.max_wait
+            while self._queued_count() >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError("Too many writes are waiting for Google Sheets, please try again")
+                self._condition.wait(remaining)
+        self._queue({"sheet": sheet_name, "row": list(row_data)}, journal=True)
+    
+    def pending_records(self, sheet_name):
+        """Get the queued rows of a worksheet as models, so a reload keeps them"""
+        with self._condition:
+            entries = list(self._pending.get(sheet_name, ()))
+        return [self.db._to_record(sheet_name, entry["row"]) for entry in entries]
+    
+    def pending_count(self, sheet_name=None):
+        """Get the number of rows waiting to be written, for one worksheet or all of them"""
+        with self._condition:
+            if sheet_name is None:
+                return self._queued_count()
+            return len(self._pending.get(sheet_name, ()))
+    
+    def flush(self, sheet_name):
+        """Write the rows queued for a worksheet to Sheets with one append request"""
+        with self._flush_lock(sheet_name):
+            with self._condition:
+                batch = list(self._pending.get(sheet_name, ()))
+            if not batch:
+                return
+            
+            response = self.db._worksheet(sheet_name).append_rows([entry["row"] for entry in batch])
+            start = self.db._appended_position(response)
+            registry.increment("sheets_rows_written_total", len(batch), sheet=sheet_name)
+            
+            with self.db._append_lock:
+                table = self.db.cache.peek(sheet_name)
+                with self._condition:
+                    pending = self._pending[sheet_name]
+                    del pending[:len(batch)]
+                    # The batch was the oldest cached rows not yet in the sheet
+                    expected = len(table) - len(pending) - len(batch) if table is not None else None
+                    
+                    self.journal.done([entry["seq"] for entry in batch])
+                    if not self._queued_count():
+                        self.journal.clear()
+                    self._stats["written"] += len(batch)
+                    self._stats["requests"] += 1
+                    self._condition.notify_all()
+                
+                if start != expected:
+                    # Other writers appended rows first, so cache positions no longer match sheet rows
+                    self.db.cache.invalidate(sheet_name)
+            
+            if start is not None:
+                self._resolve_conflicts(sheet_name, batch, start)
+    
+    def drain(self, sheet_name):
+        """Write everything queued for a worksheet before returning"""
+        while self.pending_count(sheet_name):
+            self.flush(sheet_name)
+    
+    def _resolve_conflicts(self, sheet_name, batch, start):
+        """Renumber written rows whose ID was taken first and cancel bookings of slots taken first"""
+        db = self.db
+        table = db._get_table(sheet_name)
+        for offset, entry in enumerate(batch):
+            position = start + offset
+            record = db._to_record(sheet_name, entry["row"])
+            
+            new_id = db._claim_id(sheet_name, position, record.id)
+            if new_id != record.id:
+                self._count_conflict(f"{record.id} was already taken and has been renumbered {new_id}")
+            
+            if sheet_name == "Appointments" and record.status != "Cancelled":
+                booked = db._find_slot_booking(table, record.doctor_id, record.date, record.time)
+                if booked is not None and booked != position:
+                    db._cancel_booking(position, new_id)
+                    self._count_conflict(f"{new_id} was cancelled because its slot was already booked")
+    
+    def _count_conflict(self, message):
+        print(f"Write-behind conflict: {message}")
+        with self._condition:
+            self._stats["conflicts"] += 1
+    
+    def _run(self):
+        """Flush queued rows as they arrive, backing off while Sheets is failing"""
+        delay = 1
+        while True:
+            with self._condition:
+                while not self._queued_count():
+                    self._condition.wait()
+                sheets = [sheet_name for sheet_name, entries in self._pending.items() if entries]
+            
+            try:
+                for sheet_name in sheets:
+                    self.flush(sheet_name)
+                delay = 1
+            except Exception as e:
+                print(f"Error writing queued rows to Google Sheets, retrying in {delay}s: {e}")
+                with self._condition:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+    
+    def stats(self):
+        """Get counters of queued and written rows, requests, retries and conflicts"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats["pending"] = self._queued_count()
+            return stats